@@ -1,20 +1,25 @@
-import psycopg2
 import json
+import logging
 import subprocess
 import time
 import re
+import db
+import metrics
 
 # ---------------------- CONFIG ----------------------
-DB_CONFIG = {
-    "dbname": "zerodaydb",
-    "user": "postgres",
-    "password": "postgres",
-    "host": "localhost",
-    "port": 5432
-}
-
 BATCH_SIZE = 50
 
+UPDATE_SQL = """
+    UPDATE softwares
+    SET type=%s,
+        functionalities=%s,
+        platform=%s,
+        updated_at=NOW()
+    WHERE software_id=%s
+"""
+
+log = logging.getLogger("ai")
+
 # Liste autorisée pour les fonctionnalités
 ALLOWED_FUNCTIONS = [
     # ---------------------- Réseaux & télécom ----------------------
@@ -167,7 +172,8 @@ def normalize_platforms(plats):
 
 # ---------------------- SCRIPT PRINCIPAL ----------------------
 def main():
-    conn = psycopg2.connect(**DB_CONFIG)
+    report = metrics.start_run("ai")
+    conn = db.acquire(autocommit=False)
     cur = conn.cursor()
     
     cur.execute("""
@@ -191,38 +197,36 @@ Titles: {titles}
         prompt_text = "Tu es un expert en cybersécurité et logiciels. Classe les produits suivants en type, plateformes et 3 à 5 fonctionnalités principales. Réponds uniquement en JSON avec l'ID comme clé :\n" + "\n".join(prompt_lines)
         
         print(f"⏳ Traitement batch {i//BATCH_SIZE + 1} ({len(batch)} produits)...")
-        output = run_ollama(prompt_text)
+        with metrics.stage("ai", len(batch)):
+            output = run_ollama(prompt_text)
         
-        try:
-            data = json.loads(output)
-        except json.JSONDecodeError:
-            print("[ERREUR] JSON non valide pour ce batch, on saute.")
-            continue
-        
-        # Mettre à jour la DB
-        for software_id, vendor, product, titles in batch:
-            item = data.get(str(software_id))
-            if not item:
-                print(f"[ERREUR] Produit {software_id} non classé par LLM")
+            try:
+                data = json.loads(output)
+            except json.JSONDecodeError:
+                log.error("JSON non valide pour ce batch, on saute.")
                 continue
+        
+            # Mettre à jour la DB : un aller-retour et un commit par batch
+            updates = []
+            for software_id, vendor, product, titles in batch:
+                item = data.get(str(software_id))
+                if not item:
+                    log.warning("Produit %s non classé par le LLM", software_id)
+                    continue
             
-            funcs = normalize_functionalities(item.get("functionalities", []))
-            plats = normalize_platforms(item.get("platform", []))
+                funcs = normalize_functionalities(item.get("functionalities", []))
+                plats = normalize_platforms(item.get("platform", []))
             
-            cur.execute("""
-                UPDATE softwares
-                SET type=%s,
-                    functionalities=%s,
-                    platform=%s,
-                    updated_at=NOW()
-                WHERE software_id=%s
-            """, (item.get("type"), funcs, plats, software_id))
+                updates.append((item.get("type"), funcs, plats, software_id))
+                log.debug("%s classé : %s / %s", product, funcs, plats)
+            db.execute_batch(cur, UPDATE_SQL, updates)
             conn.commit()
-            print(f"✅ {product} classé : {funcs} / {plats}")
         time.sleep(1)  # CPU-friendly
     
     cur.close()
-    conn.close()
+    db.release(conn)
+    report.write()
 
 if __name__ == "__main__":
+    metrics.setup_logging()
     main()
\ No newline at end of file
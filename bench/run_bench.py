@@ -0,0 +1,321 @@
+"""Benchmarks hors-ligne des étapes du pipeline, sur fixtures enregistrées.
+
+Les réponses HTTP (ZDI, Zero-day.cz, KEV, EPSS, CPE, Wikipédia) sont rejouées
+depuis un cache http_cache temporaire en mode hors-ligne : les collecteurs
+exécutent leur vrai chemin de code, sans réseau. Le flux NVD est généré à partir
+de l'échantillon enregistré et agrandi à --nvd-records enregistrements.
+
+    python bench/run_bench.py                   # compare à bench/baseline.json
+    python bench/run_bench.py --check           # idem, en échec si la référence manque (CI)
+    python bench/run_bench.py --db              # + upsert dans le Postgres docker-compose
+    python bench/run_bench.py --save-baseline   # enregistre les résultats comme référence
+
+La référence versionnée a été mesurée avec les paramètres par défaut ; elle dépend
+de la machine : la régénérer sur l'hôte qui exécute --check.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import gzip
+import io
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+
+import http_cache  # noqa: E402
+from ai import normalize_functionalities  # noqa: E402
+from cpe_collector import BASE_URL as CPE_URL, RESULTS_PER_PAGE, fetch_all_cpes  # noqa: E402
+from epss_collector import EPSS_API, EPSSEnricher  # noqa: E402
+from kev_collector import CISA_KEV_URL, KEVEnricher  # noqa: E402
+from nvd_collector import NVDEnricher  # noqa: E402
+from wiki_enricher import WIKI_API, get_wiki_details, infer_type_and_platform, search_wikipedia  # noqa: E402
+from zdcz_collector import ZDCZCollector  # noqa: E402
+from zdi_collector import ZDICollector  # noqa: E402
+
+FIXTURES = BENCH_DIR / "fixtures"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+YEAR = 2025
+
+
+def fixture(name):
+    return (FIXTURES / name).read_bytes()
+
+
+def record(url, body, source, params=None, content_type="application/json"):
+    """Enregistre une réponse dans le cache HTTP, sous la clé que demandera le collecteur."""
+    key = http_cache.cache_key(url, params)
+    http_cache._store(key, url, source, 200, {"Content-Type": content_type}, body)
+
+
+def scale_zdi_page(html, rows):
+    """Agrandit la page ZDI enregistrée à `rows` avis (identifiants ZDI / CVE uniques)."""
+    templates = re.findall(r'<tr id="publishedAdvisories">.*?</tr>', html, re.S)
+    generated = []
+    for i in range(rows):
+        row = re.sub(r"ZDI-25-\d+", f"ZDI-25-{i:05d}", templates[i % len(templates)])
+        row = re.sub(r"CVE-2025-\d+", f"CVE-2025-{i:05d}", row)
+        generated.append(row)
+    start = html.index("<tbody>") + len("<tbody>")
+    end = html.index("</tbody>")
+    return html[:start] + "\n".join(generated) + html[end:]
+
+
+def scale_zdcz_page(html, page):
+    """Variante de la page Zero-day.cz enregistrée avec des identifiants propres à `page`."""
+    html = re.sub(r"CVE-2025-(\d+)", lambda m: f"CVE-2025-{page:03d}{m.group(1)[-2:]}", html)
+    html = re.sub(r"database/(\d+)/", lambda m: f"database/{page}{m.group(1)}/", html)
+    return re.sub(r"(<a href=[^>]+>)([^<]+)", lambda m: f"{m.group(1)}{m.group(2)} #{page}", html)
+
+
+def write_nvd_feed(path, records):
+    """Écrit un flux NVD 2.0 de `records` CVE à partir de l'échantillon enregistré."""
+    sample = json.loads(fixture("nvd_sample.json"))
+    templates = [v["cve"] for v in sample["vulnerabilities"]]
+    header = {k: v for k, v in sample.items() if k != "vulnerabilities"}
+    header["resultsPerPage"] = header["totalResults"] = records
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header)[:-1] + ', "vulnerabilities": [')
+        for i in range(records):
+            cve = dict(templates[i % len(templates)], id=f"CVE-{YEAR}-{i:05d}")
+            f.write(("," if i else "") + json.dumps({"cve": cve}))
+        f.write("]}")
+
+
+def prepare(workdir, args):
+    """Peuple le cache hors-ligne et le flux NVD dans `workdir`."""
+    http_cache.CACHE_DIR = workdir / "http"
+    http_cache.OFFLINE = True
+    http_cache._total_bytes = None
+
+    zdi_html = scale_zdi_page(fixture("zdi_published_2025.html").decode(), args.zdi_rows)
+    record(ZDICollector.BASE_URL.format(year=YEAR), zdi_html.encode(), "zdi", content_type="text/html")
+
+    zdcz_url = (
+        f"{ZDCZCollector.BASE_URL}"
+        f"&arrFilter_pf%5BYEAR_FROM%5D={YEAR}"
+        f"&arrFilter_pf%5BYEAR_TO%5D={YEAR}"
+    )
+    page1 = fixture("zdcz_page1.html").decode()
+    for page in range(1, args.zdcz_pages + 1):
+        record(f"{zdcz_url}&PAGEN_1={page}", scale_zdcz_page(page1, page).encode(), "zdcz", content_type="text/html")
+    record(f"{zdcz_url}&PAGEN_1={args.zdcz_pages + 1}", fixture("zdcz_empty.html"), "zdcz", content_type="text/html")
+
+    record(CISA_KEV_URL, fixture("kev.json"), "kev")
+
+    epss_ids = sorted(e["cve"] for e in json.loads(fixture("epss_api.json"))["data"])
+    record(EPSS_API, fixture("epss_api.json"), "epss", params={"cve": ",".join(epss_ids), "limit": len(epss_ids)})
+
+    record(f"{CPE_URL}?resultsPerPage={RESULTS_PER_PAGE}&startIndex=0", fixture("cpe_page.json"), "cpe")
+    record(f"{CPE_URL}?resultsPerPage={RESULTS_PER_PAGE}&startIndex={RESULTS_PER_PAGE}", fixture("cpe_empty.json"), "cpe")
+
+    search = {"action": "query", "list": "search", "srsearch": "foxit pdf_reader", "srlimit": 1, "format": "json"}
+    details = {"action": "query", "prop": "categories|extracts", "titles": "Foxit Reader", "exintro": True,
+               "explaintext": True, "cllimit": 50, "format": "json"}
+    record(WIKI_API, fixture("wiki_search.json"), "wiki", params={k: str(v) for k, v in search.items()})
+    record(WIKI_API, fixture("wiki_details.json"), "wiki", params={k: str(v) for k, v in details.items()})
+
+    write_nvd_feed(workdir / f"nvdcve-2.0-{YEAR}.json.gz", args.nvd_records)
+    return epss_ids
+
+
+def quiet_unless(verbose):
+    """Masque les print() de progression des collecteurs pendant les mesures."""
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def measure(fn, repeat, setup=None):
+    """Durées (s) de `repeat` exécutions de fn ; `setup` n'est pas chronométré."""
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(state) if setup else fn()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def run_benchmarks(args, workdir):
+    epss_ids = prepare(workdir, args)
+    n = args.iterations
+    sample_vulns = [{"cve_id": f"CVE-{YEAR}-{i:05d}"} for i in range(0, args.nvd_records, 7)]
+    categories = [c["title"].replace("Category:", "")
+                  for c in next(iter(json.loads(fixture("wiki_details.json"))["query"]["pages"].values()))["categories"]]
+    ai_outputs = json.loads(fixture("ai_outputs.json"))
+
+    def nvd_index_setup():
+        for path in workdir.glob("*.idx.sqlite*"):
+            path.unlink()
+        return NVDEnricher(use_index=True)
+
+    loaded = NVDEnricher()
+    with quiet_unless(args.verbose):
+        loaded.load_nvd_json(YEAR)
+
+    async def wiki_lookups():
+        for _ in range(n):
+            title = await search_wikipedia(None, "foxit pdf_reader")
+            await get_wiki_details(None, title)
+
+    benches = {
+        "nvd_load_nvd_json": (lambda e: e.load_nvd_json(YEAR), NVDEnricher, args.nvd_records),
+        "nvd_index_build": (lambda e: e.close() if e.get_index(YEAR) else None, nvd_index_setup, args.nvd_records),
+        "nvd_enrich": (lambda vulns: [loaded.enrich(v) for v in vulns],
+                       lambda: copy.deepcopy(sample_vulns), len(sample_vulns)),
+        "zdi_fetch_parse": (lambda c: c.fetch(), lambda: ZDICollector(YEAR, YEAR), args.zdi_rows),
+        "zdcz_fetch_parse": (lambda c: c.fetch(), lambda: ZDCZCollector(YEAR, YEAR), args.zdcz_pages * 3),
+        "kev_fetch": (lambda k: k.fetch(), KEVEnricher, None),
+        "epss_fetch_many": (lambda e: e.fetch_many(epss_ids), EPSSEnricher, len(epss_ids)),
+        "cpe_fetch_all": (lambda _: fetch_all_cpes(), lambda: None, None),
+        "wiki_lookup": (lambda _: asyncio.run(wiki_lookups()), lambda: None, n),
+        "infer_type_and_platform": (
+            lambda _: [infer_type_and_platform("Foxit Reader", "foxit", categories) for _ in range(n)],
+            lambda: None, n,
+        ),
+        "normalize_functionalities": (
+            lambda _: [normalize_functionalities(ai_outputs[i % len(ai_outputs)]["functionalities"]) for i in range(n)],
+            lambda: None, n,
+        ),
+    }
+    if args.db:
+        benches.update(db_benchmarks(args, loaded, sample_vulns))
+
+    results = {}
+    for name, (fn, setup, items) in benches.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        with quiet_unless(args.verbose):
+            timings = measure(fn, args.repeat, setup)
+        results[name] = {
+            "median": round(statistics.median(timings), 6),
+            "min": round(min(timings), 6),
+            "items": items,
+        }
+        print(f"{name:28s} médiane {results[name]['median'] * 1000:10.2f} ms   min {results[name]['min'] * 1000:10.2f} ms")
+    return results
+
+
+def db_benchmarks(args, enricher, sample_vulns):
+    """Upsert dans un schéma jetable du Postgres docker-compose (insertion puis réécriture à l'identique)."""
+    from db_sink import bulk_upsert
+    from db import connect
+
+    vulns = copy.deepcopy(sample_vulns)
+    for v in vulns:
+        enricher.enrich(v)
+        v["refs"] = [{"source": "ZDI", "url": f"https://www.zerodayinitiative.com/advisories/{v['cve_id']}/"}]
+        v["tags"] = ["ZDI"]
+
+    schema = f"bench_{os.getpid()}"
+    conn = connect(options=f"-c search_path={schema}")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute((ROOT / "schema.sql").read_text())
+
+    def truncate():
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE vulnerabilities, source_mappings CASCADE")
+        return copy.deepcopy(vulns)
+
+    def loaded():
+        batch = truncate()
+        bulk_upsert(conn, copy.deepcopy(batch))
+        return batch
+
+    import atexit
+
+    @atexit.register
+    def drop_schema():
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.close()
+
+    return {
+        "db_upsert_insert": (lambda batch: bulk_upsert(conn, batch), truncate, len(vulns)),
+        "db_upsert_unchanged": (lambda batch: bulk_upsert(conn, batch), loaded, len(vulns)),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Affiche les écarts à la référence ; retourne la liste des régressions.
+
+    Un écart inférieur à `min_delta` secondes n'est jamais une régression : les
+    mesures de l'ordre de la milliseconde sont dominées par le bruit."""
+    regressions = []
+    for name, result in results.items():
+        ref = baseline.get("results", {}).get(name)
+        if not ref:
+            continue
+        ratio = result["median"] / ref["median"] if ref["median"] else float("inf")
+        regressed = ratio > tolerance and result["median"] - ref["median"] > min_delta
+        print(f"{name:28s} x{ratio:5.2f} par rapport à la référence  {'RÉGRESSION' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=2000, help="appels par mesure pour les fonctions unitaires")
+    parser.add_argument("--nvd-records", type=int, default=20000)
+    parser.add_argument("--zdi-rows", type=int, default=2000)
+    parser.add_argument("--zdcz-pages", type=int, default=50)
+    parser.add_argument("--db", action="store_true", help="mesure aussi l'upsert (Postgres docker-compose)")
+    parser.add_argument("--only", nargs="*", help="ne lancer que les benchmarks dont le nom contient ces motifs")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="ratio médiane / référence toléré")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="écart absolu (s) ignoré")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true",
+                        help="code de sortie 2 si la référence est absente (au lieu d'ignorer la comparaison)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="zeroday-bench-") as tmp:
+        os.chdir(tmp)  # les flux NVD et leurs index sont lus dans le répertoire courant
+        try:
+            results = run_benchmarks(args, Path(tmp))
+        finally:
+            os.chdir(cwd)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "params": {k: getattr(args, k) for k in ("repeat", "iterations", "nvd_records", "zdi_rows", "zdcz_pages")},
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"Référence enregistrée dans {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"Pas de référence ({args.baseline}) : relancer avec --save-baseline pour en créer une.")
+        return 2 if args.check else 0
+    baseline = json.loads(args.baseline.read_text())
+    params = {k: getattr(args, k) for k in baseline.get("params", {})}
+    if params != baseline.get("params", {}):
+        print(f"Attention : paramètres {params} différents de ceux de la référence {baseline['params']}")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print(f"{len(regressions)} régression(s) : {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Harnais de charge : ETL, collecte CPE et enrichissement Wikipédia contre les
+serveurs de substitution (bench/standin.py), à l'échelle de 100k à 1M CVE.
+
+Chaque cible tourne dans un sous-processus dont les URL amont pointent vers les
+serveurs locaux ; les tables sont créées dans un schéma Postgres jetable
+(PGOPTIONS=search_path) de la base docker-compose. Pour chaque cible sont
+relevés : durée, pic de mémoire (rusage du processus fils), lignes écrites et
+débit, requêtes / réessais / 429 vus des deux côtés, et le rapport metrics
+de l'exécution.
+
+    python bench/soak.py --records 100000 --years 2024 2025
+    python bench/soak.py --records 1000000 --years 2016 2025 --latency-ms 50 --p429 0.02 --rounds 2
+    python bench/soak.py --targets cpe wiki --records 200000 --client-rates off
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+
+import psycopg2  # noqa: E402
+from standin import add_arguments, from_arguments  # noqa: E402
+
+# cible -> (commande, requête de comptage des lignes produites)
+TARGETS = {
+    "etl": (
+        ["-c", "import sys, main, metrics; metrics.setup_logging(); main.ETL_MODES[sys.argv[1]]()"],
+        "SELECT COUNT(*) FROM vulnerabilities",
+    ),
+    "cpe": ([str(ROOT / "cpe_collector.py")], "SELECT COUNT(*) FROM softwares"),
+    "wiki": ([str(ROOT / "wiki_enricher.py")], "SELECT COUNT(*) FROM softwares WHERE wiki_checked"),
+}
+
+
+def client_rates(standin):
+    """Reporte les limites de débit de http_client sur les ports locaux correspondants."""
+    import http_client
+
+    return ",".join(
+        f"{local}={http_client.HOST_RATES[real]}"
+        for real, local in standin.netlocs().items()
+        if real in http_client.HOST_RATES
+    )
+
+
+def child_environment(args, standin, workdir, schema):
+    env = dict(os.environ)
+    env.update(standin.environment())
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")])),
+        "PGOPTIONS": f"-c search_path={schema}",
+        "ETL_YEAR_FROM": str(min(args.years)),
+        "ETL_YEAR_TO": str(max(args.years)),
+        "ETL_REPORT_DIR": str(workdir / "reports"),
+        "HTTP_CACHE_DIR": str(workdir / ".cache" / "http"),
+        "WIKI_BATCH_PAUSE": "0",
+    })
+    if args.client_rates == "upstream":
+        env["HTTP_HOST_RATES"] = client_rates(standin)
+    return env
+
+
+def run_target(name, args, env, workdir):
+    """Lance une cible ; retourne (code de sortie, durée, pic RSS en octets)."""
+    command, _ = TARGETS[name]
+    extra = [args.etl_mode] if name == "etl" else []
+    with open(workdir / f"{name}.log", "ab") as log:
+        t0 = time.perf_counter()
+        process = subprocess.Popen([sys.executable, *command, *extra], cwd=workdir, env=env, stdout=log, stderr=log)
+        _, status, usage = os.wait4(process.pid, 0)  # rusage propre à ce fils
+        wall = time.perf_counter() - t0
+    process.returncode = code = os.waitstatus_to_exitcode(status)
+    peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return code, wall, peak
+
+
+def latest_report(workdir, run):
+    reports = sorted((workdir / "reports").glob(f"run-{run}-*.json"), key=lambda p: p.stat().st_mtime)
+    return json.loads(reports[-1].read_text()) if reports else None
+
+
+def server_delta(before, after):
+    return {
+        source: {key: after[source][key] - before[source][key] for key in ("requests", "throttled", "bytes")}
+        for source in after
+        if after[source]["requests"] != before[source]["requests"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--etl-mode", choices=["sequential", "stream", "pipeline", "sharded"], default="sequential")
+    parser.add_argument("--rounds", type=int, default=1, help="exécutions successives (les suivantes sont incrémentales)")
+    parser.add_argument("--client-rates", choices=["upstream", "off"], default="upstream",
+                        help="appliquer aux serveurs locaux les limites de débit client des vrais hôtes")
+    parser.add_argument("--keep", action="store_true", help="conserver le schéma et le répertoire de travail")
+    parser.add_argument("--out", type=Path, help="rapport JSON (défaut : reports/soak-<horodatage>.json)")
+    args = parser.parse_args()
+
+    from db import connect
+
+    standin = from_arguments(args).start()
+    schema = f"soak_{os.getpid()}"
+    workdir = Path(tempfile.mkdtemp(prefix="zeroday-soak-"))
+    conn = connect(options=f"-c search_path={schema}")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute((ROOT / "schema.sql").read_text())
+    env = child_environment(args, standin, workdir, schema)
+    print(f"[SOAK] {args.records} CVE ({', '.join(map(str, args.years))}), schéma {schema}, répertoire {workdir}")
+
+    results = []
+    try:
+        for round_ in range(1, args.rounds + 1):
+            for name in args.targets:
+                before = json.loads(json.dumps(standin.stats))
+                code, wall, peak = run_target(name, args, env, workdir)
+                with conn.cursor() as cur:
+                    try:
+                        cur.execute(TARGETS[name][1])
+                        rows = cur.fetchone()[0]
+                    except psycopg2.Error:
+                        rows = None
+                report = latest_report(workdir, name) if name in ("etl", "wiki") else None
+                result = {
+                    "target": name,
+                    "round": round_,
+                    "exit_code": code,
+                    "wall_seconds": round(wall, 3),
+                    "peak_rss_bytes": peak,
+                    "rows": rows,
+                    "rows_per_second": round(rows / wall, 2) if rows and wall else None,
+                    "server": server_delta(before, standin.stats),
+                    "client": {k: report[k] for k in ("http", "cache")} if report else None,
+                    "stages": report["stages"] if report else None,
+                }
+                results.append(result)
+                throttled = sum(s["throttled"] for s in result["server"].values())
+                requests = sum(s["requests"] for s in result["server"].values())
+                print(f"[SOAK] {name} (tour {round_}) : code {code}, {wall:.1f}s, {peak / 2**20:.0f} Mo RSS max, "
+                      f"{rows} lignes, {requests} requêtes dont {throttled} 429")
+                if code:
+                    print(f"[SOAK] {name} a échoué, voir {workdir / (name + '.log')}")
+    finally:
+        standin.stop()
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.close()
+
+    out = args.out or Path("reports") / f"soak-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "workdir": str(workdir),
+        "results": results,
+    }, indent=2))
+    print(f"[SOAK] Rapport : {out}")
+    failed = any(r["exit_code"] for r in results)
+    if not args.keep and not failed:  # journaux conservés en cas d'échec
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""Serveurs HTTP locaux de substitution des sources amont (NVD, ZDI, Zero-day.cz,
+CISA KEV, EPSS, CPE, Wikipédia, CIRCL), alimentés par `synthetic.Universe`.
+
+Chaque source écoute sur son propre port (127.0.0.1:<port de base + n>) et sert
+les mêmes chemins que le site réel : il suffit de pointer les variables
+*_BASE_URL des collecteurs vers le serveur. Latence, gigue, réponses 429
+aléatoires et plafond de débit côté serveur sont configurables ; /_stats
+retourne les compteurs par source en JSON.
+
+    python bench/standin.py --records 100000 --latency-ms 40 --p429 0.01
+"""
+import argparse
+import json
+import random
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from synthetic import SCORE_DATE, Universe
+
+# source -> (hôte réel, variable d'environnement lue par le collecteur)
+SOURCES = {
+    "nvd_feeds": ("nvd.nist.gov", "NVD_FEEDS_BASE_URL"),
+    "nvd_api": ("services.nvd.nist.gov", "NVD_API_BASE_URL"),
+    "zdi": ("www.zerodayinitiative.com", "ZDI_BASE_URL"),
+    "zdcz": ("www.zero-day.cz", "ZDCZ_BASE_URL"),
+    "cisa": ("www.cisa.gov", "CISA_BASE_URL"),
+    "epss_api": ("api.first.org", "EPSS_API_BASE_URL"),
+    "epss_snapshot": ("epss.cyentia.com", "EPSS_SNAPSHOT_BASE_URL"),
+    "wiki": ("en.wikipedia.org", "WIKI_BASE_URL"),
+    "circl": ("cve.circl.lu", "CIRCL_BASE_URL"),
+}
+LAST_MODIFIED = "Fri, 17 Oct 2025 07:00:01 GMT"
+
+
+class RateLimit:
+    """Plafond de débit côté serveur : au-delà de `rate` requêtes/s, réponse 429."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = max(1.0, rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class StandIn:
+    """État partagé par les serveurs : univers synthétique, fichiers générés, fautes et compteurs."""
+
+    def __init__(self, universe, workdir, latency=0.0, jitter=0.0, p429=0.0, retry_after=1, max_rps=0.0,
+                 host="127.0.0.1", port=8800, seed=0):
+        self.universe = universe
+        self.workdir = Path(workdir)
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.host = host
+        self.ports = {source: port + n for n, source in enumerate(SOURCES)}
+        self.limits = {source: RateLimit(max_rps) for source in SOURCES} if max_rps else {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.file_locks = {}
+        self.pages = {}
+        self.stats = {source: {"requests": 0, "throttled": 0, "bytes": 0, "status": {}} for source in SOURCES}
+        self.servers = []
+
+    # --- Contenus ------------------------------------------------------------
+
+    def _generated(self, name, build):
+        """Fichier généré une seule fois (les requêtes concurrentes attendent la première)."""
+        path = self.workdir / name
+        with self.lock:
+            lock = self.file_locks.setdefault(name, threading.Lock())
+        with lock:
+            if not path.exists():
+                tmp = path.with_name(path.name + ".part")
+                build(tmp)
+                tmp.replace(path)
+        return path
+
+    def nvd_feed(self, name):
+        """(chemin du .json.gz, chemin du .meta) d'un flux NVD."""
+        meta = self.workdir / f"nvdcve-2.0-{name}.meta"
+
+        def build(tmp):
+            meta.write_text(self.universe.write_nvd_feed(tmp, name))
+
+        return self._generated(f"nvdcve-2.0-{name}.json.gz", build), meta
+
+    def epss_snapshot(self):
+        return self._generated(f"epss_scores-{SCORE_DATE}.csv.gz", self.universe.write_epss_snapshot)
+
+    def page(self, key, build):
+        """Corps mis en mémoire (pages ZDI annuelles, catalogue KEV)."""
+        with self.lock:
+            lock = self.file_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self.pages:
+                self.pages[key] = build()
+        return self.pages[key]
+
+    # --- Fautes / compteurs -------------------------------------------------
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    def throttle(self, source):
+        """Vrai si la requête doit recevoir un 429 (injection aléatoire ou plafond de débit)."""
+        limit = self.limits.get(source)
+        if limit and not limit.allow():
+            return True
+        return bool(self.p429) and self.random.random() < self.p429
+
+    def count(self, source, status, size):
+        with self.lock:
+            stats = self.stats[source]
+            stats["requests"] += 1
+            stats["bytes"] += size
+            stats["throttled"] += status == 429
+            stats["status"][str(status)] = stats["status"].get(str(status), 0) + 1
+
+    # --- Cycle de vie ---------------------------------------------------------
+
+    def base_url(self, source):
+        return f"http://{self.host}:{self.ports[source]}"
+
+    def environment(self):
+        """Variables d'environnement qui redirigent les collecteurs vers les serveurs locaux."""
+        return {env: self.base_url(source) for source, (_, env) in SOURCES.items()}
+
+    def netlocs(self):
+        """{hôte réel: host:port local}, pour reporter les limites de débit client."""
+        return {real: f"{self.host}:{self.ports[source]}" for source, (real, _) in SOURCES.items()}
+
+    def start(self):
+        for source, port in self.ports.items():
+            server = ThreadingHTTPServer((self.host, port), make_handler(self, source))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"standin-{source}", daemon=True).start()
+            self.servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers.clear()
+
+
+def make_handler(standin, source):
+    universe = standin.universe
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, comme les vrais serveurs
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status, body=b"", content_type="application/json", headers=None):
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body).encode()
+            elif isinstance(body, str):
+                body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+            standin.count(source, status, len(body))
+
+        def send_file(self, path, content_type, etag):
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                standin.count(source, 304, 0)
+                return
+            size = path.stat().st_size
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            self.end_headers()
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, 1 << 16)
+            standin.count(source, 200, size)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/_stats":
+                return self.send(200, standin.stats)
+
+            standin.delay()
+            if standin.throttle(source):
+                return self.send(429, {"error": "Too Many Requests"}, headers={"Retry-After": str(standin.retry_after)})
+            try:
+                ROUTES[source](self, url.path, query)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        # --- Routes par source -------------------------------------------------
+
+        def nvd_feeds(self, path, query):
+            name = path.rsplit("nvdcve-2.0-", 1)[-1]
+            for suffix, content_type in ((".json.gz", "application/gzip"), (".meta", "text/plain")):
+                if name.endswith(suffix):
+                    feed = name[:-len(suffix)]
+                    if feed != "modified" and not (feed.isdigit() and int(feed) in universe.per_year):
+                        return self.send(404, "Not Found", "text/plain")
+                    gz, meta = standin.nvd_feed(feed)
+                    sha256 = meta.read_text().rsplit("sha256:", 1)[-1].strip()
+                    return self.send_file(gz if suffix == ".json.gz" else meta, content_type, f'"{sha256[:16]}{suffix}"')
+            self.send(404, "Not Found", "text/plain")
+
+        def nvd_api(self, path, query):
+            per_page = min(int(query.get("resultsPerPage", 2000)), 10_000)
+            self.send(200, universe.cpe_page(int(query.get("startIndex", 0)), per_page))
+
+        def zdi(self, path, query):
+            year = path.strip("/").rsplit("/", 1)[-1]
+            if not year.isdigit():
+                return self.send(404, "Not Found", "text/plain")
+            html = standin.page(f"zdi-{year}", lambda: universe.zdi_page(int(year)).encode())
+            self.send(200, html, "text/html; charset=utf-8")
+
+        def zdcz(self, path, query):
+            year_from = query.get("arrFilter_pf[YEAR_FROM]")
+            year_to = query.get("arrFilter_pf[YEAR_TO]")
+            html = universe.zdcz_page(int(query.get("PAGEN_1", 1)),
+                                      int(year_from) if year_from else None, int(year_to) if year_to else None)
+            self.send(200, html, "text/html; charset=utf-8")
+
+        def cisa(self, path, query):
+            if not path.endswith("known_exploited_vulnerabilities.json"):
+                return self.send(404, "Not Found", "text/plain")
+            self.send(200, standin.page("kev", lambda: json.dumps(universe.kev_json()).encode()))
+
+        def epss_api(self, path, query):
+            cves = [c for c in query.get("cve", "").split(",") if c]
+            self.send(200, universe.epss_api(cves, int(query.get("limit", 100)), int(query.get("offset", 0))))
+
+        def epss_snapshot(self, path, query):
+            if not path.endswith(".csv.gz"):
+                return self.send(404, "Not Found", "text/plain")
+            self.send_file(standin.epss_snapshot(), "application/gzip", f'"epss-{SCORE_DATE}"')
+
+        def wiki(self, path, query):
+            if query.get("list") == "search":
+                return self.send(200, universe.wiki_search(query.get("srsearch", "")))
+            self.send(200, universe.wiki_details(query.get("titles", "")))
+
+        def circl(self, path, query):
+            data = universe.circl(path.rstrip("/").rsplit("/", 1)[-1])
+            if data is None:
+                return self.send(404, {"message": "Not found"})
+            self.send(200, data)
+
+    ROUTES = {name: getattr(Handler, name) for name in SOURCES}
+    return Handler
+
+
+def add_arguments(parser):
+    """Options communes au serveur autonome et au harnais de charge."""
+    parser.add_argument("--records", type=int, default=100_000, help="nombre de CVE de l'univers synthétique")
+    parser.add_argument("--years", type=int, nargs="+", default=[2025])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cpe-products", type=int, help="produits CPE (défaut : records / 10)")
+    parser.add_argument("--zdcz-count", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latence ajoutée à chaque réponse")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="gigue uniforme ajoutée à la latence")
+    parser.add_argument("--p429", type=float, default=0.0, help="probabilité de répondre 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After des réponses 429 (s)")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="plafond de débit par source (0 : aucun)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800, help="premier port (un port par source)")
+    parser.add_argument("--workdir", type=Path, help="répertoire des flux générés (réutilisé d'un run à l'autre)")
+
+
+def from_arguments(args):
+    universe = Universe(args.records, args.years, args.seed, zdcz_count=args.zdcz_count,
+                        cpe_products=args.cpe_products or max(1, args.records // 10))
+    workdir = args.workdir or Path(".cache") / "standin" / f"r{args.records}-y{'-'.join(map(str, universe.years))}-s{args.seed}"
+    return StandIn(universe, workdir, args.latency_ms / 1000, args.jitter_ms / 1000, args.p429, args.retry_after,
+                   args.max_rps, args.host, args.port, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    standin = from_arguments(parser.parse_args()).start()
+    for key, value in standin.environment().items():
+        print(f"export {key}={value}")
+    print(f"# compteurs : {standin.base_url('nvd_feeds')}/_stats")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
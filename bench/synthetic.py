@@ -0,0 +1,372 @@
+"""Générateur de données synthétiques aux formats des sources amont.
+
+Un `Universe` décrit un jeu de CVE réparti sur plusieurs années ; chaque source
+en expose une vue cohérente (une CVE publiée par ZDI ou présente dans KEV existe
+aussi dans le flux NVD, dans EPSS, etc.). Tout est déterministe pour une graine
+donnée : deux générations produisent les mêmes octets, et une page peut être
+produite isolément sans matérialiser le reste (pages ZDCZ, CPE, réponses EPSS).
+
+    python bench/synthetic.py --records 100000 --years 2024 2025 --out /tmp/feeds
+"""
+import argparse
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+from html import escape
+from pathlib import Path
+
+MASK64 = (1 << 64) - 1
+SCORE_DATE = "2025-10-17"
+
+VENDOR_WORDS = ["acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "tyrell", "cyberdyne", "soylent"]
+PRODUCT_WORDS = ["router", "pdf_reader", "mail_server", "vpn_gateway", "browser", "firmware", "database", "cms",
+                 "hypervisor", "media_player", "office_suite", "camera", "firewall", "erp", "sdk"]
+FLAWS = ["Heap-based buffer overflow", "Use-after-free", "SQL injection", "Directory traversal",
+         "Authentication bypass", "Out-of-bounds write", "Command injection", "Type confusion"]
+IMPACTS = ["remote code execution", "privilege escalation", "information disclosure", "denial of service"]
+CATEGORIES = ["Windows software", "Linux software", "MacOS software", "Android (operating system) software",
+              "Web browsers", "Database management systems", "Network software", "Office software",
+              "Proprietary software", "Free software", "Firmware", "Computer security software"]
+CVSS31 = [
+    ("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H", 9.8, "CRITICAL"),
+    ("CVSS:3.1/AV:L/AC:L/PR:N/UI:R/S:U/C:H/I:H/A:H", 7.8, "HIGH"),
+    ("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N", 7.5, "HIGH"),
+    ("CVSS:3.1/AV:N/AC:L/PR:L/UI:N/S:U/C:L/I:L/A:N", 5.4, "MEDIUM"),
+]
+
+
+def mix(*values):
+    """Hachage entier rapide et stable (splitmix64) : remplace un générateur aléatoire par élément."""
+    x = 0
+    for value in values:
+        x = (x ^ value) * 0x9E3779B97F4A7C15 & MASK64
+        x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+        x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK64
+        x ^= x >> 31
+    return x
+
+
+def pick(items, *values):
+    return items[mix(*values) % len(items)]
+
+
+class Universe:
+    def __init__(self, records=100_000, years=(2025,), seed=0, zdi_share=0.3, zdcz_count=2000,
+                 kev_share=0.02, gap_share=0.02, cpe_products=10_000, wiki_share=0.7, zdcz_per_page=20):
+        self.records = records
+        self.years = sorted(years)
+        self.seed = seed
+        self.zdi_share = zdi_share
+        self.kev_share = kev_share
+        self.gap_share = gap_share  # CVE sans CVSS ni configuration (complétées par CIRCL)
+        self.cpe_products = cpe_products
+        self.wiki_share = wiki_share
+        self.zdcz_per_page = zdcz_per_page
+        self.zdcz_count = min(zdcz_count, records)
+        per_year, extra = divmod(records, len(self.years))
+        self.per_year = {year: per_year + (1 if i < extra else 0) for i, year in enumerate(self.years)}
+
+    # --- Identités -------------------------------------------------------
+
+    def _h(self, *values):
+        return mix(self.seed, *values)
+
+    def _share(self, share, *values):
+        return self._h(*values) % 10_000 < share * 10_000
+
+    @staticmethod
+    def cve_id(year, i):
+        return f"CVE-{year}-{10_000 + i}"
+
+    @staticmethod
+    def parse_cve(cve_id):
+        """(année, indice) d'une CVE synthétique, ou None."""
+        try:
+            _, year, number = cve_id.split("-")
+            return int(year), int(number) - 10_000
+        except (AttributeError, ValueError):
+            return None
+
+    def exists(self, cve_id):
+        parsed = self.parse_cve(cve_id)
+        return parsed is not None and 0 <= parsed[1] < self.per_year.get(parsed[0], 0)
+
+    def iter_cves(self, year=None):
+        for y in [year] if year else self.years:
+            for i in range(self.per_year.get(y, 0)):
+                yield y, i
+
+    def published(self, year, i):
+        """Dates de publication réparties uniformément sur l'année."""
+        n = self.per_year[year]
+        return datetime(year, 1, 1) + timedelta(seconds=int(i * 365 * 86400 / max(n, 1)))
+
+    def vendor_product(self, n):
+        vendor = f"{pick(VENDOR_WORDS, n)}{n % 997:03d}"
+        product = f"{pick(PRODUCT_WORDS, n, 1)}_{n % 13}"
+        return vendor, product
+
+    def product_of(self, year, i):
+        return self._h(year, i, 7) % max(self.cpe_products, 1)
+
+    def in_zdi(self, year, i):
+        return self._share(self.zdi_share, year, i, 1)
+
+    def in_kev(self, year, i):
+        return self._share(self.kev_share, year, i, 2)
+
+    def has_gap(self, year, i):
+        return self._share(self.gap_share, year, i, 3)
+
+    def epss(self, year, i):
+        h = self._h(year, i, 4)
+        score = (h % 100_000) / 100_000
+        return round(score ** 3, 5), round(((h >> 20) % 100_000) / 100_000, 5)
+
+    # --- NVD ---------------------------------------------------------------
+
+    def nvd_cve(self, year, i):
+        cve_id = self.cve_id(year, i)
+        published = self.published(year, i)
+        vendor, product = self.vendor_product(self.product_of(year, i))
+        cve = {
+            "id": cve_id,
+            "sourceIdentifier": "cve@mitre.org",
+            "published": published.isoformat(timespec="milliseconds"),
+            "lastModified": (published + timedelta(days=3)).isoformat(timespec="milliseconds"),
+            "vulnStatus": "Analyzed",
+            "descriptions": [{"lang": "en", "value": self.summary(year, i)}],
+            "metrics": {},
+            "configurations": [],
+            "references": [{"url": f"https://{vendor}.example/advisories/{cve_id}", "source": "cve@mitre.org"}],
+        }
+        if not self.has_gap(year, i):
+            vector, score, severity = pick(CVSS31, year, i, 5)
+            cve["metrics"]["cvssMetricV31"] = [{
+                "source": "nvd@nist.gov", "type": "Primary",
+                "cvssData": {"version": "3.1", "vectorString": vector, "baseScore": score, "baseSeverity": severity},
+            }]
+            cve["configurations"] = [{"nodes": [{"operator": "OR", "negate": False, "cpeMatch": [{
+                "vulnerable": True,
+                "criteria": f"cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*",
+                "versionEndExcluding": f"{1 + i % 9}.{i % 10}.0",
+            }]}]}]
+        return cve
+
+    def summary(self, year, i):
+        vendor, product = self.vendor_product(self.product_of(year, i))
+        return f"{pick(FLAWS, year, i, 8)} in {vendor} {product} allows {pick(IMPACTS, year, i, 9)}."
+
+    def write_nvd_feed(self, path, name):
+        """Écrit le flux NVD 2.0 `name` (année ou "modified") en flux continu ; retourne le `.meta`."""
+        if name == "modified":
+            # derniers jours : la fin de l'année la plus récente
+            year = self.years[-1]
+            n = self.per_year[year]
+            cves = ((year, i) for i in range(max(0, n - max(1, n // 50)), n))
+        else:
+            cves = self.iter_cves(int(name))
+        digest = hashlib.sha256()
+        size = 0
+        count = 0
+        with gzip.open(path, "wb", compresslevel=1) as f:
+            def write(text):
+                nonlocal size
+                data = text.encode()
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+
+            write('{"format":"NVD_CVE","version":"2.0","timestamp":"%sT03:00:01.000","vulnerabilities":[' % SCORE_DATE)
+            for year, i in cves:
+                write(("," if count else "") + json.dumps({"cve": self.nvd_cve(year, i)}, separators=(",", ":")))
+                count += 1
+            write("]}")
+        return (
+            f"lastModifiedDate:{SCORE_DATE}T03:00:01-04:00\r\n"
+            f"size:{size}\r\n"
+            f"zipSize:{path.stat().st_size}\r\n"
+            f"gzSize:{path.stat().st_size}\r\n"
+            f"sha256:{digest.hexdigest().upper()}\r\n"
+        )
+
+    # --- ZDI ---------------------------------------------------------------
+
+    def zdi_page(self, year):
+        """Page HTML annuelle des avis ZDI (une ligne <tr id="publishedAdvisories"> par avis)."""
+        yy = year % 100
+        rows = []
+        n = 0
+        for _, i in self.iter_cves(year):
+            if not self.in_zdi(year, i):
+                continue
+            n += 1
+            zdi_id = f"ZDI-{yy}-{n:05d}"
+            vendor, product = self.vendor_product(self.product_of(year, i))
+            cve = self.cve_id(year, i) if self._h(year, i, 10) % 20 else ""  # ~5 % sans CVE
+            day = self.published(year, i).strftime("%Y-%m-%d")
+            title = escape(f"{vendor} {product} {pick(FLAWS, year, i, 8)} Vulnerability")
+            rows.append(
+                f'<tr id="publishedAdvisories"><td>{zdi_id}</td><td>ZDI-CAN-{yy}{n:05d}</td><td>{vendor}</td>'
+                f'<td>{cve}</td><td>{pick(CVSS31, year, i, 5)[1]}</td><td>{day}</td><td>{day}</td>'
+                f'<td><a href="/advisories/{zdi_id}/">{title}</a></td></tr>'
+            )
+        return (
+            f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Published Advisories {year}</title>'
+            f'</head><body><table class="table" id="publishedTable"><thead><tr><th>ZDI ID</th><th>ZDI CAN</th>'
+            f'<th>AFFECTED VENDOR(S)</th><th>CVE</th><th>CVSS v3.0</th><th>PUBLISHED</th><th>UPDATED</th>'
+            f'<th>TITLE</th></tr></thead><tbody>\n' + "\n".join(rows) + "\n</tbody></table></body></html>"
+        )
+
+    # --- Zero-day.cz ---------------------------------------------------------
+
+    def zdcz_issue(self, k):
+        """k-ième problème Zero-day.cz, du plus récent (k=0) au plus ancien."""
+        step = max(1, self.records // max(self.zdcz_count, 1))
+        flat = self.records - 1 - k * step
+        for year in self.years:
+            if flat < self.per_year[year]:
+                return year, flat
+            flat -= self.per_year[year]
+        return self.years[0], 0
+
+    def zdcz_page(self, page, year_from=None, year_to=None):
+        """Page `page` (à partir de 1) de la base Zero-day.cz ; vide au-delà de la dernière."""
+        matching = [
+            k for k in range(self.zdcz_count)
+            if (year_from or 0) <= self.zdcz_issue(k)[0] <= (year_to or 9999)
+        ]
+        start = (page - 1) * self.zdcz_per_page
+        issues = []
+        for k in matching[start:start + self.zdcz_per_page]:
+            year, i = self.zdcz_issue(k)
+            vendor, product = self.vendor_product(self.product_of(year, i))
+            code = (f' <span class="issue-code">{self.cve_id(year, i)}</span>'
+                    if self._h(year, i, 11) % 10 else "")  # ~10 % sans CVE
+            issues.append(
+                f'<div class="issue"><div class="issue-title"><a href="https://www.zero-day.cz/database/{100000 + k}/">'
+                f'{escape(vendor)} {escape(product)} zero-day {k}</a>{code}</div>'
+                f'<div class="description for-l">{escape(self.summary(year, i))}</div>'
+                f'<div class="spec">Software: <strong>{escape(product)}</strong></div>'
+                f'<div class="issue-status"><span class="discavered">Discovered: '
+                f'<time>{self.published(year, i).strftime("%Y-%m-%d")}</time></span></div></div>'
+            )
+        return (
+            '<!DOCTYPE html><html lang="cs"><head><meta charset="utf-8"><title>Zero-day databáze</title></head>'
+            '<body><div id="issuew_wrap">' + "".join(issues) + "</div></body></html>"
+        )
+
+    # --- KEV / EPSS / CIRCL --------------------------------------------------
+
+    def kev_json(self):
+        entries = []
+        for year, i in self.iter_cves():
+            if self.in_kev(year, i):
+                vendor, product = self.vendor_product(self.product_of(year, i))
+                added = self.published(year, i) + timedelta(days=self._h(year, i, 12) % 60)
+                entries.append({
+                    "cveID": self.cve_id(year, i), "vendorProject": vendor, "product": product,
+                    "vulnerabilityName": self.summary(year, i), "dateAdded": added.strftime("%Y-%m-%d"),
+                    "requiredAction": "Apply mitigations per vendor instructions.",
+                    "knownRansomwareCampaignUse": "Unknown",
+                })
+        return {
+            "title": "CISA Catalog of Known Exploited Vulnerabilities",
+            "catalogVersion": SCORE_DATE.replace("-", "."),
+            "count": len(entries),
+            "vulnerabilities": entries,
+        }
+
+    def epss_api(self, cve_ids, limit=100, offset=0):
+        """Réponse de l'API FIRST pour `cve=a,b,c` (les CVE inconnues sont absentes)."""
+        data = []
+        for cve_id in cve_ids:
+            if self.exists(cve_id):
+                epss, percentile = self.epss(*self.parse_cve(cve_id))
+                data.append({"cve": cve_id, "epss": f"{epss:.9f}", "percentile": f"{percentile:.9f}", "date": SCORE_DATE})
+        page = data[offset:offset + limit]
+        return {"status": "OK", "status-code": 200, "version": "1.0", "total": len(data),
+                "offset": offset, "limit": limit, "data": page}
+
+    def write_epss_snapshot(self, path):
+        """Instantané CSV quotidien (epss_scores-AAAA-MM-JJ.csv.gz)."""
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+            f.write(f"#model_version:v2025.03.14,score_date:{SCORE_DATE}T00:00:00Z\n")
+            f.write("cve,epss,percentile\n")
+            for year, i in self.iter_cves():
+                epss, percentile = self.epss(year, i)
+                f.write(f"{self.cve_id(year, i)},{epss:.5f},{percentile:.5f}\n")
+
+    def circl(self, cve_id):
+        """Fiche CIRCL d'une CVE (None si inconnue)."""
+        if not self.exists(cve_id):
+            return None
+        year, i = self.parse_cve(cve_id)
+        vector, score, _ = pick(CVSS31, year, i, 5)
+        vendor, product = self.vendor_product(self.product_of(year, i))
+        epss, percentile = self.epss(year, i)
+        return {
+            "id": cve_id, "summary": self.summary(year, i), "cvss": None, "cvss3": score, "cvss3-vector": vector,
+            "epss": {"score": epss, "percentile": percentile},
+            "vulnerable_configuration": [f"cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*"],
+        }
+
+    # --- CPE / Wikipédia -----------------------------------------------------
+
+    def cpe_page(self, start_index, per_page):
+        products = []
+        for n in range(start_index, min(start_index + per_page, self.cpe_products)):
+            vendor, product = self.vendor_product(n)
+            version = f"{1 + n % 9}.{n % 7}.{n % 5}"
+            products.append({"cpe": {
+                "deprecated": False,
+                "cpeName": f"cpe:2.3:a:{vendor}:{product}:{version}:*:*:*:*:*:*:*",
+                "cpeNameId": f"{self._h(n, 13):016X}",
+                "lastModified": f"{SCORE_DATE}T10:00:00.000",
+                "titles": [{"title": f"{vendor.title()} {product.replace('_', ' ').title()} {version}", "lang": "en"}],
+            }})
+        return {"resultsPerPage": len(products), "startIndex": start_index, "totalResults": self.cpe_products,
+                "format": "NVD_CPE", "version": "2.0", "timestamp": f"{SCORE_DATE}T10:00:00.000",
+                "products": products}
+
+    def wiki_search(self, query):
+        h = self._h(int(hashlib.md5(query.encode()).hexdigest()[:12], 16))
+        hits = [] if h % 10_000 >= self.wiki_share * 10_000 else [{
+            "ns": 0, "title": query.replace("_", " ").title(), "pageid": h % 10_000_000, "snippet": escape(query),
+        }]
+        return {"batchcomplete": "", "query": {"searchinfo": {"totalhits": len(hits)}, "search": hits}}
+
+    def wiki_details(self, title):
+        h = self._h(int(hashlib.md5(title.encode()).hexdigest()[:12], 16))
+        categories = [{"ns": 14, "title": f"Category:{CATEGORIES[(h >> (4 * k)) % len(CATEGORIES)]}"} for k in range(3)]
+        return {"batchcomplete": "", "query": {"pages": {str(h % 10_000_000): {
+            "pageid": h % 10_000_000, "ns": 0, "title": title,
+            "extract": f"{title} is a software product used in synthetic benchmarks.",
+            "categories": categories,
+        }}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--years", type=int, nargs="+", default=[2025])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    universe = Universe(args.records, args.years, args.seed)
+    args.out.mkdir(parents=True, exist_ok=True)
+    for name in [*universe.years, "modified"]:
+        feed = args.out / f"nvdcve-2.0-{name}.json.gz"
+        (args.out / f"nvdcve-2.0-{name}.meta").write_text(universe.write_nvd_feed(feed, name))
+        print(f"[SYNTH] {feed}")
+    for year in universe.years:
+        (args.out / f"zdi_published_{year}.html").write_text(universe.zdi_page(year))
+    (args.out / "kev.json").write_text(json.dumps(universe.kev_json()))
+    universe.write_epss_snapshot(args.out / f"epss_scores-{SCORE_DATE}.csv.gz")
+    print(f"[SYNTH] {args.records} CVE sur {len(universe.years)} année(s) écrites dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
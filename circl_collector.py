@@ -1,6 +1,68 @@
-import requests
+import asyncio
+import logging
+import os
+import time
+import aiohttp
+import http_cache
+import http_client
+
+CIRCL_BASE_URL = os.getenv("CIRCL_BASE_URL", "https://cve.circl.lu")
+CIRCL_API = CIRCL_BASE_URL + "/api/cve/{}"
+
+MAX_CONCURRENCY = 8  # requêtes CIRCL simultanées
+RATE_PER_SECOND = 5  # débit maximal vers cve.circl.lu
+REQUEST_TIMEOUT = 20
+BREAKER_THRESHOLD = 5  # échecs consécutifs avant ouverture du disjoncteur
+BREAKER_COOLDOWN = 60  # secondes avant une nouvelle tentative
+
+log = logging.getLogger("circl")
+
+
+def nvd_configurations(v):
+    """Configurations fournies par NVD (celles de Zero-day.cz ou de CIRCL ne comptent pas)."""
+    return [c for c in v.get("configurations") or [] if isinstance(c, dict) and c.get("source") == "NVD"]
+
+
+def has_gaps(v) -> bool:
+    """Vrai si NVD n'a fourni aucun score CVSS ou aucune configuration pour cette CVE."""
+    cve_id = v.get("cve_id") or ""
+    if not cve_id.startswith("CVE-"):
+        return False
+    no_cvss = not any(v.get(k) for k in ("cvss2_base_score", "cvss3_base_score", "cvss4_base_score"))
+    return no_cvss or not nvd_configurations(v)
+
+
+def apply_circl(v, data):
+    """Complète la vulnérabilité avec les données CIRCL, sans écraser l'existant."""
+    if not data:
+        return v
+
+    # Scores CVSS (si manquant dans NVD)
+    if "cvss" in data:
+        v["cvss2_base_score"] = v.get("cvss2_base_score") or data.get("cvss")
+        v["cvss3_base_score"] = v.get("cvss3_base_score") or data.get("cvss3")
+        v["cvss4_base_score"] = v.get("cvss4_base_score") or data.get("cvss4")
+
+    # EPSS
+    epss = data.get("epss")
+    if epss:
+        v["epss_score"] = v.get("epss_score") or epss.get("score")
+        v["epss_percentile"] = v.get("epss_percentile") or epss.get("percentile")
+
+    # Configurations affectées
+    affected = data.get("vulnerable_configuration")
+    if affected:
+        v["affected_config"] = affected
+        if not nvd_configurations(v):
+            configurations = list(v.get("configurations") or [])
+            for cpe in (c if isinstance(c, str) else c.get("id") for c in affected):
+                config = {"source": "CIRCL", "product": cpe}
+                if cpe and config not in configurations:
+                    configurations.append(config)
+            v["configurations"] = configurations
+
+    return v
 
-CIRCL_API = "https://cve.circl.lu/api/cve/{}"
 
 def enrich_with_circl(v):
     """
@@ -12,34 +74,103 @@ def enrich_with_circl(v):
 
     url = CIRCL_API.format(cve_id)
     try:
-        r = requests.get(url, timeout=20)
+        r = http_cache.get(url, source="circl", timeout=REQUEST_TIMEOUT)
         if r.status_code == 404:
-            print(f"[CIRCL] CVE {cve_id} non trouvée")
+            log.debug("CVE %s non trouvée", cve_id)
             return v
         r.raise_for_status()
         data = r.json()
     except Exception as e:
-        print(f"[CIRCL] Erreur pour {cve_id}: {e}")
+        log.warning("Erreur pour %s : %s", cve_id, e)
         return v
 
-    if not data:
-        return v
+    return apply_circl(v, data)
 
-    # Scores CVSS (si manquant dans NVD)
-    if "cvss" in data:
-        v["cvss2_base_score"] = v.get("cvss2_base_score") or data.get("cvss")
-        v["cvss3_base_score"] = v.get("cvss3_base_score") or data.get("cvss3")
-        v["cvss4_base_score"] = v.get("cvss4_base_score") or data.get("cvss4")
 
-    # EPSS
-    epss = data.get("epss")
-    if epss:
-        v["epss_score"] = epss.get("score")
-        v["epss_percentile"] = epss.get("percentile")
+class CircuitBreaker:
+    """Disjoncteur : après `threshold` échecs consécutifs, les appels sont court-circuités
+    pendant `cooldown` secondes, puis une seule requête d'essai est autorisée ; son
+    succès referme le disjoncteur, son échec le rouvre pour `cooldown` secondes."""
 
-    # On peut ajouter d'autres infos comme versions affectées si besoin
-    affected = data.get("vulnerable_configuration")
-    if affected:
-        v["affected_config"] = affected
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False  # semi-ouvert : requête d'essai en cours
 
-    return v
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+            self.probing = True  # les autres appels restent court-circuités pendant l'essai
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing:
+            self.probing = False
+            self.opened_at = time.monotonic()
+            log.warning("Essai en échec : disjoncteur rouvert pour %ss", self.cooldown)
+        elif self.failures >= self.threshold and self.opened_at is None:
+            self.opened_at = time.monotonic()
+            log.warning("Disjoncteur ouvert pour %ss après %s échecs", self.cooldown, self.failures)
+
+
+async def fetch_circl_async(session, cve_id, sem, limiter, breaker):
+    """Récupère la fiche CIRCL d'une CVE (None si absente, en erreur ou disjoncteur ouvert)."""
+    async with sem:
+        if not breaker.allow():
+            return None
+        url = CIRCL_API.format(cve_id)
+        if not http_cache.is_fresh(url, source="circl"):
+            await limiter.acquire()  # les réponses en cache ne consomment pas de jeton
+        try:
+            r = await http_cache.get_async(session, url, source="circl")
+            if r.status_code == 404:
+                breaker.success()
+                return None
+            r.raise_for_status()
+            data = r.json()
+        except Exception as e:
+            breaker.failure()
+            log.warning("Erreur pour %s : %s", cve_id, e)
+            return None
+        breaker.success()
+        return data
+
+
+async def enrich_gaps_async(vulns, max_concurrency=MAX_CONCURRENCY, rate=RATE_PER_SECOND):
+    """Interroge CIRCL uniquement pour les vulnérabilités laissées incomplètes par NVD."""
+    targets = [v for v in vulns if has_gaps(v)]
+    if not targets:
+        return vulns
+    print(f"[CIRCL] Complément de {len(targets)}/{len(vulns)} vulnérabilités...")
+
+    sem = asyncio.Semaphore(max_concurrency)
+    limiter = http_client.AsyncTokenBucket(rate, burst=max_concurrency)
+    breaker = CircuitBreaker()
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with http_client.new_async_session(timeout=timeout) as session:
+        results = await asyncio.gather(*(
+            fetch_circl_async(session, v["cve_id"], sem, limiter, breaker) for v in targets
+        ))
+
+    filled = 0
+    for v, data in zip(targets, results):
+        if data:
+            apply_circl(v, data)
+            filled += 1
+    print(f"[CIRCL] {filled} vulnérabilités complétées")
+    return vulns
+
+
+def enrich_gaps(vulns, max_concurrency=MAX_CONCURRENCY, rate=RATE_PER_SECOND):
+    """Point d'entrée synchrone de l'étape CIRCL."""
+    return asyncio.run(enrich_gaps_async(vulns, max_concurrency, rate))
@@ -1,25 +1,16 @@
 import os
-import time
-import psycopg2
-import requests
-from psycopg2.extras import execute_values
+import db
+import http_cache
 
 API_KEY = os.getenv("NVD_API_KEY")
 HEADERS = {"apiKey": API_KEY}
 
-DB_PARAMS = {
-    "dbname": "zerodaydb",
-    "user": "postgres",
-    "password": "postgres",
-    "host": "localhost",
-    "port": 5432
-}
-
-BASE_URL = "https://services.nvd.nist.gov/rest/json/cpes/2.0"
+NVD_API_BASE_URL = os.getenv("NVD_API_BASE_URL", "https://services.nvd.nist.gov")
+BASE_URL = f"{NVD_API_BASE_URL}/rest/json/cpes/2.0"
 RESULTS_PER_PAGE = 2000
 
 def init_db():
-    with psycopg2.connect(**DB_PARAMS) as conn, conn.cursor() as cur:
+    with db.cursor() as cur:
         cur.execute("""
         CREATE TABLE IF NOT EXISTS softwares (
             software_id SERIAL PRIMARY KEY,
@@ -39,29 +30,30 @@ def init_db():
         );
         CREATE INDEX IF NOT EXISTS idx_softwares_vendor_product ON softwares(vendor, product);
         """)
-        conn.commit()
 
-def fetch_all_cpes():
-    start_index = 0
-    results = []
+def cpe_total():
+    """Nombre total de CPE annoncé par l'API (sert à découper l'espace d'index en tranches)."""
+    r = http_cache.get(f"{BASE_URL}?resultsPerPage=1&startIndex=0", headers=HEADERS, source="cpe", timeout=60)
+    r.raise_for_status()
+    return r.json().get("totalResults", 0)
 
-    while True:
+def iter_cpe_pages(start_index=0, stop_index=None):
+    """Générateur : (index de la page, [(cpe, vendor, product, titles)]) de start_index
+    jusqu'à stop_index exclu (None : jusqu'à la fin du dictionnaire)."""
+    while stop_index is None or start_index < stop_index:
         url = f"{BASE_URL}?resultsPerPage={RESULTS_PER_PAGE}&startIndex={start_index}"
         print(f"[CPE] Récupération à partir de l’index {start_index} ...")
 
-        r = requests.get(url, headers=HEADERS)
-        if r.status_code == 429:
-            print("[!] Trop de requêtes — pause de 10 secondes...")
-            time.sleep(10)
-            continue
-
+        # 429 / Retry-After et débit NVD gérés par http_client
+        r = http_cache.get(url, headers=HEADERS, source="cpe", timeout=60)
         r.raise_for_status()
         data = r.json()
 
         products = data.get("products", [])
         if not products:
-            break
+            return
 
+        rows = []
         for p in products:
             cpe = p.get("cpe", {})
             cpe_name = cpe.get("cpeName")
@@ -75,23 +67,42 @@ def fetch_all_cpes():
             product = parts[4]
             titles = [t["title"] for t in cpe.get("titles", [])]
 
-            results.append((cpe_name, vendor, product, titles or None))
+            rows.append((cpe_name, vendor, product, titles or None))
 
+        yield start_index, rows
         start_index += RESULTS_PER_PAGE
-        time.sleep(0.7)
+
+def fetch_all_cpes():
+    results = []
+    for _, rows in iter_cpe_pages():
+        results.extend(rows)
 
     print(f"[CPE] {len(results)} CPE collectées.")
     return results
 
 def insert_softwares(data):
-    with psycopg2.connect(**DB_PARAMS) as conn, conn.cursor() as cur:
+    with db.cursor() as cur:
         query = """
             INSERT INTO softwares (cpe, vendor, product, titles)
             VALUES %s
             ON CONFLICT (cpe) DO NOTHING;
         """
-        execute_values(cur, query, data)
-        conn.commit()
+        db.execute_values(cur, query, data)
+
+def run_cpe_shard(params, progress=None, checkpoint=None):
+    """Tranche [start, stop) de l'espace d'index CPE (ETL réparti, shards.py).
+
+    Chaque page est insérée dès sa réception ; `checkpoint` enregistre l'index
+    de la page suivante, d'où une tranche interrompue reprend."""
+    start = (progress or {}).get("next_index", params["start"])
+    collected = (progress or {}).get("rows", 0)
+    for index, rows in iter_cpe_pages(start, params.get("stop")):
+        if rows:
+            insert_softwares(rows)
+        collected += len(rows)
+        if checkpoint:
+            checkpoint({"next_index": index + RESULTS_PER_PAGE, "rows": collected})
+    return {"rows": collected}
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+import psycopg2
+from psycopg2 import extras, pool
+
+try:
+    import psycopg  # psycopg 3 : pilote asynchrone natif (optionnel)
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    psycopg = None
+
+# Accès à la base partagé par tous les points d'entrée :
+#   - paramètres lus dans l'environnement (variables libpq PGHOST, PGPORT, ...) ;
+#   - pool de connexions synchrone thread-safe (acquire / release, connection, cursor) ;
+#   - pool asynchrone pour le code asyncio : psycopg 3 s'il est installé, sinon le
+#     pool synchrone appelé depuis des threads (asyncio.to_thread), jamais depuis la boucle ;
+#   - exécution groupée : une instruction pour N lignes, un aller-retour par page.
+
+DB_PARAMS = {
+    "dbname": os.getenv("PGDATABASE", "zerodaydb"),
+    "user": os.getenv("PGUSER", "postgres"),
+    "password": os.getenv("PGPASSWORD", "postgres"),
+    "host": os.getenv("PGHOST", "localhost"),
+    "port": int(os.getenv("PGPORT", "5432")),
+}
+POOL_MIN = 1
+POOL_MAX = int(os.getenv("DB_POOL_SIZE", "8"))  # connexions ouvertes au plus par processus
+PAGE_SIZE = 1000  # lignes par aller-retour en exécution groupée
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect(**options):
+    """Connexion dédiée hors pool (schéma jetable via options, outils de mesure)."""
+    return psycopg2.connect(**DB_PARAMS, **options)
+
+
+def get_pool():
+    """Pool synchrone du processus, créé à la première utilisation."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_PARAMS)
+        return _pool
+
+
+def acquire(autocommit=True):
+    """Emprunte une connexion pour une durée longue (un run, un thread écrivain) ; à rendre via release()."""
+    conn = get_pool().getconn()
+    conn.autocommit = autocommit
+    return conn
+
+
+def release(conn):
+    """Rend une connexion au pool (fermée si elle est inutilisable)."""
+    if not conn.closed and not conn.autocommit:
+        conn.rollback()  # ne jamais rendre une transaction ouverte
+    get_pool().putconn(conn, close=bool(conn.closed))
+
+
+@contextmanager
+def connection(autocommit=False):
+    """Connexion du pool le temps d'un bloc : commit à la sortie, rollback sur exception."""
+    conn = acquire(autocommit)
+    try:
+        yield conn
+        if not autocommit:
+            conn.commit()
+    finally:
+        release(conn)
+
+
+@contextmanager
+def cursor(autocommit=False, **kwargs):
+    with connection(autocommit) as conn, conn.cursor(**kwargs) as cur:
+        yield cur
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+def execute_values(cur, sql, rows, page_size=PAGE_SIZE, **kwargs):
+    """INSERT ... VALUES %s pour toutes les lignes, une instruction multi-lignes par page."""
+    return extras.execute_values(cur, sql, rows, page_size=page_size, **kwargs)
+
+
+def execute_batch(cur, sql, rows, page_size=PAGE_SIZE):
+    """Instruction paramétrée (UPDATE, ...) répétée pour chaque ligne, regroupée par page."""
+    extras.execute_batch(cur, sql, rows, page_size=page_size)
+
+
+class AsyncPool:
+    """Accès asynchrone : fetchall / execute / executemany en autocommit.
+
+    Avec psycopg 3, les requêtes passent par AsyncConnectionPool (executemany
+    utilise le mode pipeline). Sinon, elles sont exécutées dans des threads sur le
+    pool synchrone, au plus POOL_MAX à la fois ; la boucle d'événements n'est
+    jamais bloquée par une attente de connexion ou de réponse."""
+
+    def __init__(self, max_size=POOL_MAX):
+        self.max_size = max_size
+        self.pool = None
+        self.slots = None
+
+    async def open(self):
+        if psycopg is not None:
+            conninfo = psycopg.conninfo.make_conninfo(**DB_PARAMS)
+            self.pool = AsyncConnectionPool(conninfo, min_size=POOL_MIN, max_size=self.max_size,
+                                            kwargs={"autocommit": True}, open=False)
+            await self.pool.open()
+        else:
+            self.slots = asyncio.Semaphore(self.max_size)
+        return self
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def _in_thread(self, fn, *args):
+        async with self.slots:
+            return await asyncio.to_thread(fn, *args)
+
+    async def fetchall(self, sql, params=None, dicts=False):
+        if self.pool is not None:
+            async with self.pool.connection() as conn:
+                async with conn.cursor(row_factory=dict_row if dicts else None) as cur:
+                    await cur.execute(sql, params)
+                    return await cur.fetchall()
+        return await self._in_thread(_fetchall, sql, params, dicts)
+
+    async def execute(self, sql, params=None):
+        if self.pool is not None:
+            async with self.pool.connection() as conn:
+                await conn.execute(sql, params)
+            return
+        await self._in_thread(_execute, sql, params)
+
+    async def executemany(self, sql, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        if self.pool is not None:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany(sql, rows)
+            return
+        await self._in_thread(_executemany, sql, rows)
+
+
+def _fetchall(sql, params, dicts):
+    with cursor(autocommit=True, cursor_factory=extras.RealDictCursor if dicts else None) as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _execute(sql, params):
+    with cursor(autocommit=True) as cur:
+        cur.execute(sql, params)
+
+
+def _executemany(sql, rows):
+    with cursor() as cur:
+        execute_batch(cur, sql, rows)
+
+
+@asynccontextmanager
+async def async_pool(max_size=POOL_MAX):
+    adb = await AsyncPool(max_size).open()
+    try:
+        yield adb
+    finally:
+        await adb.close()
@@ -0,0 +1,306 @@
+import io
+import json
+import metrics
+from datetime import date, datetime
+
+# Colonnes de `vulnerabilities` alimentées par l'ETL, dans l'ordre du COPY
+VULN_COLUMNS = [
+    "canonical_id", "title", "summary", "vendor_product", "configurations",
+    "first_seen", "disclosed", "published_nvd", "cve_id",
+    "exploited_in_wild", "kev_added", "kev_latency_days",
+    "cvss2_base_score", "cvss2_vector",
+    "cvss3_base_score", "cvss3_vector",
+    "cvss4_base_score", "cvss4_vector",
+    "epss_score", "epss_percentile",
+    "refs", "tags",
+]
+
+STAGING_DDL = """
+    CREATE TEMP TABLE vuln_staging (
+        seq INT,
+        canonical_id TEXT,
+        title TEXT,
+        summary TEXT,
+        vendor_product JSONB,
+        configurations JSONB,
+        first_seen TIMESTAMP,
+        disclosed TIMESTAMP,
+        published_nvd TIMESTAMP,
+        cve_id TEXT,
+        exploited_in_wild BOOLEAN,
+        kev_added TIMESTAMP,
+        kev_latency_days INT,
+        cvss2_base_score FLOAT,
+        cvss2_vector TEXT,
+        cvss3_base_score FLOAT,
+        cvss3_vector TEXT,
+        cvss4_base_score FLOAT,
+        cvss4_vector TEXT,
+        epss_score FLOAT,
+        epss_percentile FLOAT,
+        refs JSONB,
+        tags JSONB
+    ) ON COMMIT DROP
+"""
+
+# Une seule instruction ensembliste : le lot (dernière occurrence de chaque
+# canonical_id) est fusionné avec la ligne existante avant l'écriture.
+# refs / tags sont unis, first_seen / disclosed gardent la date la plus ancienne,
+# et les colonnes enrichies sont rafraîchies sans effacer une valeur connue par NULL.
+# content_hash (md5 des champs persistés) permet de ne réécrire que les lignes
+# réellement modifiées : les lignes inchangées ne génèrent ni WAL ni tuple mort.
+MERGE_SQL = """
+    WITH incoming AS (
+        SELECT DISTINCT ON (canonical_id) *
+        FROM vuln_staging
+        ORDER BY canonical_id, seq DESC
+    ), merged AS (
+        SELECT
+            s.canonical_id,
+            COALESCE(s.title, v.title) AS title,
+            COALESCE(s.summary, v.summary) AS summary,
+            COALESCE(NULLIF(s.vendor_product, '[]'::jsonb), v.vendor_product, '[]'::jsonb) AS vendor_product,
+            COALESCE(NULLIF(s.configurations, '[]'::jsonb), v.configurations, '[]'::jsonb) AS configurations,
+            LEAST(s.first_seen, v.first_seen) AS first_seen,
+            LEAST(s.disclosed, v.disclosed) AS disclosed,
+            COALESCE(s.published_nvd, v.published_nvd) AS published_nvd,
+            COALESCE(s.cve_id, v.cve_id) AS cve_id,
+            COALESCE(s.exploited_in_wild, FALSE) OR COALESCE(v.exploited_in_wild, FALSE) AS exploited_in_wild,
+            COALESCE(s.kev_added, v.kev_added) AS kev_added,
+            -- recalculée sur les dates fusionnées (les lots d'une même CVE peuvent arriver séparément)
+            COALESCE(
+                COALESCE(s.kev_added, v.kev_added)::date - LEAST(s.first_seen, v.first_seen)::date,
+                s.kev_latency_days, v.kev_latency_days
+            ) AS kev_latency_days,
+            COALESCE(s.cvss2_base_score, v.cvss2_base_score) AS cvss2_base_score,
+            COALESCE(s.cvss2_vector, v.cvss2_vector) AS cvss2_vector,
+            COALESCE(s.cvss3_base_score, v.cvss3_base_score) AS cvss3_base_score,
+            COALESCE(s.cvss3_vector, v.cvss3_vector) AS cvss3_vector,
+            COALESCE(s.cvss4_base_score, v.cvss4_base_score) AS cvss4_base_score,
+            COALESCE(s.cvss4_vector, v.cvss4_vector) AS cvss4_vector,
+            COALESCE(s.epss_score, v.epss_score) AS epss_score,
+            COALESCE(s.epss_percentile, v.epss_percentile) AS epss_percentile,
+            (
+                SELECT COALESCE(jsonb_agg(DISTINCT r), '[]'::jsonb)
+                FROM jsonb_array_elements(COALESCE(v.refs, '[]'::jsonb) || COALESCE(s.refs, '[]'::jsonb)) r
+            ) AS refs,
+            ARRAY(
+                SELECT DISTINCT t
+                FROM unnest(COALESCE(v.tags, '{{}}') || ARRAY(SELECT jsonb_array_elements_text(s.tags))) t
+                ORDER BY t
+            ) AS tags
+        FROM incoming s
+        LEFT JOIN vulnerabilities v USING (canonical_id)
+    )
+    INSERT INTO vulnerabilities ({columns}, content_hash)
+    SELECT {columns}, md5(ROW({hashed})::text) FROM merged
+    ON CONFLICT (canonical_id) DO UPDATE SET
+        {updates},
+        content_hash=EXCLUDED.content_hash,
+        updated_at=NOW()
+    WHERE vulnerabilities.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+    RETURNING vuln_id, (xmax = 0) AS inserted
+""".format(
+    columns=", ".join(VULN_COLUMNS),
+    hashed=", ".join(c for c in VULN_COLUMNS if c != "canonical_id"),
+    updates=",\n        ".join(f"{c}=EXCLUDED.{c}" for c in VULN_COLUMNS if c != "canonical_id"),
+)
+
+# Verrou transactionnel par canonical_id du lot, pris dans un ordre fixe (pas
+# d'interblocage) avant MERGE_SQL : deux lots concurrents portant la même
+# vulnérabilité (workers de shards.py, sources différentes) sont sérialisés.
+# MERGE_SQL étant une nouvelle instruction, son instantané (READ COMMITTED)
+# contient la ligne validée par l'autre lot : refs / tags / first_seen sont
+# fusionnés avec elle au lieu d'être écrasés.
+LOCK_SQL = """
+    SELECT pg_advisory_xact_lock(hashtext('vulnerabilities'), k.key)
+    FROM (
+        SELECT DISTINCT hashtext(canonical_id) AS key FROM vuln_staging ORDER BY key
+    ) k
+"""
+
+MAPPING_STAGING_DDL = """
+    CREATE TEMP TABLE mapping_staging (
+        canonical_id TEXT,
+        source_name TEXT,
+        source_id TEXT,
+        url TEXT
+    ) ON COMMIT DROP
+"""
+
+# Provenance : une ligne par (source, identifiant) rattachée au vuln_id de la
+# vulnérabilité fusionnée juste avant, dans la même transaction. La jointure
+# couvre aussi les lignes inchangées, que MERGE_SQL ne retourne pas.
+MAPPING_SQL = """
+    INSERT INTO source_mappings (vuln_id, source_name, source_id, url)
+    SELECT DISTINCT ON (m.source_name, m.source_id) v.vuln_id, m.source_name, m.source_id, m.url
+    FROM mapping_staging m
+    JOIN vulnerabilities v USING (canonical_id)
+    ORDER BY m.source_name, m.source_id
+    ON CONFLICT (source_name, source_id) DO UPDATE SET
+        vuln_id=EXCLUDED.vuln_id,
+        url=EXCLUDED.url,
+        retrieved=NOW()
+    WHERE (source_mappings.vuln_id, source_mappings.url) IS DISTINCT FROM (EXCLUDED.vuln_id, EXCLUDED.url)
+"""
+
+NVD_DETAIL_URL = "https://nvd.nist.gov/vuln/detail/{}"
+
+
+def dedupe_vendor_products(vendor_products):
+    """Supprime les doublons (vendor, product) en conservant l'ordre."""
+    seen = set()
+    unique = []
+    for vp in vendor_products or []:
+        key = (vp.get("vendor"), vp.get("product"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(vp)
+    return unique
+
+
+def _copy_value(value):
+    """Formate une valeur pour COPY ... FROM STDIN (format texte)."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, default=str)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def vuln_row(v):
+    v["vendor_product"] = dedupe_vendor_products(v.get("vendor_product"))
+    return [
+        v["cve_id"],
+        v.get("title"),
+        v.get("summary"),
+        v.get("vendor_product", []),
+        v.get("configurations", []),
+        v.get("first_seen"),
+        v.get("disclosed"),
+        v.get("published_nvd"),
+        v.get("cve_id"),
+        v.get("exploited_in_wild", False),
+        v.get("kev_added"),
+        v.get("kev_latency_days"),
+        v.get("cvss2_base_score"),
+        v.get("cvss2_vector"),
+        v.get("cvss3_base_score"),
+        v.get("cvss3_vector"),
+        v.get("cvss4_base_score"),
+        v.get("cvss4_vector"),
+        v.get("epss_score"),
+        v.get("epss_percentile"),
+        v.get("refs", []),
+        v.get("tags", []),
+    ]
+
+
+def mapping_rows(v):
+    """Identifiants de la vulnérabilité dans chaque source (ZDI, Zero-day.cz, KEV, NVD)."""
+    cve_id = v["cve_id"]
+    rows = []
+    for ref in v.get("refs") or []:
+        url = ref.get("url")
+        if not url:
+            continue
+        if ref.get("source") == "ZDI":
+            # https://www.zerodayinitiative.com/advisories/ZDI-25-123/ -> ZDI-25-123
+            rows.append(("ZDI", url.rstrip("/").rsplit("/", 1)[-1], url))
+        elif ref.get("source") == "Zero-day.cz":
+            rows.append(("Zero-day.cz", url, url))
+        elif ref.get("source") == "CISA KEV":
+            rows.append(("CISA KEV", cve_id, url))
+    if v.get("published_nvd"):
+        rows.append(("NVD", cve_id, NVD_DETAIL_URL.format(cve_id)))
+    return [[cve_id, *row] for row in rows]
+
+
+def _copy_lines(rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(x) for x in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def copy_buffer(vulns):
+    return _copy_lines([seq] + vuln_row(v) for seq, v in enumerate(vulns))
+
+
+def mapping_buffer(vulns):
+    return _copy_lines(row for v in vulns for row in mapping_rows(v))
+
+
+def write_batch(cur, vulns):
+    """Corps transactionnel de bulk_upsert (sans commit) ; retourne
+    (lignes écrites [(vuln_id, insérée)], correspondances écrites)."""
+    cur.execute(STAGING_DDL)
+    cur.copy_expert(
+        "COPY vuln_staging (seq, {}) FROM STDIN".format(", ".join(VULN_COLUMNS)),
+        copy_buffer(vulns),
+    )
+    cur.execute(LOCK_SQL)
+    cur.fetchall()
+    cur.execute(MERGE_SQL)
+    written = cur.fetchall()
+
+    cur.execute(MAPPING_STAGING_DDL)
+    cur.copy_expert(
+        "COPY mapping_staging (canonical_id, source_name, source_id, url) FROM STDIN",
+        mapping_buffer(vulns),
+    )
+    cur.execute(MAPPING_SQL)
+    return written, cur.rowcount
+
+
+def bulk_upsert(conn, vulns, label="ETL"):
+    """Charge un lot de vulnérabilités en une transaction : COPY dans une table
+    temporaire puis fusion ensembliste dans `vulnerabilities`, suivie des
+    correspondances de `source_mappings`.
+
+    Retourne le décompte {"inserted", "changed", "unchanged"} du lot."""
+    vulns = [v for v in vulns if v.get("cve_id")]
+    if not vulns:
+        return {"inserted": 0, "changed": 0, "unchanged": 0}
+
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with metrics.stage("upsert", len(vulns)), conn, conn.cursor() as cur:
+            written, mapped = write_batch(cur, vulns)
+    finally:
+        conn.autocommit = autocommit
+
+    inserted = sum(1 for _, is_new in written if is_new)
+    counts = {
+        "inserted": inserted,
+        "changed": len(written) - inserted,
+        "unchanged": len({v["cve_id"] for v in vulns}) - len(written),
+    }
+    print(f"[{label}] {counts['inserted']} insérées, {counts['changed']} modifiées, "
+          f"{counts['unchanged']} inchangées, {mapped} correspondances de source écrites")
+    return counts
+
+
+def sink_batches(conn, batches, label="ETL"):
+    """Écrit un flux de lots, chacun dans sa propre transaction ; retourne les totaux."""
+    totals = {"inserted": 0, "changed": 0, "unchanged": 0}
+    for batch in batches:
+        counts = bulk_upsert(conn, batch, label=label)
+        for key in totals:
+            totals[key] += counts[key]
+    print(f"[{label}] Total : {totals['inserted']} insérées, {totals['changed']} modifiées, "
+          f"{totals['unchanged']} inchangées")
+    return totals
@@ -1,17 +1,107 @@
-import requests
+import csv
+import gzip
+import logging
+import os
+import db
+import http_cache
+import http_client
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+from pathlib import Path
+
+EPSS_API_BASE_URL = os.getenv("EPSS_API_BASE_URL", "https://api.first.org")
+EPSS_SNAPSHOT_BASE_URL = os.getenv("EPSS_SNAPSHOT_BASE_URL", "https://epss.cyentia.com")
+EPSS_API = f"{EPSS_API_BASE_URL}/data/v1/epss"
+EPSS_SNAPSHOT_URL = EPSS_SNAPSHOT_BASE_URL + "/epss_scores-{date}.csv.gz"
+API_BATCH_SIZE = 100  # nombre de CVE par requête `cve=` (limite de page de l'API)
+STORE_MAX_AGE_DAYS = 1  # un score stocké est réutilisé tant qu'il date d'au plus 1 jour
+
+log = logging.getLogger("epss")
+
+
+def cve_key(cve_id: str):
+    """Encode CVE-AAAA-NNNN en entier (AAAA * 10^8 + NNNN) pour l'index trié."""
+    try:
+        _, year, number = cve_id.split("-")
+        return int(year) * 100_000_000 + int(number)
+    except (AttributeError, ValueError):
+        return None
+
+
+class EPSSSnapshot:
+    """Instantané EPSS quotidien (CSV FIRST) stocké dans des tableaux compacts.
+
+    Les CVE sont encodées en entiers triés ; une recherche est une dichotomie
+    et l'ensemble du fichier (~250k lignes) tient en quelques Mo.
+    """
+
+    def __init__(self, score_date, keys, scores, percentiles):
+        self.score_date = score_date
+        self.keys = keys
+        self.scores = scores
+        self.percentiles = percentiles
+
+    @classmethod
+    def from_csv(cls, lines):
+        score_date = None
+        rows = []
+        for line in lines:
+            if line.startswith("#"):
+                # ex. "#model_version:v2025.03.14,score_date:2025-10-17T12:55:00Z"
+                for field in line[1:].strip().split(","):
+                    key, _, value = field.partition(":")
+                    if key == "score_date":
+                        score_date = value[:10]
+                continue
+            if line.startswith("cve,"):
+                continue
+            cve_id, epss, percentile = next(csv.reader([line]))[:3]
+            key = cve_key(cve_id)
+            if key is not None:
+                rows.append((key, float(epss), float(percentile)))
+
+        rows.sort()
+        keys = array("q", (r[0] for r in rows))
+        scores = array("f", (r[1] for r in rows))
+        percentiles = array("f", (r[2] for r in rows))
+        return cls(score_date, keys, scores, percentiles)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_csv(f)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, cve_id: str):
+        key = cve_key(cve_id)
+        if key is None:
+            return None, None
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            # float32 -> arrondi à la précision publiée par FIRST (5 décimales)
+            return round(self.scores[i], 5), round(self.percentiles[i], 5)
+        return None, None
+
 
 class EPSSEnricher:
-    def __init__(self):
+    def __init__(self, use_snapshot=False, snapshot_dir="."):
         self.cache = {}  # {cve_id: (epss_score, epss_percentile)}
+        self.use_snapshot = use_snapshot
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot = None
+        self.fetched = {}  # {cve_id: score_date} scores obtenus pendant ce run, à historiser
 
     def fetch(self, cve_id: str):
         """Récupère le score EPSS et percentile pour une CVE via l'API FIRST."""
         if cve_id in self.cache:
             return self.cache[cve_id]
 
-        url = f"https://api.first.org/data/v1/epss?cve={cve_id}"
+        url = f"{EPSS_API}?cve={cve_id}"
         try:
-            resp = requests.get(url, timeout=10)
+            resp = http_cache.get(url, source="epss", timeout=10)
             resp.raise_for_status()
             data = resp.json()
             if data.get("data"):
@@ -21,11 +111,128 @@ class EPSSEnricher:
                 self.cache[cve_id] = (epss_score, epss_percentile)
                 return epss_score, epss_percentile
         except Exception as e:
-            print(f"[EPSS] Impossible de récupérer EPSS pour {cve_id}: {e}")
+            log.warning("Impossible de récupérer EPSS pour %s : %s", cve_id, e)
 
         self.cache[cve_id] = (None, None)
         return None, None
 
+    def fetch_batch(self, cve_ids):
+        """Résout jusqu'à API_BATCH_SIZE CVE en une seule requête `cve=a,b,c`."""
+        try:
+            resp = http_cache.get(
+                EPSS_API,
+                source="epss",
+                params={"cve": ",".join(cve_ids), "limit": len(cve_ids)},
+                timeout=30,
+            )
+            resp.raise_for_status()
+            for entry in resp.json().get("data", []):
+                self.cache[entry["cve"]] = (float(entry["epss"]), float(entry["percentile"]))
+                self.fetched[entry["cve"]] = entry.get("date") or date.today().isoformat()
+        except Exception as e:
+            log.warning("Erreur requête groupée (%s CVE) : %s", len(cve_ids), e)
+
+        # CVE absentes de la réponse : pas de score EPSS
+        for cve_id in cve_ids:
+            self.cache.setdefault(cve_id, (None, None))
+
+    def load_snapshot(self, score_date=None):
+        """Charge l'instantané CSV quotidien (téléchargé une seule fois par jour).
+
+        Le fichier local porte la date demandée, pas la date de publication lue
+        dans l'en-tête : c'est elle que les exécutions suivantes du jour cherchent,
+        y compris quand l'instantané du jour n'était pas publié (repli sur `current`)."""
+        score_date = score_date or date.today().isoformat()
+        path = self.snapshot_dir / f"epss_scores-{score_date}.csv.gz"
+        if not path.exists():
+            # Téléchargé hors du cache HTTP : le fichier daté est l'unique copie
+            url = EPSS_SNAPSHOT_URL.format(date=score_date)
+            log.info("Téléchargement de l'instantané %s ...", url)
+            r = http_client.get(url, timeout=60, stream=True)
+            if r.status_code == 404:
+                # L'instantané du jour n'est pas encore publié : on prend le plus récent
+                r = http_client.get(EPSS_SNAPSHOT_URL.format(date="current"), timeout=60, stream=True)
+            r.raise_for_status()
+            tmp = path.with_name(path.name + ".part")
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+            os.replace(tmp, path)
+        snapshot = EPSSSnapshot.load(path)
+
+        self.snapshot = snapshot
+        log.info("Instantané %s : %s scores", snapshot.score_date, len(snapshot))
+        return snapshot
+
+    def fetch_many(self, cve_ids):
+        """Résout en bloc les scores EPSS d'une liste de CVE (instantané ou requêtes groupées)."""
+        missing = set()
+        for cve_id in cve_ids:
+            if not cve_id or cve_id in self.cache:
+                continue
+            if cve_id.startswith("CVE-"):
+                missing.add(cve_id)
+            else:
+                self.cache[cve_id] = (None, None)  # identifiants ZDI / Zero-day.cz : pas d'EPSS
+        missing = sorted(missing)
+        if not missing:
+            return self.cache
+
+        if self.use_snapshot:
+            try:
+                snapshot = self.snapshot or self.load_snapshot()
+                for cve_id in missing:
+                    self.cache[cve_id] = snapshot.get(cve_id)
+                    self.fetched[cve_id] = snapshot.score_date or date.today().isoformat()
+                return self.cache
+            except Exception as e:
+                log.warning("Instantané indisponible, repli sur l'API : %s", e)
+
+        for i in range(0, len(missing), API_BATCH_SIZE):
+            self.fetch_batch(missing[i:i + API_BATCH_SIZE])
+        log.info("%s CVE résolues en %s requête(s)", len(missing), (len(missing) - 1) // API_BATCH_SIZE + 1)
+        return self.cache
+
+    def load_store(self, cur, cve_ids):
+        """Recharge depuis `epss_history` les scores récents déjà connus (aucun appel réseau).
+
+        Un score plus ancien que l'instantané chargé n'est pas repris : l'instantané fait foi."""
+        cve_ids = sorted({c for c in cve_ids if c and c.startswith("CVE-") and c not in self.cache})
+        if not cve_ids:
+            return 0
+        since = date.today() - timedelta(days=STORE_MAX_AGE_DAYS)
+        if self.snapshot is not None and self.snapshot.score_date:
+            since = max(since, date.fromisoformat(self.snapshot.score_date))
+        cur.execute("""
+            SELECT DISTINCT ON (cve_id) cve_id, epss_score, epss_percentile
+            FROM epss_history
+            WHERE cve_id = ANY(%s)
+              AND score_date >= %s
+            ORDER BY cve_id, score_date DESC
+        """, (cve_ids, since))
+        rows = cur.fetchall()
+        for cve_id, epss_score, epss_percentile in rows:
+            self.cache[cve_id] = (epss_score, epss_percentile)
+        log.info("%s/%s scores repris depuis epss_history", len(rows), len(cve_ids))
+        return len(rows)
+
+    def save_store(self, cur):
+        """Historise en une insertion groupée les scores obtenus pendant ce run (append-only)."""
+        rows = [
+            (cve_id, score_date, *self.cache[cve_id])
+            for cve_id, score_date in self.fetched.items()
+            if self.cache.get(cve_id, (None, None))[0] is not None
+        ]
+        if rows:
+            db.execute_values(cur, """
+                INSERT INTO epss_history (cve_id, score_date, epss_score, epss_percentile)
+                VALUES %s
+                ON CONFLICT (cve_id, score_date) DO NOTHING
+            """, rows)
+        log.info("%s scores ajoutés à epss_history", len(rows))
+        self.fetched.clear()
+        return len(rows)
+
     def enrich(self, vuln: dict) -> dict:
         """Ajoute epss_score et epss_percentile à la vulnérabilité."""
         cve_id = vuln.get("cve_id")
@@ -1,73 +1,386 @@
-import psycopg2
-from nvd_collector import NVDEnricher
+import os
+import db
+import etl_state
+import metrics
+from datetime import datetime
+from itertools import chain, islice
+from nvd_collector import NVDEnricher, get_cve_year
 from kev_collector import KEVEnricher
 from zdi_collector import ZDICollector
 from zdcz_collector import ZDCZCollector
-from epss_collector import EPSSEnricher
+from epss_collector import STORE_MAX_AGE_DAYS, EPSSEnricher
+from circl_collector import enrich_gaps
+from db_sink import bulk_upsert, sink_batches
 
-YEAR_FROM = 2025
-YEAR_TO = 2025
+YEAR_FROM = int(os.getenv("ETL_YEAR_FROM", "2025"))
+YEAR_TO = int(os.getenv("ETL_YEAR_TO", str(YEAR_FROM)))
+NVD_USE_INDEX = os.getenv("NVD_USE_INDEX", "1") == "1"  # index SQLite persistant ; 0 = en mémoire, cache LRU borné
+NVD_SYNC = True  # synchronisation incrémentale (.meta + flux modified) avant enrichissement
+NVD_CACHE_BUDGET_MB = int(os.getenv("NVD_CACHE_BUDGET_MB", "2048"))  # budget du cache LRU (mode en mémoire)
+NVD_WORKERS = int(os.getenv("NVD_WORKERS", os.cpu_count() or 1))  # processus pour le chargement NVD
+CIRCL_FILL_GAPS = True  # complète via CIRCL les CVE sans CVSS/configurations NVD
+EPSS_USE_SNAPSHOT = True  # instantané CSV quotidien plutôt que l'API FIRST
+STREAM_BATCH_SIZE = int(os.getenv("ETL_BATCH_SIZE", "1000"))  # vulnérabilités par transaction en mode flux
+
+EMPTY = (None, "", [], {})
+
+
+def merge_candidates(candidates):
+    """Regroupe les candidats de toutes les sources par canonical_id : une seule entrée
+    par vulnérabilité, refs / tags / configurations unis, first_seen et disclosed les
+    plus anciens, et pour les autres champs la première valeur renseignée."""
+    merged = {}
+    for v in candidates:
+        key = v.get("canonical_id") or v.get("cve_id")
+        if not key:
+            continue
+        m = merged.get(key)
+        if m is None:
+            merged[key] = {
+                **v,
+                "canonical_id": key,
+                "refs": list(v.get("refs") or []),
+                "tags": list(v.get("tags") or []),
+                "configurations": list(v.get("configurations") or []),
+            }
+            continue
+
+        for field in ("refs", "tags", "configurations"):
+            for item in v.get(field) or []:
+                if item not in m[field]:
+                    m[field].append(item)
+        for field in ("first_seen", "disclosed"):
+            if v.get(field) and (not m.get(field) or v[field] < m[field]):
+                m[field] = v[field]
+        for field, value in v.items():
+            if m.get(field) in EMPTY and value not in EMPTY:
+                m[field] = value
+    return list(merged.values())
+
+
+def nvd_years(vulns):
+    """Années NVD couvertes par les CVE d'une liste de vulnérabilités."""
+    years = {get_cve_year(v["cve_id"]) for v in vulns if (v.get("cve_id") or "").startswith("CVE-")}
+    years.discard(None)
+    return years
+
+
+def load_nvd_years(nvd_enricher, years):
+    """Charge (en parallèle) puis synchronise les années NVD demandées."""
+    with metrics.stage("nvd_load"):
+        nvd_enricher.prefetch(years, workers=NVD_WORKERS)
+        if NVD_SYNC and NVD_USE_INDEX:
+            nvd_enricher.sync(years)
+
+
+def enrich_candidates(vulns, nvd_enricher, kev_enricher, epss_enricher, cur):
+    """Enrichit un lot de vulnérabilités fusionnées : NVD, EPSS, KEV puis CIRCL."""
+    with metrics.stage("nvd_enrich", len(vulns)):
+        nvd_enricher.enrich_all(vulns)  # année par année, cache LRU borné
+    with metrics.stage("epss", len(vulns)):
+        candidate_ids = [v.get("cve_id") for v in vulns]
+        epss_enricher.load_store(cur, candidate_ids)
+        epss_enricher.fetch_many(candidate_ids)
+        epss_enricher.save_store(cur)
+    with metrics.stage("kev_enrich", len(vulns)):
+        for v in vulns:
+            v = kev_enricher.enrich(v)
+            v = kev_enricher.compute_dates(v)
+            v = epss_enricher.enrich(v)
+
+    if CIRCL_FILL_GAPS:
+        with metrics.stage("circl", len(vulns)):
+            enrich_gaps(vulns)
+    return vulns
+
+
+def open_sources(cur, incremental=True):
+    """Prépare les collecteurs ZDI / Zero-day.cz ; en mode incrémental ils repartent
+    des marques hautes validées dans etl_state. Retourne (état, zdi, zdcz)."""
+    state = etl_state.load(cur) if incremental else {}
+    stage = etl_state.resume_point(state)
+    if stage:
+        print(f"[ETL] Exécution précédente interrompue à l'étape « {stage} » : reprise depuis les dernières marques validées")
+
+    since = etl_state.watermark(state, "zdi").get("last_disclosed")
+    since = datetime.fromisoformat(since) if since else None
+    zdi_collector = ZDICollector(max(YEAR_FROM, since.year) if since else YEAR_FROM, YEAR_TO, since=since)
+    zdcz_collector = ZDCZCollector(
+        YEAR_FROM, YEAR_TO, incremental=incremental, mark=etl_state.watermark(state, "zdcz")
+    )
+    etl_state.checkpoint(cur, etl_state.RUN, "collect")
+    return state, zdi_collector, zdcz_collector
+
+
+def kev_refresh_candidates(cur, kev_enricher, state):
+    """CVE déjà en base entrées au catalogue KEV depuis la dernière exécution (à ré-enrichir)."""
+    since = etl_state.watermark(state, "kev").get("last_added")
+    since = datetime.fromisoformat(since) if since else None
+    cve_ids = [c for c, added in kev_enricher.kev_cves.items() if added and (since is None or added >= since)]
+    if not cve_ids:
+        return []
+    cur.execute("""
+        SELECT canonical_id, cve_id FROM vulnerabilities
+        WHERE cve_id = ANY(%s) AND kev_added IS NULL
+    """, (cve_ids,))
+    rows = cur.fetchall()
+    print(f"[KEV] {len(rows)} vulnérabilités déjà en base ajoutées au catalogue KEV")
+    return [{"canonical_id": canonical_id, "cve_id": cve_id, "refs": [], "tags": []} for canonical_id, cve_id in rows]
+
+
+def nvd_refresh_candidates(cur, nvd_enricher):
+    """CVE déjà en base modifiées côté NVD : les années stockées sont synchronisées,
+    puis on retient les CVE du flux `modified` appliqué et, pour une année
+    re-téléchargée en entier, toutes ses CVE (le content_hash écarte les inchangées)."""
+    if not (NVD_SYNC and NVD_USE_INDEX):
+        return []
+    cur.execute("SELECT DISTINCT split_part(cve_id, '-', 2)::int FROM vulnerabilities WHERE cve_id ~ '^CVE-[0-9]{4}-'")
+    years = {year for (year,) in cur.fetchall()}
+    if not years:
+        return []
+    with metrics.stage("nvd_load"):
+        changed, rebuilt = nvd_enricher.sync(years)
+    if not changed and not rebuilt:
+        return []
+    cur.execute("""
+        SELECT canonical_id, cve_id FROM vulnerabilities
+        WHERE cve_id = ANY(%s)
+           OR (cve_id ~ '^CVE-[0-9]{4}-' AND split_part(cve_id, '-', 2)::int = ANY(%s))
+    """, (sorted(changed), sorted(rebuilt)))
+    rows = cur.fetchall()
+    print(f"[NVD] {len(rows)} vulnérabilités déjà en base modifiées côté NVD")
+    return [{"canonical_id": canonical_id, "cve_id": cve_id, "refs": [], "tags": []} for canonical_id, cve_id in rows]
+
+
+def epss_changed(stored, current):
+    """Vrai si l'instantané donne un (score, percentile) différent du stocké ; un score
+    absent de l'instantané ne remplace jamais le stocké (COALESCE du MERGE)."""
+    if current[0] is None:
+        return False
+    return any(a is None or abs(a - b) > 1e-6 for a, b in zip(stored, current))
+
+
+def epss_refresh_candidates(cur, epss_enricher):
+    """CVE déjà en base dont le score EPSS a changé.
+
+    Avec l'instantané quotidien, on compare les scores stockés à ceux du jour
+    (aucun appel réseau de plus). Sinon (API), on retient les CVE notées dont
+    aucun score de moins de STORE_MAX_AGE_DAYS jours n'est historisé."""
+    if epss_enricher.use_snapshot:
+        try:
+            snapshot = epss_enricher.snapshot or epss_enricher.load_snapshot()
+        except Exception as e:
+            print(f"[EPSS] Instantané indisponible, scores stockés non rafraîchis : {e}")
+            return []
+        cur.execute("""
+            SELECT canonical_id, cve_id, epss_score, epss_percentile FROM vulnerabilities
+            WHERE cve_id ~ '^CVE-'
+        """)
+        rows = [
+            (canonical_id, cve_id) for canonical_id, cve_id, score, percentile in cur.fetchall()
+            if epss_changed((score, percentile), snapshot.get(cve_id))
+        ]
+    else:
+        cur.execute("""
+            SELECT v.canonical_id, v.cve_id FROM vulnerabilities v
+            WHERE v.cve_id ~ '^CVE-' AND v.epss_score IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM epss_history h
+                  WHERE h.cve_id = v.cve_id AND h.score_date >= CURRENT_DATE - %s
+              )
+        """, (STORE_MAX_AGE_DAYS,))
+        rows = cur.fetchall()
+    print(f"[EPSS] {len(rows)} vulnérabilités déjà en base dont le score EPSS a changé")
+    return [{"canonical_id": canonical_id, "cve_id": cve_id, "refs": [], "tags": []} for canonical_id, cve_id in rows]
+
+
+def refresh_candidates(cur, state, nvd_enricher, kev_enricher, epss_enricher):
+    """Vulnérabilités déjà en base à ré-enrichir (KEV, NVD, EPSS), une entrée par canonical_id."""
+    refresh = {}
+    for v in chain(
+        kev_refresh_candidates(cur, kev_enricher, state),
+        nvd_refresh_candidates(cur, nvd_enricher),
+        epss_refresh_candidates(cur, epss_enricher),
+    ):
+        refresh.setdefault(v["canonical_id"], v)
+    return list(refresh.values())
+
+
+def save_watermarks(cur, zdi_collector, zdcz_collector, kev_enricher):
+    """Avance les marques hautes, une fois toutes les données écrites en base."""
+    if zdi_collector.latest_disclosed:
+        etl_state.checkpoint(cur, "zdi", "done", {"last_disclosed": zdi_collector.latest_disclosed.isoformat()})
+    if zdcz_collector.high_water_mark:
+        etl_state.checkpoint(cur, "zdcz", "done", zdcz_collector.high_water_mark)
+    kev_dates = [d for d in kev_enricher.kev_cves.values() if d]
+    if kev_dates:
+        etl_state.checkpoint(cur, "kev", "done", {"last_added": max(kev_dates).isoformat()})
+    etl_state.checkpoint(cur, etl_state.RUN, "done")
+
+
+def batched(records, size):
+    """Regroupe un flux d'enregistrements en listes d'au plus `size` éléments."""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_enriched(batches, nvd_enricher, kev_enricher, epss_enricher, cur):
+    """Étape génératrice : fusionne et enrichit chaque lot, seul le lot courant est en mémoire."""
+    loaded_years = set()
+    for batch in batches:
+        batch = merge_candidates(batch)
+        years = nvd_years(batch) - loaded_years
+        if years:
+            load_nvd_years(nvd_enricher, years)
+            loaded_years |= years
+        yield enrich_candidates(batch, nvd_enricher, kev_enricher, epss_enricher, cur)
+        epss_enricher.cache.clear()  # scores déjà historisés : le cache ne grossit pas avec le flux
+
+
+def run_streaming_etl(batch_size=STREAM_BATCH_SIZE, incremental=True):
+    """ETL en flux : collecteurs -> enrichissement -> base, une transaction par lot.
+
+    La mémoire reste bornée par la taille d'un lot, et un échec tardif ne
+    perd que le lot en cours (les lots précédents sont déjà validés)."""
+    report = metrics.start_run("etl")
+    conn = db.acquire()
+    cur = conn.cursor()
+
+    nvd_enricher = NVDEnricher(use_index=NVD_USE_INDEX, cache_budget_mb=NVD_CACHE_BUDGET_MB)
+    kev_enricher = KEVEnricher()
+    epss_enricher = EPSSEnricher(use_snapshot=EPSS_USE_SNAPSHOT)
+
+    print("=== [0] Collecte KEV CISA ===")
+    with metrics.stage("kev") as record:
+        record["rows"] = len(kev_enricher.fetch())
+
+    print(f"=== [1] Flux ZDI / Zero-day.cz -> enrichissement -> base (lots de {batch_size}) ===")
+    state, zdi_collector, zdcz_collector = open_sources(cur, incremental)
+    refresh = refresh_candidates(cur, state, nvd_enricher, kev_enricher, epss_enricher) if incremental else []
+    records = chain(
+        report.timed_iter("zdi", zdi_collector.iter_fetch()),
+        report.timed_iter("zdcz", zdcz_collector.iter_fetch()),
+        refresh,
+    )
+    enriched = iter_enriched(batched(records, batch_size), nvd_enricher, kev_enricher, epss_enricher, cur)
+    sink_batches(conn, enriched)
+    save_watermarks(cur, zdi_collector, zdcz_collector, kev_enricher)
+
+    nvd_enricher.close()
+    print("\n✅ ETL terminé.")
+    report.write()
+    cur.close()
+    db.release(conn)
+
+
+def run_year_shard(params, progress=None, checkpoint=None, batch_size=STREAM_BATCH_SIZE):
+    """Tranche d'années de l'ETL réparti (shards.py) : même chaîne que le mode flux,
+    bornée à [year_from, year_to] et sans marques hautes (les tranches sont indépendantes).
+
+    `checkpoint(dict)` est appelé après chaque lot validé avec les totaux. Une
+    tranche reprise est rejouée en entier : les sources sont listées des plus
+    récentes aux plus anciennes, une position n'est donc pas stable d'une
+    exécution à l'autre ; les lignes déjà écrites ressortent inchangées (content_hash)."""
+    year_from, year_to = params["year_from"], params["year_to"]
+    conn = db.acquire()
+    cur = conn.cursor()
+    nvd_enricher = NVDEnricher(use_index=NVD_USE_INDEX, cache_budget_mb=NVD_CACHE_BUDGET_MB)
+    kev_enricher = KEVEnricher()
+    epss_enricher = EPSSEnricher(use_snapshot=EPSS_USE_SNAPSHOT)
+    label = f"SHARD {year_from}" if year_from == year_to else f"SHARD {year_from}-{year_to}"
+    totals = {"inserted": 0, "changed": 0, "unchanged": 0, "batches": 0}
 
-def get_cve_year(cve_id: str) -> int:
     try:
-        return int(cve_id.split("-")[1])
-    except (IndexError, ValueError):
-        return None
+        with metrics.stage("kev") as record:
+            record["rows"] = len(kev_enricher.fetch())
+        records = chain(
+            metrics.report.timed_iter("zdi", ZDICollector(year_from, year_to).iter_fetch()),
+            metrics.report.timed_iter("zdcz", ZDCZCollector(year_from, year_to).iter_fetch()),
+        )
+        if progress:
+            print(f"[{label}] Reprise : tranche rejouée en entier ({progress.get('batches', 0)} lot(s) déjà écrits)")
+        raw_batches = batched(records, batch_size)
+        for batch in iter_enriched(raw_batches, nvd_enricher, kev_enricher, epss_enricher, cur):
+            counts = bulk_upsert(conn, batch, label=label)
+            for key in counts:
+                totals[key] += counts[key]
+            totals["batches"] += 1
+            if checkpoint:
+                checkpoint(dict(totals))
+    finally:
+        nvd_enricher.close()
+        cur.close()
+        db.release(conn)
+    totals["rows"] = totals["inserted"] + totals["changed"] + totals["unchanged"]
+    return totals
+
+
+def run_etl(incremental=True):
+    report = metrics.start_run("etl")
 
-def run_etl():
     # --- Connexion DB ---
-    conn = psycopg2.connect(
-        dbname="zerodaydb",
-        user="postgres",
-        password="postgres",
-        host="localhost",
-        port=5432
-    )
-    conn.autocommit = True
+    conn = db.acquire()
     cur = conn.cursor()
 
     # --- Initialisation des collecteurs/enrichisseurs ---
-    nvd_enricher = NVDEnricher()
+    nvd_enricher = NVDEnricher(use_index=NVD_USE_INDEX, cache_budget_mb=NVD_CACHE_BUDGET_MB)
     kev_enricher = KEVEnricher()
-    epss_enricher = EPSSEnricher()
+    epss_enricher = EPSSEnricher(use_snapshot=EPSS_USE_SNAPSHOT)
 
     # --- Collecte KEV ---
     print("=== [0] Collecte KEV CISA ===")
-    kev_enricher.fetch()  # charge les CVE KEV
+    with metrics.stage("kev") as record:
+        record["rows"] = len(kev_enricher.fetch())  # charge les CVE KEV
+
+    # --- Collecteurs, bornés par les marques hautes d'etl_state en mode incrémental ---
+    state, zdi_collector, zdcz_collector = open_sources(cur, incremental)
 
     # --- Collecte ZDI ---
     print("=== [1] Collecte ZDI ===")
-    zdi_collector = ZDICollector(YEAR_FROM, YEAR_TO)
-    zdi_vulns = zdi_collector.fetch()
+    with metrics.stage("zdi") as record:
+        zdi_vulns = zdi_collector.fetch()
+        record["rows"] = len(zdi_vulns)
 
     # --- Collecte Zero-day.cz ---
     print("=== [2] Collecte Zero-day.cz ===")
-    zdcz_collector = ZDCZCollector(YEAR_FROM, YEAR_TO)
-    zdcz_vulns = zdcz_collector.fetch()
+    with metrics.stage("zdcz") as record:
+        zdcz_vulns = zdcz_collector.fetch()
+        record["rows"] = len(zdcz_vulns)
 
-    # --- Regroupement de toutes les vulnérabilités ---
-    all_candidates = zdi_vulns + zdcz_vulns
+    # --- CVE déjà stockées à rafraîchir : nouvellement exploitées (KEV), modifiées (NVD, EPSS) ---
+    refresh = refresh_candidates(cur, state, nvd_enricher, kev_enricher, epss_enricher) if incremental else []
 
-    # --- Enrichissement NVD, KEV et EPSS ---
-    print("=== [3] Enrichissement NVD, KEV, EPSS ===")
-    for v in all_candidates:
-        v = nvd_enricher.enrich(v)
-        v = kev_enricher.enrich(v)
-        v = kev_enricher.compute_dates(v)
-        v = epss_enricher.enrich(v)
+    # --- Fusion des sources : une entrée par canonical_id ---
+    all_candidates = merge_candidates(zdi_vulns + zdcz_vulns + refresh)
+    print(f"[ETL] {len(zdi_vulns) + len(zdcz_vulns) + len(refresh)} candidats -> {len(all_candidates)} vulnérabilités")
+    etl_state.checkpoint(cur, etl_state.RUN, "enrich")
+    nvd_enricher.restrict_to(v.get("cve_id") for v in all_candidates)
 
-    # --- Upsert dans la base ---
-    print("=== [4] Insertion en base ===")
-    zdcz_cves = [v["cve_id"] for v in zdcz_vulns if v.get("cve_id")]
-    zdi_cves = [v["cve_id"] for v in zdi_vulns if v.get("cve_id")]
+    # --- Chargement parallèle et synchronisation des années NVD nécessaires ---
+    print("=== [2b] Chargement NVD ===")
+    load_nvd_years(nvd_enricher, nvd_years(all_candidates))
+
+    # --- Enrichissement NVD, EPSS, KEV et complément CIRCL ---
+    print("=== [3] Enrichissement NVD, KEV, EPSS, CIRCL ===")
+    enrich_candidates(all_candidates, nvd_enricher, kev_enricher, epss_enricher, cur)
 
-    zdi_collector.upsert(cur, kev_cves=kev_enricher.kev_cves, zdcz_cves=zdcz_cves)
-    zdcz_collector.upsert(cur, kev_cves=kev_enricher.kev_cves, zdi_cves=zdi_cves)
+    # --- Upsert dans la base (une seule écriture par vulnérabilité) ---
+    print("=== [4] Insertion en base ===")
+    etl_state.checkpoint(cur, etl_state.RUN, "upsert")
+    bulk_upsert(conn, all_candidates)
+    save_watermarks(cur, zdi_collector, zdcz_collector, kev_enricher)
 
+    nvd_enricher.close()
     print("\n✅ ETL terminé.")
+    report.write()
     cur.close()
-    conn.close()
+    db.release(conn)
 
 
 if __name__ == "__main__":
+    metrics.setup_logging()
     run_etl()
@@ -0,0 +1,41 @@
+from psycopg2.extras import Json
+
+# Points de reprise de l'ETL incrémental, persistés dans la table `etl_state` :
+#   - une ligne par source (zdi, zdcz, kev) portant sa marque haute ;
+#   - une ligne `run` portant la dernière étape atteinte par l'exécution en cours.
+# Les marques ne sont avancées qu'une fois les données écrites : après un échec,
+# l'exécution suivante repart de la dernière marque validée.
+
+RUN = "run"
+STAGES = ("collect", "enrich", "upsert", "done")
+
+
+def load(cur):
+    """Retourne {source: {"watermark": dict, "last_stage": str}}."""
+    cur.execute("SELECT source, watermark, last_stage FROM etl_state")
+    return {
+        source: {"watermark": watermark or {}, "last_stage": last_stage}
+        for source, watermark, last_stage in cur.fetchall()
+    }
+
+
+def watermark(state, source) -> dict:
+    return state.get(source, {}).get("watermark") or {}
+
+
+def checkpoint(cur, source, stage, watermark=None):
+    """Enregistre l'étape atteinte (et, si fournie, la nouvelle marque haute) d'une source."""
+    cur.execute("""
+        INSERT INTO etl_state (source, watermark, last_stage, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (source) DO UPDATE SET
+            watermark=COALESCE(EXCLUDED.watermark, etl_state.watermark),
+            last_stage=EXCLUDED.last_stage,
+            updated_at=NOW()
+    """, (source, Json(watermark) if watermark is not None else None, stage))
+
+
+def resume_point(state):
+    """Dernière étape atteinte par l'exécution précédente si elle n'a pas abouti, sinon None."""
+    stage = state.get(RUN, {}).get("last_stage")
+    return stage if stage and stage != "done" else None
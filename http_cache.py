@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import http_client
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Cache HTTP partagé par tous les collecteurs.
+#
+# Disposition sur disque :
+#   objects/<sha[:2]>/<sha>        corps de réponse, adressés par leur sha256 (dédupliqués)
+#   entries/<key[:2]>/<key>.json   une entrée par requête (URL + paramètres) -> corps + validateurs
+# La date de modification d'une entrée sert de date de dernier accès pour l'éviction LRU.
+
+CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", ".cache/http"))
+MAX_CACHE_BYTES = int(os.getenv("HTTP_CACHE_MAX_MB", "512")) * 1024 * 1024
+OFFLINE = os.getenv("HTTP_CACHE_OFFLINE") == "1"  # rejoue un run enregistré, sans réseau
+
+HOUR = 3600
+SOURCE_TTLS = {
+    "kev": 6 * HOUR,
+    "zdi": 1 * HOUR,
+    "zdcz": 1 * HOUR,
+    "epss": 12 * HOUR,
+    "circl": 24 * HOUR,
+    "cpe": 24 * HOUR,
+    "wiki": 7 * 24 * HOUR,
+}
+DEFAULT_TTL = 1 * HOUR
+KEPT_HEADERS = {"content-type", "etag", "last-modified"}
+CACHEABLE_STATUS = {200, 404}  # réponses définitives ; les erreurs ne sont jamais mises en cache
+
+stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()  # compteurs incrémentés depuis les threads de collecte
+
+_lock = threading.Lock()
+_total_bytes = None  # taille des objets, calculée paresseusement
+
+
+def count(key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+
+class CacheMissError(requests.ConnectionError):
+    """Requête absente du cache alors que le mode hors-ligne est actif."""
+
+
+class CachedResponse:
+    """Réponse minimale compatible avec l'usage qu'en font les collecteurs (requests-like)."""
+
+    def __init__(self, url, status_code, headers, content, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    @property
+    def encoding(self):
+        content_type = self.headers.get("Content-Type", "")
+        if "charset=" in content_type:
+            return content_type.split("charset=")[-1].split(";")[0].strip()
+        return "utf-8"
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} pour {self.url}", response=self)
+
+
+def cache_key(url, params=None):
+    full_url = f"{url}?{urlencode(sorted((params or {}).items()))}" if params else url
+    return hashlib.sha256(f"GET {full_url}".encode()).hexdigest()
+
+
+def _entry_path(key):
+    return CACHE_DIR / "entries" / key[:2] / f"{key}.json"
+
+
+def _object_path(digest):
+    return CACHE_DIR / "objects" / digest[:2] / digest
+
+
+def _atomic_write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _load(key):
+    path = _entry_path(key)
+    try:
+        entry = json.loads(path.read_text())
+        content = _object_path(entry["body"]).read_bytes()
+    except (OSError, ValueError, KeyError):
+        return None, None
+    return entry, content
+
+
+def _touch(key):
+    try:
+        os.utime(_entry_path(key))
+    except OSError:
+        pass
+
+
+def _store(key, url, source, status_code, headers, content):
+    global _total_bytes
+    digest = hashlib.sha256(content).hexdigest()
+    obj = _object_path(digest)
+    if not obj.exists():
+        _atomic_write(obj, content)
+        with _lock:
+            if _total_bytes is not None:
+                _total_bytes += len(content)
+    entry = {
+        "url": url,
+        "source": source,
+        "status": status_code,
+        "headers": {k: v for k, v in CaseInsensitiveDict(headers).items() if k.lower() in KEPT_HEADERS},
+        "body": digest,
+        "fetched_at": time.time(),
+    }
+    _atomic_write(_entry_path(key), json.dumps(entry).encode())
+    count("stores")
+    evict()
+
+
+def evict(max_bytes=None):
+    """Éviction LRU : supprime les entrées les plus anciennes puis les objets orphelins."""
+    global _total_bytes
+    max_bytes = max_bytes or MAX_CACHE_BYTES
+    with _lock:
+        objects_dir = CACHE_DIR / "objects"
+        if _total_bytes is None:
+            _total_bytes = sum(p.stat().st_size for p in objects_dir.glob("*/*") if p.is_file())
+        if _total_bytes <= max_bytes:
+            return
+
+        entries = sorted((CACHE_DIR / "entries").glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        referenced = {}
+        for path in entries:
+            try:
+                referenced[path] = json.loads(path.read_text())["body"]
+            except (OSError, ValueError, KeyError):
+                referenced[path] = None
+
+        sizes = {p.name: p.stat().st_size for p in objects_dir.glob("*/*") if p.is_file()}
+        live = {}
+        for digest in referenced.values():
+            if digest:
+                live[digest] = live.get(digest, 0) + 1
+
+        for path in entries:
+            if _total_bytes <= max_bytes * 0.9:  # marge pour ne pas évincer à chaque écriture
+                break
+            digest = referenced[path]
+            path.unlink(missing_ok=True)
+            count("evictions")
+            if digest and live.get(digest) == 1:
+                _object_path(digest).unlink(missing_ok=True)
+                _total_bytes -= sizes.get(digest, 0)
+            if digest:
+                live[digest] -= 1
+
+
+def _lookup(url, params, source, ttl):
+    """Retourne (clé, entrée, corps, fraîche?) pour une requête."""
+    key = cache_key(url, params)
+    entry, content = _load(key)
+    ttl = SOURCE_TTLS.get(source, DEFAULT_TTL) if ttl is None else ttl
+    fresh = entry is not None and (OFFLINE or time.time() - entry["fetched_at"] < ttl)
+    return key, entry, content, fresh
+
+
+def is_fresh(url, params=None, source="default", ttl=None) -> bool:
+    """Vrai si la requête sera servie depuis le cache (utile pour ne pas la limiter en débit)."""
+    return _lookup(url, params, source, ttl)[3]
+
+
+def _conditional_headers(entry, headers):
+    headers = dict(headers or {})
+    if entry:
+        cached = CaseInsensitiveDict(entry["headers"])
+        if cached.get("ETag"):
+            headers["If-None-Match"] = cached["ETag"]
+        if cached.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached["Last-Modified"]
+    return headers
+
+
+def _hit(url, entry, content):
+    count("hits")
+    return CachedResponse(url, entry["status"], entry["headers"], content, from_cache=True)
+
+
+def _revalidated(key, url, entry, content):
+    """304 : le corps en cache reste valable, on rafraîchit simplement sa date."""
+    count("revalidated")
+    entry["fetched_at"] = time.time()
+    _atomic_write(_entry_path(key), json.dumps(entry).encode())
+    return CachedResponse(url, entry["status"], entry["headers"], content, from_cache=True)
+
+
+def get(url, params=None, headers=None, source="default", ttl=None, timeout=30):
+    """GET via le cache : réponse fraîche servie depuis le disque, sinon revalidation
+    conditionnelle (ETag / Last-Modified) puis mise en cache."""
+    key, entry, content, fresh = _lookup(url, params, source, ttl)
+    if fresh:
+        _touch(key)
+        return _hit(url, entry, content)
+    if OFFLINE:
+        raise CacheMissError(f"[CACHE] {url} absent du cache (mode hors-ligne)")
+
+    count("misses")
+    r = http_client.get(url, params=params, headers=_conditional_headers(entry, headers), timeout=timeout)
+    if r.status_code == 304 and entry is not None:
+        return _revalidated(key, url, entry, content)
+    if r.status_code in CACHEABLE_STATUS:
+        _store(key, url, source, r.status_code, r.headers, r.content)
+    return CachedResponse(url, r.status_code, r.headers, r.content)
+
+
+async def get_async(session, url, params=None, headers=None, source="default", ttl=None):
+    """Équivalent asynchrone de `get` pour les collecteurs aiohttp (CIRCL, Wikipédia)."""
+    key, entry, content, fresh = _lookup(url, params, source, ttl)
+    if fresh:
+        _touch(key)
+        return _hit(url, entry, content)
+    if OFFLINE:
+        raise CacheMissError(f"[CACHE] {url} absent du cache (mode hors-ligne)")
+
+    count("misses")
+    status, response_headers, body = await http_client.get_async(
+        session, url, params=params, headers=_conditional_headers(entry, headers)
+    )
+    if status == 304 and entry is not None:
+        return _revalidated(key, url, entry, content)
+    if status in CACHEABLE_STATUS:
+        _store(key, url, source, status, response_headers, body)
+    return CachedResponse(url, status, response_headers, body)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Client HTTP partagé : une session keep-alive (un pool de connexions par hôte),
+# compression gzip, réessais avec backoff exponentiel « jittered » respectant
+# Retry-After, et limitation de débit par hôte (seau à jetons).
+
+POOL_CONNECTIONS = 32  # nombre d'hôtes dont le pool est conservé
+POOL_MAXSIZE = 16  # connexions keep-alive par hôte
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # secondes
+BACKOFF_MAX = 60
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "ZeroDayMapping/1.0",
+}
+
+# Requêtes par seconde autorisées par hôte (les hôtes absents ne sont pas limités)
+HOST_RATES = {
+    # NVD : 50 requêtes / 30 s avec clé d'API, 5 / 30 s sans
+    "services.nvd.nist.gov": 50 / 30 if os.getenv("NVD_API_KEY") else 5 / 30,
+    "api.first.org": 10,
+    "cve.circl.lu": 10,
+    "en.wikipedia.org": 20,
+    "www.zerodayinitiative.com": 4,
+    "www.zero-day.cz": 2,
+}
+# Surcharge par l'environnement, ex. HTTP_HOST_RATES="127.0.0.1:8801=0.17,127.0.0.1:8802=4"
+# (les hôtes sont identifiés par host[:port], ce qui distingue les serveurs locaux de substitution)
+HOST_RATES.update(
+    (host, float(rate))
+    for host, _, rate in (item.partition("=") for item in os.getenv("HTTP_HOST_RATES", "").split(",") if item)
+)
+
+stats = {"requests": 0, "retries": 0, "bytes": 0}
+_stats_lock = threading.Lock()  # compteurs incrémentés depuis les threads de collecte
+
+log = logging.getLogger("http")
+
+
+def count(key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe : au plus `rate` acquisitions par seconde."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Prend un jeton ; retourne le délai à attendre avant de l'utiliser."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class AsyncTokenBucket(TokenBucket):
+    """Variante asynchrone : l'attente ne bloque pas la boucle d'événements."""
+
+    async def acquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_session = None
+_session_lock = threading.Lock()
+_buckets = {}
+_async_buckets = {}
+
+
+def get_session():
+    """Session requests partagée (keep-alive, un pool de connexions par hôte)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def new_async_session(timeout=None, limit=64, limit_per_host=POOL_MAXSIZE):
+    """ClientSession aiohttp avec connecteur keep-alive borné par hôte."""
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS, timeout=timeout)
+
+
+def _bucket(host, registry, cls):
+    rate = HOST_RATES.get(host)
+    if rate is None:
+        return None
+    with _session_lock:
+        if host not in registry:
+            registry[host] = cls(rate, burst=max(1, int(rate)))
+        return registry[host]
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Délai avant le réessai `attempt` : Retry-After s'il est fourni, sinon backoff exponentiel
+    avec jitter complet (tirage uniforme entre 0 et base * 2^attempt)."""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            try:
+                return min(BACKOFF_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def get(url, params=None, headers=None, timeout=30, stream=False):
+    """GET via la session partagée, avec limitation par hôte et réessais."""
+    session = get_session()
+    bucket = _bucket(urlsplit(url).netloc, _buckets, TokenBucket)
+    for attempt in range(MAX_RETRIES + 1):
+        if bucket:
+            bucket.acquire()
+        count("requests")
+        try:
+            r = session.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            log.warning("%s sur %s, nouvel essai dans %.1fs", e.__class__.__name__, url, delay)
+        else:
+            if r.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                if not stream:
+                    count("bytes", len(r.content))
+                return r
+            delay = backoff_delay(attempt, r.headers.get("Retry-After"))
+            log.warning("%s sur %s, nouvel essai dans %.1fs", r.status_code, url, delay)
+            r.close()
+        count("retries")
+        time.sleep(delay)
+
+
+async def get_async(session, url, params=None, headers=None):
+    """Équivalent asynchrone de `get` ; retourne (statut, en-têtes, corps)."""
+    bucket = _bucket(urlsplit(url).netloc, _async_buckets, AsyncTokenBucket)
+    for attempt in range(MAX_RETRIES + 1):
+        if bucket:
+            await bucket.acquire()
+        count("requests")
+        try:
+            async with session.get(url, params=params, headers=headers) as r:
+                status, response_headers = r.status, CaseInsensitiveDict(r.headers)
+                body = await r.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            log.warning("%s sur %s, nouvel essai dans %.1fs", e.__class__.__name__, url, delay)
+        else:
+            if status not in RETRY_STATUS or attempt == MAX_RETRIES:
+                count("bytes", len(body))
+                return status, response_headers, body
+            delay = backoff_delay(attempt, response_headers.get("Retry-After"))
+            log.warning("%s sur %s, nouvel essai dans %.1fs", status, url, delay)
+        count("retries")
+        await asyncio.sleep(delay)
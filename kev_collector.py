@@ -1,7 +1,9 @@
-import requests
+import os
+import http_cache
 from datetime import datetime
 
-CISA_KEV_URL = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json"
+CISA_BASE_URL = os.getenv("CISA_BASE_URL", "https://www.cisa.gov")
+CISA_KEV_URL = f"{CISA_BASE_URL}/sites/default/files/feeds/known_exploited_vulnerabilities.json"
 
 class KEVEnricher:
     def __init__(self):
@@ -10,7 +12,7 @@ class KEVEnricher:
     def fetch(self):
         """Récupère la liste des CVE connues comme exploitées selon CISA KEV."""
         try:
-            resp = requests.get(CISA_KEV_URL)
+            resp = http_cache.get(CISA_KEV_URL, source="kev", timeout=60)
             resp.raise_for_status()
             data = resp.json()
         except Exception as e:
@@ -1,38 +1,67 @@
-import psycopg2
+import argparse
+import os
+import db
+import metrics
 from pathlib import Path
-from etl import run_etl
-
-DB_PARAMS = {
-    "dbname": "zerodaydb",
-    "user": "postgres",
-    "password": "postgres",
-    "host": "localhost",
-    "port": 5432
-}
+from etl import run_etl, run_streaming_etl
+from orchestrator import run_pipeline
+from shards import run_sharded_etl
 
 SCHEMA_FILE = Path("schema.sql")
 
-def reset_db():
-    """Supprime et recrée les tables selon schema.sql"""
-    conn = psycopg2.connect(**DB_PARAMS)
-    conn.autocommit = True
+# pipeline : collecte/enrichissement/écriture en parallèle ; stream : flux à mémoire
+# bornée, une transaction par lot ; sequential : etl.run_etl historique ;
+# sharded : tranches d'années réclamées dans etl_shards (plusieurs workers / hôtes)
+ETL_MODES = {
+    "pipeline": run_pipeline,
+    "stream": run_streaming_etl,
+    "sequential": run_etl,
+    "sharded": run_sharded_etl,
+}
+ETL_MODE = os.getenv("ETL_MODE", "pipeline")
+
+# Reconstruction complète uniquement sur demande (--full-rebuild) ; epss_history est conservé
+DROP_SQL = """
+    DROP TABLE IF EXISTS source_mappings;
+    DROP TABLE IF EXISTS vulnerabilities CASCADE;
+    DROP TABLE IF EXISTS etl_state;
+    DROP TABLE IF EXISTS etl_shards;
+"""
+
+def reset_db(full_rebuild=False):
+    """Applique schema.sql (idempotent) ; supprime d'abord les tables si full_rebuild."""
+    conn = db.acquire()
     cur = conn.cursor()
 
-    print("🔹 Réinitialisation de la base de données...")
     if not SCHEMA_FILE.exists():
         raise FileNotFoundError(f"{SCHEMA_FILE} introuvable !")
-    
+
+    if full_rebuild:
+        print("🔹 Réinitialisation complète de la base de données...")
+        cur.execute(DROP_SQL)
+    else:
+        print("🔹 Mise à jour du schéma de la base de données...")
+
     sql = SCHEMA_FILE.read_text()
     cur.execute(sql)
 
-    print("✅ Base réinitialisée avec succès !")
+    print("✅ Base prête !")
     cur.close()
-    conn.close()
+    db.release(conn)
 
 def main():
-    reset_db()
+    parser = argparse.ArgumentParser(description="ETL Zero-Day mapping")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="supprime les tables et recharge tout (par défaut : ETL incrémental)")
+    args = parser.parse_args()
+    if args.full_rebuild and ETL_MODE == "sharded":
+        # etl_shards serait supprimée sous les workers des autres hôtes
+        parser.error("--full-rebuild n'est pas pris en charge en mode sharded (ETL_MODE=sharded)")
+    metrics.setup_logging()
+
+    reset_db(full_rebuild=args.full_rebuild)
     print("🚀 Lancement de l'ETL...")
-    run_etl()
+    ETL_MODES[ETL_MODE](incremental=not args.full_rebuild)
 
 if __name__ == "__main__":
     main()
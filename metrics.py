@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import http_cache
+import http_client
+
+# Instrumentation des exécutions : chaque étape (kev, zdi, zdcz, nvd_load, nvd_enrich,
+# epss, circl, upsert, wiki, ai) cumule sa durée, ses requêtes HTTP, les succès du
+# cache et le nombre de lignes traitées. Le rapport est écrit en JSON et au format
+# textfile de Prometheus (node_exporter --collector.textfile.directory).
+#
+# Les compteurs HTTP sont globaux au processus : quand des étapes se chevauchent
+# (orchestrateur), une requête est comptée dans chacune des étapes ouvertes.
+
+REPORT_DIR = Path(os.getenv("ETL_REPORT_DIR", "reports"))
+LOG_LEVEL = os.getenv("ETL_LOG_LEVEL", "INFO")
+
+HTTP_COUNTERS = ("requests", "retries", "bytes")
+CACHE_COUNTERS = ("hits", "misses", "revalidated")
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Journalisation à niveaux : le détail par ligne est en DEBUG, masqué par défaut."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus (ru_maxrss est en Ko sous Linux, en octets sous macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _counters():
+    values = {f"http_{k}": http_client.stats[k] for k in HTTP_COUNTERS}
+    values.update({f"cache_{k}": http_cache.stats[k] for k in CACHE_COUNTERS})
+    return values
+
+
+class RunReport:
+    def __init__(self, run="etl"):
+        self.run = run
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def _add(self, name, wall, rows, deltas):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"wall_seconds": 0.0, "rows": 0, "calls": 0})
+            stage["wall_seconds"] += wall
+            stage["rows"] += rows
+            stage["calls"] += 1
+            for key, value in deltas.items():
+                stage[key] = stage.get(key, 0) + value
+            stage["peak_rss_bytes"] = peak_rss_bytes()
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """Mesure un bloc ; le nombre de lignes peut être fixé après coup via `record["rows"]`."""
+        record = {"rows": rows}
+        before = _counters()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            after = _counters()
+            self._add(name, time.perf_counter() - t0, record["rows"], {k: after[k] - before[k] for k in after})
+
+    def timed_iter(self, name, iterable):
+        """Mesure un générateur : seul le temps passé à produire les éléments est compté."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                record["rows"] = 1
+            yield item
+
+    def to_dict(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            stage = dict(stage)
+            lookups = stage.get("cache_hits", 0) + stage.get("cache_revalidated", 0) + stage.get("cache_misses", 0)
+            stage["cache_hit_rate"] = (
+                round((stage.get("cache_hits", 0) + stage.get("cache_revalidated", 0)) / lookups, 4) if lookups else None
+            )
+            stage["rows_per_second"] = round(stage["rows"] / stage["wall_seconds"], 2) if stage["wall_seconds"] else None
+            stage["wall_seconds"] = round(stage["wall_seconds"], 3)
+            stages[name] = stage
+        return {
+            "run": self.run,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.perf_counter() - self.start, 3),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "http": dict(http_client.stats),
+            "cache": dict(http_cache.stats),
+            "stages": stages,
+        }
+
+    def to_prometheus(self, data=None):
+        data = data or self.to_dict()
+        labels = f'run="{self.run}"'
+        lines = [
+            "# TYPE zeroday_run_wall_seconds gauge",
+            f"zeroday_run_wall_seconds{{{labels}}} {data['wall_seconds']}",
+            "# TYPE zeroday_run_peak_rss_bytes gauge",
+            f"zeroday_run_peak_rss_bytes{{{labels}}} {data['peak_rss_bytes']}",
+            "# TYPE zeroday_run_last_timestamp_seconds gauge",
+            f"zeroday_run_last_timestamp_seconds{{{labels}}} {self.started_at.timestamp():.0f}",
+        ]
+        metrics = {
+            "wall_seconds": "zeroday_stage_wall_seconds",
+            "rows": "zeroday_stage_rows",
+            "rows_per_second": "zeroday_stage_rows_per_second",
+            "http_requests": "zeroday_stage_http_requests",
+            "http_retries": "zeroday_stage_http_retries",
+            "http_bytes": "zeroday_stage_http_bytes",
+            "cache_hit_rate": "zeroday_stage_cache_hit_ratio",
+            "peak_rss_bytes": "zeroday_stage_peak_rss_bytes",
+        }
+        for key, metric in metrics.items():
+            lines.append(f"# TYPE {metric} gauge")
+            for name, stage in data["stages"].items():
+                if stage.get(key) is not None:
+                    lines.append(f'{metric}{{{labels},stage="{name}"}} {stage[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory=None):
+        """Écrit run-<run>-<horodatage>.json et zeroday_<run>.prom (remplacé de façon atomique)."""
+        directory = Path(directory or REPORT_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        data = self.to_dict()
+        path = directory / f"run-{self.run}-{self.started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+        path.write_text(json.dumps(data, indent=2))
+
+        prom = directory / f"zeroday_{self.run}.prom"
+        tmp = prom.with_name(prom.name + ".tmp")
+        tmp.write_text(self.to_prometheus(data))
+        os.replace(tmp, prom)
+        logging.getLogger(__name__).info("Rapport d'exécution : %s", path)
+        return path
+
+
+report = RunReport()
+
+
+def stage(name, rows=0):
+    """Raccourci vers `report.stage` pour le rapport de l'exécution courante."""
+    return report.stage(name, rows)
+
+
+def start_run(run):
+    """Démarre un nouveau rapport (un par point d'entrée : etl, wiki, ai, ...)."""
+    global report
+    report = RunReport(run)
+    return report
@@ -1,125 +1,668 @@
 import gzip
+import hashlib
 import json
-import requests
-from datetime import datetime
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import http_client
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+log = logging.getLogger("nvd")
+
+CHUNK_SIZE = 1 << 20  # 1 Mo de texte décompressé par lecture
+_JSON_DECODER = json.JSONDecoder()
+_SEPARATORS = re.compile(r"[\s,]*")
+
+NVD_FEEDS_BASE_URL = os.getenv("NVD_FEEDS_BASE_URL", "https://nvd.nist.gov")
+NVD_FEED_BASE = NVD_FEEDS_BASE_URL + "/feeds/json/cve/2.0/nvdcve-2.0-{name}"
+SYNC_STATE_FILE = Path("nvdcve-2.0-sync.json")
+DELTA_FEED = "modified"  # nouvelles CVE + CVE modifiées (inclut le flux "recent")
+DELTA_WINDOW = timedelta(days=7)  # le flux "modified" couvre les 8 derniers jours
+
+INDEX_FORMAT = "2"  # à incrémenter si la représentation stockée change
+INDEX_INSERT_BATCH = 5000
+
+
+def iter_nvd_records(filename, chunk_size=CHUNK_SIZE):
+    """Parcourt le tableau `vulnerabilities` d'un flux NVD 2.0 enregistrement par enregistrement.
+
+    Le fichier n'est jamais chargé en entier : seul le tampon courant et
+    l'enregistrement en cours de décodage sont gardés en mémoire.
+    """
+    with gzip.open(filename, "rt", encoding="utf-8") as f:
+        # Recherche du début du tableau (l'en-tête du flux est minuscule)
+        buf = ""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf += chunk
+            key = buf.find('"vulnerabilities"')
+            start = buf.find("[", key) if key != -1 else -1
+            if start != -1:
+                pos = start + 1
+                break
+
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos >= len(buf):
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"{filename} : flux NVD tronqué")
+                buf, pos = chunk, 0
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                record, pos = _JSON_DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Enregistrement à cheval sur deux lectures : on complète le tampon
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield record
+
+
+def get_cve_year(cve_id: str):
+    try:
+        return int(cve_id.split("-")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_nvd_meta(text: str) -> dict:
+    """Parse un fichier `.meta` NVD (lastModifiedDate, size, gzSize, sha256...)."""
+    meta = {}
+    for line in text.splitlines():
+        key, sep, value = line.strip().partition(":")
+        if sep:
+            meta[key] = value
+    return meta
+
+
+def _cvss_data(metrics: dict, key: str):
+    entries = metrics.get(key)
+    if not entries:
+        return None, None
+    data = entries[0].get("cvssData", {})
+    vector = data.get("vectorString")
+    return data.get("baseScore"), sys.intern(vector) if vector else None
+
+
+class NVDRecord:
+    """Projection compacte d'une CVE NVD : uniquement les champs persistés en base.
+
+    Le document JSON complet n'est jamais conservé ; les vecteurs CVSS, très
+    répétitifs, sont internés.
+    """
+
+    __slots__ = (
+        "published",
+        "cvss2_base_score", "cvss2_vector",
+        "cvss3_base_score", "cvss3_vector",
+        "cvss4_base_score", "cvss4_vector",
+        "cpes",
+    )
+
+    def __init__(self, published=None,
+                 cvss2_base_score=None, cvss2_vector=None,
+                 cvss3_base_score=None, cvss3_vector=None,
+                 cvss4_base_score=None, cvss4_vector=None,
+                 cpes=()):
+        self.published = published
+        self.cvss2_base_score = cvss2_base_score
+        self.cvss2_vector = cvss2_vector
+        self.cvss3_base_score = cvss3_base_score
+        self.cvss3_vector = cvss3_vector
+        self.cvss4_base_score = cvss4_base_score
+        self.cvss4_vector = cvss4_vector
+        self.cpes = tuple(cpes)
+
+    @classmethod
+    def from_cve(cls, cve: dict):
+        """Construit la projection à partir de l'objet `cve` d'un flux NVD 2.0."""
+        metrics = cve.get("metrics", {})
+        cvss2 = _cvss_data(metrics, "cvssMetricV2")
+        # v3.1 prime sur v3.0 lorsque les deux sont présents
+        cvss3 = _cvss_data(metrics, "cvssMetricV31")
+        if cvss3 == (None, None):
+            cvss3 = _cvss_data(metrics, "cvssMetricV30")
+        cvss4 = _cvss_data(metrics, "cvssMetricV40")
+
+        cpes = [
+            match["criteria"]
+            for config in cve.get("configurations", [])
+            for node in config.get("nodes", [])
+            for match in node.get("cpeMatch", [])
+            if match.get("criteria")
+        ]
+        return cls(cve.get("published"), *cvss2, *cvss3, *cvss4, cpes)
+
+    def to_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+    def apply(self, vuln: dict):
+        """Reporte les champs NVD sur le dict de vulnérabilité."""
+        vuln["published_nvd"] = (
+            datetime.strptime(self.published, "%Y-%m-%dT%H:%M:%S.%f")
+            if self.published else None
+        )
+
+        for version in ("cvss2", "cvss3", "cvss4"):
+            score = getattr(self, f"{version}_base_score")
+            vector = getattr(self, f"{version}_vector")
+            if score is not None or vector is not None:
+                vuln[f"{version}_base_score"] = score
+                vuln[f"{version}_vector"] = vector
+
+        if self.cpes:
+            vuln["configurations"] = [{"source": "NVD", "product": cpe} for cpe in self.cpes]
+            vendor_products = [
+                {"vendor": parts[3], "product": parts[4]}
+                for parts in (cpe.split(":") for cpe in self.cpes)
+                if len(parts) >= 5
+            ]
+            if vendor_products:
+                vuln["vendor_product"] = vendor_products
+        return vuln
+
+
+def estimate_record_size(cve_id: str, record) -> int:
+    """Estimation (octets) de l'empreinte mémoire d'une entrée d'index en cache."""
+    size = sys.getsizeof(cve_id) + sys.getsizeof(record) + sys.getsizeof(record.cpes) + 64  # 64 : entrée de dict
+    if record.published:
+        size += sys.getsizeof(record.published)
+    for cpe in record.cpes:
+        size += sys.getsizeof(cpe)
+    return size
+
+
+class YearLRUCache:
+    """Cache LRU des index NVD annuels, borné par un budget mémoire estimé.
+
+    L'année la moins récemment utilisée est évincée dès que le budget est
+    dépassé ; l'année qui vient d'être chargée est toujours conservée.
+    """
+
+    def __init__(self, budget_mb=None):
+        self.budget = budget_mb * 1024 * 1024 if budget_mb else None
+        self.entries = OrderedDict()  # {year: (cve_index, taille estimée)}
+        self.size = 0
+
+    def __contains__(self, year):
+        return year in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def full(self):
+        """Vrai si le budget est atteint : une année de plus en évincerait une autre."""
+        return self.budget is not None and self.size >= self.budget
+
+    def __getitem__(self, year):
+        self.entries.move_to_end(year)
+        return self.entries[year][0]
+
+    def __setitem__(self, year, cve_index):
+        if year in self.entries:
+            self.size -= self.entries.pop(year)[1]
+        size = sum(estimate_record_size(cve_id, record) for cve_id, record in cve_index.items())
+        self.entries[year] = (cve_index, size)
+        self.size += size
+        while self.budget and self.size > self.budget and len(self.entries) > 1:
+            evicted, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            log.info("Éviction du cache pour %s (%s Ko)", evicted, evicted_size // 1024)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Calcule le sha256 d'un fichier sans le charger en mémoire."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class NVDIndex:
+    """Index SQLite persistant CVE -> enregistrement, construit à côté d'un flux NVD annuel.
+
+    L'index n'est reconstruit que si le sha256 du `.json.gz` change ; une
+    recherche se résume ensuite à une requête sur clé primaire.
+    """
+
+    def __init__(self, feed_path):
+        self.feed_path = Path(feed_path)
+        self.path = self.feed_path.with_name(self.feed_path.name.replace(".json.gz", ".idx.sqlite"))
+        self.conn = None
+
+    @staticmethod
+    def _encode(cve):
+        return json.dumps(NVDRecord.from_cve(cve).to_tuple(), separators=(",", ":"))
+
+    def _meta(self, conn):
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.DatabaseError:
+            return {}
+
+    def _is_fresh(self, conn):
+        """Vérifie que l'index correspond au flux sur disque (taille/mtime puis sha256)."""
+        meta = self._meta(conn)
+        if meta.get("format") != INDEX_FORMAT:
+            return False
+        stat = self.feed_path.stat()
+        if meta.get("feed_size") == str(stat.st_size) and meta.get("feed_mtime_ns") == str(stat.st_mtime_ns):
+            return True
+        if meta.get("feed_sha256") != file_sha256(self.feed_path):
+            return False
+        # Fichier touché mais contenu identique : on met simplement à jour la signature
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("feed_size", str(stat.st_size)), ("feed_mtime_ns", str(stat.st_mtime_ns))],
+            )
+        return True
+
+    def build(self):
+        """(Re)construit l'index dans un fichier temporaire puis le remplace atomiquement."""
+        print(f"[NVD] Construction de l'index {self.path} ...")
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        stat = self.feed_path.stat()
+        sha256 = file_sha256(self.feed_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE cves (cve_id TEXT PRIMARY KEY, record TEXT NOT NULL) WITHOUT ROWID")
+
+            count = 0
+            batch = []
+            for vuln in iter_nvd_records(self.feed_path):
+                cve = vuln.get("cve", {})
+                if not cve.get("id"):
+                    continue
+                batch.append((cve["id"], self._encode(cve)))
+                if len(batch) >= INDEX_INSERT_BATCH:
+                    conn.executemany("INSERT OR REPLACE INTO cves VALUES (?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany("INSERT OR REPLACE INTO cves VALUES (?, ?)", batch)
+                count += len(batch)
+
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("format", INDEX_FORMAT),
+                ("feed_sha256", sha256),
+                ("feed_size", str(stat.st_size)),
+                ("feed_mtime_ns", str(stat.st_mtime_ns)),
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.path)
+        print(f"[NVD] {count} CVE indexées dans {self.path}")
+
+    def open(self):
+        """Ouvre l'index, en le reconstruisant si le flux a changé."""
+        if self.conn is not None:
+            return self
+        if self.path.exists():
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self._is_fresh(conn):
+                self.conn = conn
+                return self
+            conn.close()
+        self.build()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self
+
+    def get(self, cve_id: str):
+        """Retourne la projection NVD d'une CVE, ou None."""
+        row = self.open().conn.execute("SELECT record FROM cves WHERE cve_id = ?", (cve_id,)).fetchone()
+        return NVDRecord.from_tuple(json.loads(row[0])) if row else None
+
+    def upsert(self, cves):
+        """Applique des enregistrements plus récents (flux delta) sur l'index."""
+        rows = [(cve["id"], self._encode(cve)) for cve in cves if cve.get("id")]
+        conn = self.open().conn
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cves VALUES (?, ?)", rows)
+        return len(rows)
+
+    def get_meta(self):
+        return self._meta(self.open().conn)
+
+    def set_meta(self, **values):
+        conn = self.open().conn
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(k, str(v)) for k, v in values.items() if v is not None],
+            )
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def iter_year_cves(filename, cve_ids=None):
+    """Itère sur les couples (cve_id, cve) d'un flux annuel, filtrés sur `cve_ids`."""
+    for vuln in iter_nvd_records(filename):
+        cve = vuln.get("cve", {})
+        cve_id = cve.get("id")
+        if cve_id and (cve_ids is None or cve_id in cve_ids):
+            yield cve_id, cve
+
+
+def worker_context():
+    """Contexte des processus de chargement : forkserver (spawn à défaut), jamais fork.
+
+    prefetch est appelé pendant que l'orchestrateur fait tourner ses threads de
+    collecte et d'écriture ; un fork copierait leurs verrous (logging, pool
+    urllib3, seaux de http_client) dans un état tenu, d'où des blocages."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _load_year_records(filename, cve_ids=None):
+    """Tâche du pool de processus : projette un flux annuel en {cve_id: tuple compact}."""
+    return {cve_id: NVDRecord.from_cve(cve).to_tuple() for cve_id, cve in iter_year_cves(filename, cve_ids)}
+
+
+def _build_year_index(filename):
+    """Tâche du pool de processus : (re)construit l'index SQLite d'un flux si nécessaire."""
+    NVDIndex(filename).open().close()
+    return filename
+
 
 class NVDEnricher:
-    def __init__(self):
-        self.nvd_cache_by_year = {}
+    def __init__(self, use_index=False, cache_budget_mb=None):
+        self.nvd_cache_by_year = YearLRUCache(cache_budget_mb)
+        self.wanted_cves = None  # None = toutes les CVE de l'année sont indexées
+        self.use_index = use_index  # recherches via l'index SQLite persistant
+        self.nvd_index_by_year = {}
+        self.sync_state = None  # validateurs HTTP et .meta NVD déjà vus
 
-    def download_nvd_json(self, year: int):
-        """Télécharge le fichier NVD 2.0 pour une année donnée si nécessaire."""
-        filename = Path(f"nvdcve-2.0-{year}.json.gz")
-        if filename.exists():
-            return filename
+    def restrict_to(self, cve_ids):
+        """Limite l'indexation NVD aux CVE demandées (ex. candidats ZDI / Zero-day.cz)."""
+        wanted = {c for c in cve_ids if c and c.startswith("CVE-")}
+        if self.wanted_cves is not None and not wanted <= self.wanted_cves:
+            # De nouvelles CVE sont demandées : les index filtrés déjà chargés sont incomplets
+            self.nvd_cache_by_year.clear()
+        self.wanted_cves = wanted
 
-        url = f"https://nvd.nist.gov/feeds/json/cve/2.0/nvdcve-2.0-{year}.json.gz"
-        print(f"[NVD] Téléchargement du fichier {url} ...")
-        r = requests.get(url, stream=True)
+    def _load_sync_state(self):
+        if self.sync_state is None:
+            self.sync_state = json.loads(SYNC_STATE_FILE.read_text()) if SYNC_STATE_FILE.exists() else {}
+        return self.sync_state
+
+    def _save_sync_state(self):
+        tmp = SYNC_STATE_FILE.with_name(SYNC_STATE_FILE.name + ".tmp")
+        tmp.write_text(json.dumps(self.sync_state, indent=2))
+        os.replace(tmp, SYNC_STATE_FILE)
+
+    def _conditional_get(self, url: str, have_local: bool, timeout=60, **kwargs):
+        """GET conditionnel (ETag / Last-Modified). Retourne None si la ressource n'a pas changé."""
+        validators = self._load_sync_state().setdefault("http", {})
+        headers = {}
+        if have_local and url in validators:
+            if validators[url].get("etag"):
+                headers["If-None-Match"] = validators[url]["etag"]
+            if validators[url].get("last_modified"):
+                headers["If-Modified-Since"] = validators[url]["last_modified"]
+
+        r = http_client.get(url, headers=headers, timeout=timeout, **kwargs)
+        if r.status_code == 304:
+            return None
         r.raise_for_status()
-        with open(filename, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
+        validators[url] = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+        return r
+
+    def fetch_meta(self, name) -> dict:
+        """Récupère le `.meta` d'un flux NVD (quelques centaines d'octets)."""
+        metas = self._load_sync_state().setdefault("meta", {})
+        url = NVD_FEED_BASE.format(name=name) + ".meta"
+        r = self._conditional_get(url, have_local=str(name) in metas, timeout=30)
+        if r is not None:
+            metas[str(name)] = parse_nvd_meta(r.text)
+        return metas[str(name)]
+
+    def _download_feed(self, name, filename: Path):
+        url = NVD_FEED_BASE.format(name=name) + ".json.gz"
+        print(f"[NVD] Téléchargement du fichier {url} ...")
+        r = self._conditional_get(url, have_local=filename.exists(), stream=True)
+        if r is None:
+            print(f"[NVD] {filename} inchangé (304)")
+            return filename
+
+        tmp = filename.with_name(filename.name + ".part")
+        with open(tmp, "wb") as f:
+            for chunk in r.iter_content(chunk_size=1 << 16):
                 f.write(chunk)
+        os.replace(tmp, filename)
         print(f"[NVD] Téléchargement terminé : {filename}")
         return filename
 
-    def load_nvd_json(self, year: int):
-        """Charge et indexe le fichier NVD pour une année donnée."""
+    def download_nvd_json(self, year: int, force=False):
+        """Télécharge le fichier NVD 2.0 pour une année donnée si nécessaire."""
+        filename = Path(f"nvdcve-2.0-{year}.json.gz")
+        if filename.exists() and not force:
+            return filename
+        return self._download_feed(year, filename)
+
+    def load_delta(self, years):
+        """Télécharge (si modifié) le flux delta et regroupe ses CVE par année."""
+        filename = self._download_feed(DELTA_FEED, Path(f"nvdcve-2.0-{DELTA_FEED}.json.gz"))
+        delta = defaultdict(list)
+        for vuln in iter_nvd_records(filename):
+            cve = vuln.get("cve", {})
+            year = get_cve_year(cve.get("id", ""))
+            if year in years:
+                delta[year].append(cve)
+        return delta
+
+    def sync(self, years):
+        """Synchronisation incrémentale des index annuels avec la NVD.
+
+        Pour chaque année, le `.meta` distant est comparé au sha256 appliqué
+        localement. Une année déjà synchronisée depuis moins de 7 jours est mise
+        à jour avec le flux `modified` ; sinon le fichier annuel est re-téléchargé
+        (GET conditionnel). Les recherches doivent passer par l'index (`use_index`).
+
+        Retourne (CVE modifiées via le flux delta, années re-téléchargées) : les
+        vulnérabilités déjà en base qui en relèvent sont à ré-enrichir.
+        """
+        years = set(years)
+        changed = set()
+        rebuilt = set()
+        delta = None
+        delta_meta = None
+        now = datetime.now(timezone.utc)
+
+        for year in sorted(years):
+            remote = self.fetch_meta(year)
+            feed_exists = Path(f"nvdcve-2.0-{year}.json.gz").exists()
+            local = self.get_index(year).get_meta() if feed_exists else {}
+
+            if local.get("nvd_sha256") == remote.get("sha256"):
+                print(f"[NVD] {year} à jour ({remote.get('lastModifiedDate')})")
+                continue
+
+            last_sync = local.get("nvd_last_modified")
+            if last_sync:
+                last_sync = datetime.fromisoformat(last_sync)
+                if last_sync.tzinfo is None:
+                    last_sync = last_sync.replace(tzinfo=timezone.utc)
+            if last_sync and now - last_sync <= DELTA_WINDOW:
+                if delta is None:
+                    delta_meta = self.fetch_meta(DELTA_FEED)
+                    delta = self.load_delta(years)
+                count = self.get_index(year).upsert(delta.get(year, []))
+                changed.update(cve["id"] for cve in delta.get(year, []) if cve.get("id"))
+                print(f"[NVD] {year} : {count} CVE mises à jour depuis le flux {DELTA_FEED}")
+                last_modified = delta_meta.get("lastModifiedDate")
+            else:
+                index = self.nvd_index_by_year.pop(year, None)
+                if index:
+                    index.close()
+                self.download_nvd_json(year, force=True)
+                rebuilt.add(year)
+                last_modified = remote.get("lastModifiedDate")
+
+            self.get_index(year).set_meta(nvd_sha256=remote.get("sha256"), nvd_last_modified=last_modified)
+
+        self._save_sync_state()
+        return changed, rebuilt
+
+    def load_nvd_json(self, year: int, cve_ids=None):
+        """Charge et indexe le fichier NVD pour une année donnée.
+
+        Le flux est parcouru en streaming ; si `cve_ids` (ou `wanted_cves`) est
+        fourni, seules ces CVE sont conservées dans l'index.
+        """
         if year in self.nvd_cache_by_year:
             return self.nvd_cache_by_year[year]
 
+        if cve_ids is None:
+            cve_ids = self.wanted_cves
+
         filename = self.download_nvd_json(year)
         print(f"[NVD] Chargement du fichier {filename}...")
-        with gzip.open(filename, "rt", encoding="utf-8") as f:
-            data = json.load(f)
-
-        cve_index = {}
-        for vuln in data.get("vulnerabilities", []):
-            cve_id = vuln["cve"]["id"]
-            cve_index[cve_id] = vuln["cve"]
+        cve_index = {cve_id: NVDRecord.from_cve(cve) for cve_id, cve in iter_year_cves(filename, cve_ids)}
         print(f"[NVD] {len(cve_index)} CVE indexées pour {year}.")
         self.nvd_cache_by_year[year] = cve_index
         return cve_index
 
+    def prefetch(self, years, workers=None):
+        """Charge en parallèle, sur un pool de processus, les années nécessaires.
+
+        Décompression, décodage JSON et projection sont faits dans les workers ;
+        le parent ne reçoit que les index compacts (ou, en mode `use_index`,
+        les index SQLite sont construits par les workers puis ouverts ici).
+
+        En mémoire, le préchargement s'arrête au budget du cache LRU : les années
+        suivantes sont chargées une à une par `enrich_all`, en évinçant les plus
+        anciennes, au lieu d'être préchargées puis évincées aussitôt.
+        """
+        loaded = self.nvd_index_by_year if self.use_index else self.nvd_cache_by_year
+        years = sorted({y for y in years if y is not None and y not in loaded})
+        if not years:
+            return
+        workers = workers or os.cpu_count()
+
+        print(f"[NVD] Chargement parallèle de {len(years)} année(s) ({workers} processus)...")
+        pending = iter(years)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool:
+            futures = {}
+
+            def submit_next():
+                year = next(pending, None)
+                if year is None:
+                    return
+                # Les téléchargements restent séquentiels : seul le travail CPU est distribué
+                filename = str(self.download_nvd_json(year))
+                if self.use_index:
+                    futures[pool.submit(_build_year_index, filename)] = year
+                else:
+                    futures[pool.submit(_load_year_records, filename, self.wanted_cves)] = year
+
+            for _ in range(workers):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    year = futures.pop(future)
+                    result = future.result()
+                    if self.use_index:
+                        self.get_index(year)
+                    elif self.nvd_cache_by_year.full():
+                        log.info("Budget du cache atteint : %s sera chargée à la demande", year)
+                        continue
+                    else:
+                        self.nvd_cache_by_year[year] = {
+                            cve_id: NVDRecord.from_tuple(values) for cve_id, values in result.items()
+                        }
+                        print(f"[NVD] {len(result)} CVE indexées pour {year}.")
+                    if self.use_index or not self.nvd_cache_by_year.full():
+                        submit_next()
+
+    def get_index(self, year: int):
+        """Retourne l'index persistant de l'année, construit au besoin."""
+        if year not in self.nvd_index_by_year:
+            self.nvd_index_by_year[year] = NVDIndex(self.download_nvd_json(year)).open()
+        return self.nvd_index_by_year[year]
+
+    def lookup(self, cve_id: str, year: int):
+        """Retourne la projection NVD d'une CVE (index persistant ou cache mémoire)."""
+        if self.use_index:
+            return self.get_index(year).get(cve_id)
+        return self.load_nvd_json(year).get(cve_id)
+
+    def close(self):
+        for index in self.nvd_index_by_year.values():
+            index.close()
+        self.nvd_index_by_year.clear()
+
     def enrich(self, vuln: dict):
         """Enrichit une vulnérabilité avec les données NVD si disponibles."""
         cve_id = vuln.get("cve_id")
         if not cve_id or not cve_id.startswith("CVE-"):
             return vuln
 
-        try:
-            year = int(cve_id.split("-")[1])
-        except (IndexError, ValueError):
+        year = get_cve_year(cve_id)
+        if year is None:
             return vuln
 
-        nvd_cache = self.load_nvd_json(year)
-        nvd_vuln = nvd_cache.get(cve_id)
-        if not nvd_vuln:
-            vuln["nvd"] = None
+        record = self.lookup(cve_id, year)
+        if record is None:
             return vuln
 
-        vuln["nvd"] = nvd_vuln
-
         try:
-            # Dates
-            published_str = nvd_vuln.get("published")
-            vuln["published_nvd"] = (
-                datetime.strptime(published_str, "%Y-%m-%dT%H:%M:%S.%f")
-                if published_str else None
-            )
+            record.apply(vuln)
+        except Exception as e:
+            log.warning("Erreur parsing CVE %s : %s", cve_id, e)
 
-            # Scores CVSS
-            metrics = nvd_vuln.get("metrics", {})
-            if "cvssMetricV2" in metrics:
-                cvss2 = metrics["cvssMetricV2"][0]["cvssData"]
-                vuln["cvss2_base_score"] = cvss2.get("baseScore")
-                vuln["cvss2_vector"] = cvss2.get("vectorString")
-
-            if "cvssMetricV30" in metrics:
-                cvss3 = metrics["cvssMetricV30"][0]["cvssData"]
-                vuln["cvss3_base_score"] = cvss3.get("baseScore")
-                vuln["cvss3_vector"] = cvss3.get("vectorString")
-                
-            if "cvssMetricV31" in metrics:
-                cvss3 = metrics["cvssMetricV31"][0]["cvssData"]
-                vuln["cvss3_base_score"] = cvss3.get("baseScore")
-                vuln["cvss3_vector"] = cvss3.get("vectorString")
-
-            if "cvssMetricV40" in metrics:
-                cvss4 = metrics["cvssMetricV40"][0]["cvssData"]
-                vuln["cvss4_base_score"] = cvss4.get("baseScore")
-                vuln["cvss4_vector"] = cvss4.get("vectorString")
-
-            # Configurations
-            configurations = nvd_vuln.get("configurations", [])
-            found_cpes = []
-            vendor_products = []
-
-            for config in configurations:
-                for node in config.get("nodes", []):
-                    for match in node.get("cpeMatch", []):
-                        cpe = match.get("criteria")
-                        if cpe:
-                            found_cpes.append({
-                                "source": "NVD",
-                                "product": cpe
-                            })
-                            parts = cpe.split(":")
-                            if len(parts) >= 5:
-                                vendor_products.append({
-                                    "vendor": parts[3],
-                                    "product": parts[4]
-                                })
-
-            if found_cpes:
-                vuln["configurations"] = found_cpes
-            if vendor_products:
-                vuln["vendor_product"] = vendor_products
+        return vuln
 
+    def enrich_all(self, vulns):
+        """Enrichit une liste de vulnérabilités en les traitant année CVE par année CVE.
 
-        except Exception as e:
-            print(f"[NVD] Erreur parsing CVE {cve_id}: {e}")
+        Chaque année n'est ainsi chargée qu'une fois, puis peut être évincée
+        du cache avant de passer à la suivante.
+        """
+        by_year = defaultdict(list)
+        for vuln in vulns:
+            cve_id = vuln.get("cve_id") or ""
+            if cve_id.startswith("CVE-"):
+                by_year[get_cve_year(cve_id)].append(vuln)
 
-        return vuln
+        for year in sorted(y for y in by_year if y is not None):
+            for vuln in by_year[year]:
+                self.enrich(vuln)
+        return vulns
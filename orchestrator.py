@@ -0,0 +1,129 @@
+import os
+import time
+import db
+import metrics
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from etl import (
+    EPSS_USE_SNAPSHOT, NVD_CACHE_BUDGET_MB, NVD_USE_INDEX,
+    enrich_candidates, load_nvd_years, merge_candidates, nvd_years, open_sources, refresh_candidates,
+    save_watermarks,
+)
+from nvd_collector import NVDEnricher
+from kev_collector import KEVEnricher
+from epss_collector import EPSSEnricher
+from db_sink import bulk_upsert
+
+# ETL pipeliné : les collecteurs tournent en parallèle, chaque lot de résultats
+# est enrichi dès son arrivée (thread principal : les index SQLite NVD n'acceptent
+# qu'un thread) et écrit en base par un writer dédié pendant que la collecte continue.
+
+COLLECT_WORKERS = int(os.getenv("ETL_COLLECT_WORKERS", "4"))  # téléchargements de sources simultanés
+FLUSH_SIZE = int(os.getenv("ETL_FLUSH_SIZE", "500"))  # vulnérabilités par lot enrichi / écrit
+MAX_PENDING_WRITES = 2  # lots en attente d'écriture avant de freiner l'enrichissement
+
+
+class Pipeline:
+    def __init__(self, flush_size=FLUSH_SIZE, incremental=True):
+        self.flush_size = flush_size
+        self.incremental = incremental
+        self.nvd_enricher = NVDEnricher(use_index=NVD_USE_INDEX, cache_budget_mb=NVD_CACHE_BUDGET_MB)
+        self.kev_enricher = KEVEnricher()
+        self.epss_enricher = EPSSEnricher(use_snapshot=EPSS_USE_SNAPSHOT)
+        self.zdi_collector = None
+        self.zdcz_collector = None
+        self.loaded_years = set()
+        self.pending = []
+        self.writes = []
+        self.counts = {"inserted": 0, "changed": 0, "unchanged": 0}
+
+    @staticmethod
+    def _timed(name, fn, *args):
+        """Exécute une tâche de collecte dans une étape mesurée."""
+        with metrics.stage(name) as record:
+            result = fn(*args)
+            record["rows"] = len(result)
+        return result
+
+    def enrich(self, batch, cur):
+        """Fusionne et enrichit un lot ; les années NVD sont chargées à la première occurrence."""
+        batch = merge_candidates(batch)
+        years = nvd_years(batch) - self.loaded_years
+        if years:
+            load_nvd_years(self.nvd_enricher, years)
+            self.loaded_years |= years
+        return enrich_candidates(batch, self.nvd_enricher, self.kev_enricher, self.epss_enricher, cur)
+
+    def flush(self, writer, write_conn, cur, force=False):
+        """Enrichit les candidats accumulés par lots de `flush_size` et les confie au writer."""
+        while self.pending and (force or len(self.pending) >= self.flush_size):
+            batch, self.pending = self.pending[:self.flush_size], self.pending[self.flush_size:]
+            batch = self.enrich(batch, cur)
+            self._drain(MAX_PENDING_WRITES - 1)
+            self.writes.append(writer.submit(bulk_upsert, write_conn, batch, "PIPELINE"))
+
+    def _drain(self, keep=0):
+        """Attend les écritures en cours jusqu'à n'en laisser que `keep`."""
+        while len(self.writes) > keep:
+            counts = self.writes.pop(0).result()
+            for key in self.counts:
+                self.counts[key] += counts[key]
+
+    def run(self):
+        start = time.monotonic()
+        report = metrics.start_run("etl")
+        conn = db.acquire()
+        write_conn = db.acquire(autocommit=False)  # une connexion par thread écrivain
+        cur = conn.cursor()
+
+        with ThreadPoolExecutor(max_workers=COLLECT_WORKERS, thread_name_prefix="collect") as collect, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="write") as writer:
+            # --- Collecte : KEV, chaque année ZDI et Zero-day.cz en parallèle ---
+            state, self.zdi_collector, self.zdcz_collector = open_sources(cur, self.incremental)
+            kev_future = collect.submit(self._timed, "kev", self.kev_enricher.fetch)
+            years = range(self.zdi_collector.year_from, self.zdi_collector.year_to + 1)
+            # {future: (nom, filtre)} ; le filtre incrémental ZDI s'applique dans ce thread
+            sources = {
+                collect.submit(self._timed, "zdi", self.zdi_collector.fetch_year, year):
+                    (f"ZDI {year}", self.zdi_collector.keep_new)
+                for year in years
+            }
+            sources[collect.submit(self._timed, "zdcz", self.zdcz_collector.fetch)] = ("Zero-day.cz", iter)
+
+            kev_future.result()  # l'enrichissement KEV a besoin de la liste complète
+            if self.incremental:
+                self.pending.extend(refresh_candidates(
+                    cur, state, self.nvd_enricher, self.kev_enricher, self.epss_enricher
+                ))
+            while sources:
+                done, _ = wait(sources, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, keep = sources.pop(future)
+                    vulns = list(keep(future.result()))
+                    print(f"[PIPELINE] {name} : {len(vulns)} candidats reçus "
+                          f"({time.monotonic() - start:.1f}s)")
+                    self.pending.extend(vulns)
+                # --- Enrichissement et écriture pendant que la collecte continue ---
+                self.flush(writer, write_conn, cur)
+
+            self.flush(writer, write_conn, cur, force=True)
+            self._drain()
+
+        save_watermarks(cur, self.zdi_collector, self.zdcz_collector, self.kev_enricher)
+        self.nvd_enricher.close()
+        cur.close()
+        db.release(conn)
+        db.release(write_conn)
+
+        print(f"[PIPELINE] {self.counts['inserted']} insérées, {self.counts['changed']} modifiées, "
+              f"{self.counts['unchanged']} inchangées en {time.monotonic() - start:.1f}s")
+        report.write()
+        return self.counts
+
+
+def run_pipeline(incremental=True):
+    return Pipeline(incremental=incremental).run()
+
+
+if __name__ == "__main__":
+    metrics.setup_logging()
+    run_pipeline()
@@ -1,5 +1,5 @@
-DROP TABLE IF EXISTS source_mappings;
-DROP TABLE IF EXISTS vulnerabilities CASCADE;
+-- Schéma idempotent : rejoué à chaque lancement sans perte de données.
+-- La reconstruction complète (DROP) est explicite : main.py --full-rebuild
 
 -- Table principale des vulnérabilités
 CREATE TABLE IF NOT EXISTS vulnerabilities (
@@ -26,11 +26,15 @@ CREATE TABLE IF NOT EXISTS vulnerabilities (
     epss_percentile FLOAT,
     refs JSONB,
     tags TEXT[],
+    content_hash TEXT,                    -- md5 des champs persistés (détection des changements)
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Colonnes ajoutées après coup (bases créées par une version antérieure)
+ALTER TABLE vulnerabilities ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Table pour mapper les sources
-CREATE TABLE source_mappings (
+CREATE TABLE IF NOT EXISTS source_mappings (
     id SERIAL PRIMARY KEY,
     vuln_id INT REFERENCES vulnerabilities(vuln_id) ON DELETE CASCADE,
     source_name TEXT,
@@ -39,7 +43,45 @@ CREATE TABLE source_mappings (
     retrieved TIMESTAMP DEFAULT now()
 );
 
+-- Historique des scores EPSS (append-only, conservé entre les réinitialisations)
+CREATE TABLE IF NOT EXISTS epss_history (
+    cve_id TEXT NOT NULL,
+    score_date DATE NOT NULL,
+    epss_score FLOAT,
+    epss_percentile FLOAT,
+    PRIMARY KEY (cve_id, score_date)
+);
+
+-- Marques hautes par source et dernière étape atteinte (ETL incrémental)
+CREATE TABLE IF NOT EXISTS etl_state (
+    source TEXT PRIMARY KEY,              -- zdi, zdcz, kev, ou run pour l'exécution globale
+    watermark JSONB,
+    last_stage TEXT,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Tranches de travail de l'ETL réparti (années, plages d'index CPE), réclamées
+-- par les workers avec SELECT ... FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS etl_shards (
+    job TEXT NOT NULL,                    -- etl ou cpe
+    shard TEXT NOT NULL,                  -- ex. 2019 ou 000040000-000060000
+    params JSONB NOT NULL,                -- bornes de la tranche
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, running, done, failed
+    worker TEXT,                          -- hôte:pid du dernier worker
+    attempts INT NOT NULL DEFAULT 0,
+    progress JSONB,                       -- point de reprise à l'intérieur de la tranche
+    result JSONB,
+    error TEXT,
+    claimed_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    PRIMARY KEY (job, shard)
+);
+
 -- Index utiles
-CREATE INDEX idx_vuln_cve ON vulnerabilities(cve_id);
-CREATE INDEX idx_vuln_tags ON vulnerabilities USING gin (tags);
-CREATE INDEX idx_vuln_vendor_product ON vulnerabilities(vendor_product);
+CREATE INDEX IF NOT EXISTS idx_vuln_cve ON vulnerabilities(cve_id);
+CREATE INDEX IF NOT EXISTS idx_vuln_tags ON vulnerabilities USING gin (tags);
+CREATE INDEX IF NOT EXISTS idx_vuln_vendor_product ON vulnerabilities(vendor_product);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mapping_source ON source_mappings(source_name, source_id);
+CREATE INDEX IF NOT EXISTS idx_mapping_vuln ON source_mappings(vuln_id);
+CREATE INDEX IF NOT EXISTS idx_shards_claim ON etl_shards(job, status, shard);
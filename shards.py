@@ -0,0 +1,311 @@
+import argparse
+import logging
+import os
+import socket
+import threading
+import db
+import metrics
+from contextlib import contextmanager
+from psycopg2.extras import Json
+from cpe_collector import RESULTS_PER_PAGE, cpe_total, init_db, run_cpe_shard
+from etl import YEAR_FROM, YEAR_TO, run_year_shard
+
+# ETL réparti : les années (job "etl") et l'espace d'index CPE (job "cpe") sont
+# découpés en tranches stockées dans `etl_shards`. Chaque worker, sur n'importe
+# quel hôte, réclame une tranche libre avec SELECT ... FOR UPDATE SKIP LOCKED :
+# deux workers ne traitent jamais la même tranche en même temps. Une tranche dont
+# le worker ne donne plus signe de vie (bail expiré) ou qui a échoué est
+# réattribuée ; la progression enregistrée permet de la reprendre.
+
+LEASE_SECONDS = int(os.getenv("SHARD_LEASE_SECONDS", "900"))  # sans battement de cœur, la tranche est réattribuée
+HEARTBEAT_SECONDS = max(1, LEASE_SECONDS // 3)  # prolongation du bail en arrière-plan
+MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+YEARS_PER_SHARD = int(os.getenv("SHARD_YEARS", "1"))
+CPE_SHARD_SIZE = int(os.getenv("SHARD_CPE_SIZE", str(10 * RESULTS_PER_PAGE)))  # multiple de RESULTS_PER_PAGE
+
+log = logging.getLogger("shards")
+
+# job -> (traitement d'une tranche, préparation du worker)
+JOBS = {
+    "etl": (run_year_shard, None),
+    "cpe": (run_cpe_shard, init_db),
+}
+
+CLAIM_SQL = """
+    UPDATE etl_shards s SET
+        status='running', worker=%(worker)s, attempts=s.attempts + 1,
+        claimed_at=NOW(), heartbeat_at=NOW(), error=NULL
+    FROM (
+        SELECT job, shard FROM etl_shards
+        WHERE job=%(job)s AND (
+            status='pending'
+            OR (status='running' AND heartbeat_at < NOW() - make_interval(secs => %(lease)s)
+                AND attempts < %(max_attempts)s)
+            OR (status='failed' AND attempts < %(max_attempts)s)
+        )
+        ORDER BY shard
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ) free
+    WHERE s.job=free.job AND s.shard=free.shard
+    RETURNING s.shard, s.params, s.progress
+"""
+
+
+# Tranche dont le worker est mort (OOM, plantage) à chacun de ses essais : elle
+# n'est plus réattribuée mais marquée en échec (relançable via `retry`)
+EXPIRE_SQL = """
+    UPDATE etl_shards SET status='failed', error='bail expiré après ' || attempts || ' essai(s)'
+    WHERE job=%(job)s AND status='running' AND attempts >= %(max_attempts)s
+        AND heartbeat_at < NOW() - make_interval(secs => %(lease)s)
+"""
+
+
+# Nouvelle génération : quand l'exécution précédente est terminée (plus aucune
+# tranche en attente ni en cours), les tranches terminées ou en échec repartent
+# en attente. Le filtre sur le statut est réévalué si une ligne vient d'être
+# réclamée par un autre hôte : une tranche en cours n'est jamais réinitialisée.
+REOPEN_SQL = """
+    UPDATE etl_shards SET
+        status='pending', worker=NULL, attempts=0, progress=NULL, result=NULL, error=NULL,
+        claimed_at=NULL, heartbeat_at=NULL, finished_at=NULL
+    WHERE job=%(job)s AND status IN ('done', 'failed') AND NOT EXISTS (
+        SELECT 1 FROM etl_shards WHERE job=%(job)s AND status IN ('pending', 'running')
+    )
+"""
+
+
+class LeaseLost(Exception):
+    """La tranche a été réattribuée à un autre worker (bail expiré)."""
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def year_shards(year_from, year_to, size=YEARS_PER_SHARD):
+    """[(nom, params)] : une tranche par groupe de `size` années."""
+    shards = []
+    for start in range(year_from, year_to + 1, size):
+        stop = min(start + size - 1, year_to)
+        name = str(start) if start == stop else f"{start}-{stop}"
+        shards.append((name, {"year_from": start, "year_to": stop}))
+    return shards
+
+
+def cpe_shards(total, size=CPE_SHARD_SIZE):
+    """[(nom, params)] : plages [start, stop) alignées sur les pages de l'API.
+
+    La dernière tranche est ouverte (stop absent) pour couvrir les CPE ajoutées
+    depuis le découpage."""
+    size = max(RESULTS_PER_PAGE, size - size % RESULTS_PER_PAGE)
+    shards = []
+    for start in range(0, max(total, 1), size):
+        if start + size < total:
+            shards.append((f"{start:09d}-{start + size:09d}", {"start": start, "stop": start + size}))
+        else:
+            shards.append((f"{start:09d}-", {"start": start}))
+    return shards
+
+
+def plan(cur, job, shards):
+    """Enregistre les tranches d'un job ; celles déjà connues sont laissées intactes."""
+    db.execute_values(cur, """
+        INSERT INTO etl_shards (job, shard, params) VALUES %s
+        ON CONFLICT (job, shard) DO NOTHING
+    """, [(job, name, Json(params)) for name, params in shards])
+    print(f"[SHARD] {job} : {cur.rowcount} nouvelle(s) tranche(s) sur {len(shards)}")
+    return cur.rowcount
+
+
+def reopen(cur, job):
+    """Remet en attente les tranches d'une exécution terminée ; sans effet si une est en cours."""
+    cur.execute(REOPEN_SQL, {"job": job})
+    if cur.rowcount:
+        print(f"[SHARD] {job} : nouvelle exécution, {cur.rowcount} tranche(s) remise(s) en attente")
+    return cur.rowcount
+
+
+def claim(cur, job, worker):
+    """Réclame une tranche libre ; retourne (nom, params, progression) ou None."""
+    args = {"job": job, "worker": worker, "lease": LEASE_SECONDS, "max_attempts": MAX_ATTEMPTS}
+    cur.execute(EXPIRE_SQL, args)
+    if cur.rowcount:
+        log.warning("%s tranche(s) %s abandonnée(s) après %s essais", cur.rowcount, job, MAX_ATTEMPTS)
+    cur.execute(CLAIM_SQL, args)
+    return cur.fetchone()
+
+
+def checkpoint(cur, job, shard, worker, progress):
+    """Enregistre la progression (et prolonge le bail) ; LeaseLost si la tranche a changé de main."""
+    cur.execute("""
+        UPDATE etl_shards SET progress=%s, heartbeat_at=NOW()
+        WHERE job=%s AND shard=%s AND worker=%s AND status='running'
+    """, (Json(progress), job, shard, worker))
+    if cur.rowcount == 0:
+        raise LeaseLost(f"{job} {shard}")
+
+
+def finish(cur, job, shard, worker, result):
+    """Marque la tranche terminée ; LeaseLost si elle a entre-temps changé de main."""
+    cur.execute("""
+        UPDATE etl_shards SET status='done', result=%s, finished_at=NOW(), heartbeat_at=NOW()
+        WHERE job=%s AND shard=%s AND worker=%s AND status='running'
+    """, (Json(result), job, shard, worker))
+    if cur.rowcount == 0:
+        raise LeaseLost(f"{job} {shard}")
+
+
+def fail(cur, job, shard, worker, error):
+    cur.execute("""
+        UPDATE etl_shards SET status='failed', error=%s, heartbeat_at=NOW()
+        WHERE job=%s AND shard=%s AND worker=%s AND status='running'
+    """, (error, job, shard, worker))
+
+
+@contextmanager
+def heartbeat(job, shard, worker, interval=HEARTBEAT_SECONDS):
+    """Prolonge le bail en arrière-plan tant que la tranche est tenue : un lot
+    (chargement d'une année NVD, ...) peut durer plus que LEASE_SECONDS. Le thread
+    utilise sa propre connexion et s'arrête si la tranche a changé de main."""
+    stop = threading.Event()
+
+    def beat():
+        conn = db.acquire()
+        try:
+            with conn.cursor() as cur:
+                while not stop.wait(interval):
+                    cur.execute("""
+                        UPDATE etl_shards SET heartbeat_at=NOW()
+                        WHERE job=%s AND shard=%s AND worker=%s AND status='running'
+                    """, (job, shard, worker))
+                    if cur.rowcount == 0:
+                        log.warning("Tranche %s %s réattribuée : battement de cœur arrêté", job, shard)
+                        return
+        except Exception:
+            log.exception("Battement de cœur de la tranche %s %s interrompu", job, shard)
+        finally:
+            db.release(conn)
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job}-{shard}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def summary(cur, job):
+    """{statut: nombre de tranches} d'un job."""
+    cur.execute("SELECT status, COUNT(*) FROM etl_shards WHERE job=%s GROUP BY status ORDER BY status", (job,))
+    return dict(cur.fetchall())
+
+
+def run_worker(job, max_shards=None):
+    """Traite des tranches du job jusqu'à ce qu'il n'en reste aucune de libre."""
+    work, setup = JOBS[job]
+    report = metrics.start_run(f"{job}-shards")
+    worker = worker_id()
+    conn = db.acquire()  # autocommit : réclamation et progression validées immédiatement
+    cur = conn.cursor()
+    if setup:
+        setup()
+
+    counts = {"done": 0, "failed": 0, "lost": 0}
+    while max_shards is None or sum(counts.values()) < max_shards:
+        claimed = claim(cur, job, worker)
+        if claimed is None:
+            break
+        shard, params, progress = claimed
+        print(f"[SHARD] {worker} : {job} {shard}" + (f" (reprise : {progress})" if progress else ""))
+        try:
+            with heartbeat(job, shard, worker), metrics.stage(f"{job}_shard") as record:
+                result = work(params, progress, lambda p: checkpoint(cur, job, shard, worker, p))
+                record["rows"] = result.get("rows", 0)
+            finish(cur, job, shard, worker, result)
+        except LeaseLost:
+            print(f"[SHARD] {job} {shard} réattribuée à un autre worker, abandon")
+            counts["lost"] += 1
+            continue
+        except Exception as e:
+            log.exception("Échec de la tranche %s %s", job, shard)
+            fail(cur, job, shard, worker, f"{e.__class__.__name__}: {e}")
+            counts["failed"] += 1
+            continue
+        counts["done"] += 1
+        print(f"[SHARD] {job} {shard} terminée : {result}")
+
+    print(f"[SHARD] {worker} : {counts['done']} terminée(s), {counts['failed']} en échec, "
+          f"{counts['lost']} perdue(s) ; état du job {job} : {summary(cur, job)}")
+    report.write()
+    cur.close()
+    db.release(conn)
+    return counts
+
+
+def run_sharded_etl(incremental=True):
+    """Mode ETL_MODE=sharded : découpe YEAR_FROM..YEAR_TO (tranches existantes
+    conservées), rouvre les tranches si l'exécution précédente est terminée,
+    puis traite des tranches. À lancer sur autant d'hôtes que voulu : les hôtes
+    lancés pendant une exécution la rejoignent au lieu d'en démarrer une autre.
+
+    Chaque exécution rejoue toutes les tranches (pas de marques hautes) : il n'y
+    a pas de mode incrémental, et une reconstruction complète supprimerait
+    etl_shards sous les workers des autres hôtes ; elle est donc refusée."""
+    if not incremental:
+        raise ValueError("--full-rebuild n'est pas pris en charge en mode sharded")
+    with db.cursor() as cur:
+        plan(cur, "etl", year_shards(YEAR_FROM, YEAR_TO))
+        reopen(cur, "etl")
+    return run_worker("etl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ETL réparti par tranches")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("plan", help="découper un job en tranches")
+    p.add_argument("job", choices=list(JOBS))
+    p.add_argument("--years", type=int, nargs=2, metavar=("FROM", "TO"), default=(YEAR_FROM, YEAR_TO))
+    p.add_argument("--size", type=int, help="années (etl) ou CPE (cpe) par tranche")
+    p = sub.add_parser("work", help="traiter des tranches jusqu'à épuisement")
+    p.add_argument("job", choices=list(JOBS))
+    p.add_argument("--max-shards", type=int)
+    p = sub.add_parser("status", help="état des tranches")
+    p.add_argument("job", choices=list(JOBS))
+    p = sub.add_parser("retry", help="remettre en attente les tranches en échec")
+    p.add_argument("job", choices=list(JOBS))
+    args = parser.parse_args()
+    metrics.setup_logging()
+
+    if args.command == "work":
+        run_worker(args.job, args.max_shards)
+        return
+
+    conn = db.acquire()
+    cur = conn.cursor()
+    if args.command == "plan" and args.job == "etl":
+        plan(cur, "etl", year_shards(*args.years, size=args.size or YEARS_PER_SHARD))
+    elif args.command == "plan":
+        plan(cur, "cpe", cpe_shards(cpe_total(), size=args.size or CPE_SHARD_SIZE))
+    elif args.command == "retry":
+        cur.execute("""
+            UPDATE etl_shards SET status='pending', attempts=0, error=NULL
+            WHERE job=%s AND status='failed'
+        """, (args.job,))
+        print(f"[SHARD] {cur.rowcount} tranche(s) remise(s) en attente")
+    else:
+        cur.execute("""
+            SELECT shard, status, worker, attempts, progress, result, error, heartbeat_at
+            FROM etl_shards WHERE job=%s ORDER BY shard
+        """, (args.job,))
+        for shard, status, worker, attempts, progress, result, error, heartbeat in cur.fetchall():
+            print(f"{shard:22s} {status:8s} {worker or '-':28s} essais={attempts} "
+                  f"{result or progress or ''} {error or ''} {heartbeat or ''}")
+        print(summary(cur, args.job))
+    cur.close()
+    db.release(conn)
+
+
+if __name__ == "__main__":
+    main()
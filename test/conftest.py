@@ -0,0 +1,49 @@
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Base de test de docker-compose.test.yml (docker compose -f test/docker-compose.test.yml up -d)
+TEST_DB = {
+    "dbname": os.getenv("TEST_PGDATABASE", "zerodaydb_test"),
+    "user": os.getenv("TEST_PGUSER", "testuser"),
+    "password": os.getenv("TEST_PGPASSWORD", "testpass"),
+    "host": os.getenv("TEST_PGHOST", "localhost"),
+    "port": int(os.getenv("TEST_PGPORT", "5433")),
+}
+
+
+@pytest.fixture
+def pg():
+    """Fabrique de connexions vers un schéma jetable initialisé avec schema.sql.
+
+    Les tests sont ignorés si la base de test n'est pas joignable."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    try:
+        admin = psycopg2.connect(**TEST_DB, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"base de test indisponible : {e}")
+    admin.autocommit = True
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    opened = []
+
+    def connect():
+        conn = psycopg2.connect(**TEST_DB, options=f"-c search_path={schema}")
+        conn.autocommit = True
+        opened.append(conn)
+        return conn
+
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+    with connect().cursor() as cur:
+        cur.execute((ROOT / "schema.sql").read_text())
+    yield connect
+
+    for conn in opened:
+        conn.close()
+    with admin.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    admin.close()
@@ -0,0 +1,34 @@
+import circl_collector
+from circl_collector import CircuitBreaker, apply_circl, has_gaps
+
+
+def test_half_open_breaker_lets_a_single_probe_through(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(circl_collector.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+    breaker.failure()
+    breaker.failure()
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert [breaker.allow() for _ in range(3)] == [True, False, False]
+    breaker.failure()  # essai en échec : nouvelle période de refroidissement
+    assert not breaker.allow()
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.success()
+    assert all(breaker.allow() for _ in range(3))
+
+
+def test_configurations_from_other_sources_are_still_a_gap():
+    v = {"cve_id": "CVE-2025-0001", "cvss3_base_score": 7.5,
+         "configurations": [{"source": "Zero-day.cz", "product": "Foxit Reader"}]}
+    assert has_gaps(v)
+
+    apply_circl(v, {"vulnerable_configuration": ["cpe:2.3:a:foxit:pdf_reader:*:*:*:*:*:*:*:*"]})
+    assert [c["source"] for c in v["configurations"]] == ["Zero-day.cz", "CIRCL"]
+    assert has_gaps(v)  # CIRCL complète, mais NVD n'a toujours rien fourni
+
+    v["configurations"].append({"source": "NVD", "product": "cpe:2.3:a:foxit:pdf_reader:12.0:*:*:*:*:*:*:*"})
+    assert not has_gaps(v)
@@ -0,0 +1,58 @@
+import threading
+from datetime import datetime
+
+from db_sink import bulk_upsert, write_batch
+
+CVE = "CVE-2025-0001"
+
+
+def vuln(source, url, first_seen):
+    return {
+        "cve_id": CVE,
+        "title": f"Vulnérabilité vue par {source}",
+        "first_seen": first_seen,
+        "refs": [{"source": source, "url": url}],
+        "tags": [source],
+    }
+
+
+ZDI = vuln("ZDI", "https://www.zerodayinitiative.com/advisories/ZDI-25-001/", datetime(2025, 3, 1))
+ZDCZ = vuln("Zero-day.cz", "https://www.zero-day.cz/database/1/", datetime(2025, 2, 1))
+
+
+def stored(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT refs, tags, first_seen FROM vulnerabilities WHERE canonical_id=%s", (CVE,))
+        return cur.fetchone()
+
+
+def test_sequential_batches_merge_sources(pg):
+    conn = pg()
+    bulk_upsert(conn, [dict(ZDI)])
+    bulk_upsert(conn, [dict(ZDCZ)])
+    refs, tags, first_seen = stored(conn)
+    assert {r["source"] for r in refs} == {"ZDI", "Zero-day.cz"}
+    assert tags == ["ZDI", "Zero-day.cz"]
+    assert first_seen == datetime(2025, 2, 1)
+
+
+def test_concurrent_batches_do_not_lose_refs(pg):
+    """Deux lots de la même CVE sur deux connexions (workers de shards.py) :
+    le second attend la validation du premier puis fusionne avec sa ligne."""
+    first, second = pg(), pg()
+    first.autocommit = False
+    with first.cursor() as cur:
+        write_batch(cur, [dict(ZDI)])  # transaction ouverte : verrous tenus
+
+    worker = threading.Thread(target=bulk_upsert, args=(second, [dict(ZDCZ)]))
+    worker.start()
+    worker.join(1)
+    assert worker.is_alive(), "le second lot devrait attendre le premier"
+    first.commit()
+    worker.join(10)
+    assert not worker.is_alive()
+
+    refs, tags, first_seen = stored(first)
+    assert {r["source"] for r in refs} == {"ZDI", "Zero-day.cz"}
+    assert tags == ["ZDI", "Zero-day.cz"]
+    assert first_seen == datetime(2025, 2, 1)
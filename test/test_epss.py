@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+import epss_collector
+from bench.synthetic import SCORE_DATE, Universe
+from epss_collector import EPSSEnricher
+
+
+def test_snapshot_is_downloaded_once_per_day(tmp_path, monkeypatch):
+    universe = Universe(records=50)
+    universe.write_epss_snapshot(tmp_path / "published.csv.gz")
+    requested = []
+
+    def get(url, **kwargs):
+        requested.append(url)
+        content = (tmp_path / "published.csv.gz").read_bytes()
+        return SimpleNamespace(status_code=200, iter_content=lambda chunk_size: [content],
+                               raise_for_status=lambda: None)
+
+    monkeypatch.setattr(epss_collector.http_client, "get", get)
+    monkeypatch.setattr(epss_collector.http_cache, "get", None)  # jamais via le cache HTTP
+    cache = tmp_path / "epss"
+    cache.mkdir()
+    for _ in range(2):
+        snapshot = EPSSEnricher(use_snapshot=True, snapshot_dir=cache).load_snapshot("2025-10-20")
+        assert snapshot.score_date == SCORE_DATE and len(snapshot) == 50
+
+    assert len(requested) == 1
+    assert [p.name for p in cache.iterdir()] == ["epss_scores-2025-10-20.csv.gz"]
@@ -0,0 +1,20 @@
+from bench.synthetic import Universe
+from nvd_collector import NVDEnricher
+
+YEARS = (2023, 2024, 2025)
+
+
+def test_memory_prefetch_stops_at_the_cache_budget(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # les flux NVD sont lus dans le répertoire courant
+    universe = Universe(records=300, years=YEARS)
+    for year in YEARS:
+        universe.write_nvd_feed(tmp_path / f"nvdcve-2.0-{year}.json.gz", str(year))
+
+    enricher = NVDEnricher(cache_budget_mb=0.01)  # ~10 Ko : moins qu'une année
+    enricher.prefetch(YEARS, workers=1)
+    assert list(enricher.nvd_cache_by_year.entries) == [2023]
+
+    vulns = [{"cve_id": Universe.cve_id(year, 0)} for year in YEARS]
+    enricher.enrich_all(vulns)
+    assert all(v.get("published_nvd") for v in vulns)
+    assert list(enricher.nvd_cache_by_year.entries) == [2025]  # une seule année résidente
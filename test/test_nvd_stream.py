@@ -0,0 +1,52 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from bench.synthetic import Universe
+from nvd_collector import iter_nvd_records
+
+FIXTURES = Path(__file__).resolve().parent.parent / "bench" / "fixtures"
+
+
+def write_feed(path, text):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+@pytest.fixture(scope="module")
+def synthetic_feed(tmp_path_factory):
+    path = tmp_path_factory.mktemp("nvd") / "nvdcve-2.0-2025.json.gz"
+    Universe(records=300).write_nvd_feed(path, "2025")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return path, json.load(f)["vulnerabilities"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 4096, 1 << 20])
+def test_records_straddling_reads_are_decoded(synthetic_feed, chunk_size):
+    path, expected = synthetic_feed
+    assert list(iter_nvd_records(path, chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 1 << 20])
+def test_recorded_sample_pretty_printed(tmp_path, chunk_size):
+    """Échantillon NVD enregistré, réindenté : espaces et retours à la ligne entre les éléments."""
+    sample = json.loads((FIXTURES / "nvd_sample.json").read_text())
+    path = write_feed(tmp_path / "feed.json.gz", json.dumps(sample, indent=2))
+    assert list(iter_nvd_records(path, chunk_size=chunk_size)) == sample["vulnerabilities"]
+
+
+@pytest.mark.parametrize("text", ['{"vulnerabilities": []}', '{"format": "NVD_CVE", "vulnerabilities" : [ ] }'])
+def test_empty_feed(tmp_path, text):
+    assert list(iter_nvd_records(write_feed(tmp_path / "feed.json.gz", text), chunk_size=3)) == []
+
+
+@pytest.mark.parametrize("cut", [0, 10], ids=["between-records", "inside-record"])
+def test_truncated_feed_raises(tmp_path, synthetic_feed, cut):
+    _, expected = synthetic_feed
+    text = '{"vulnerabilities":[' + ",".join(json.dumps(v) for v in expected[:3])
+    path = write_feed(tmp_path / "feed.json.gz", text[:len(text) - cut])
+    with pytest.raises(ValueError):
+        list(iter_nvd_records(path, chunk_size=64))
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import etl
+from db_sink import bulk_upsert
+
+
+def vuln(cve_id, epss_score=None):
+    return {"cve_id": cve_id, "refs": [], "tags": ["ZDI"], "epss_score": epss_score,
+            "epss_percentile": epss_score}
+
+
+class Snapshot:
+    def __init__(self, scores):
+        self.scores = scores
+
+    def get(self, cve_id):
+        score = self.scores.get(cve_id)
+        return score, score
+
+
+def test_nvd_refresh_selects_modified_and_rebuilt_years(pg):
+    conn = pg()
+    bulk_upsert(conn, [vuln("CVE-2024-0001"), vuln("CVE-2024-0002"), vuln("CVE-2025-0001"), vuln("ZDI-25-001")])
+    synced = []
+
+    def sync(years):
+        synced.append(years)
+        return {"CVE-2024-0002"}, {2025}
+
+    with conn.cursor() as cur:
+        found = etl.nvd_refresh_candidates(cur, SimpleNamespace(sync=sync))
+    assert synced == [{2024, 2025}]
+    assert sorted(v["cve_id"] for v in found) == ["CVE-2024-0002", "CVE-2025-0001"]
+
+
+def test_epss_refresh_keeps_only_changed_scores(pg):
+    conn = pg()
+    bulk_upsert(conn, [vuln("CVE-2025-0001", 0.1), vuln("CVE-2025-0002", 0.2), vuln("CVE-2025-0003"),
+                       vuln("CVE-2025-0004", 0.4)])
+    snapshot = Snapshot({"CVE-2025-0001": 0.1, "CVE-2025-0002": 0.25, "CVE-2025-0003": 0.3})
+    enricher = SimpleNamespace(use_snapshot=True, snapshot=snapshot)
+
+    with conn.cursor() as cur:
+        found = etl.epss_refresh_candidates(cur, enricher)
+    # 0004 absente de l'instantané : le score stocké est conservé, rien à rafraîchir
+    assert sorted(v["cve_id"] for v in found) == ["CVE-2025-0002", "CVE-2025-0003"]
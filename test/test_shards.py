@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import shards
+
+
+def expire_leases(conn):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE etl_shards SET heartbeat_at = NOW() - INTERVAL '1 day' WHERE status='running'")
+
+
+def test_claim_skips_shards_locked_by_another_worker(pg):
+    first, second = pg(), pg()
+    with first.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2024, 2025))
+    first.autocommit = False
+    with first.cursor() as cur:
+        assert shards.claim(cur, "etl", "w1")[0] == "2024"  # non validée : ligne verrouillée
+        with second.cursor() as other:
+            assert shards.claim(other, "etl", "w2")[0] == "2025"
+            assert shards.claim(other, "etl", "w2") is None
+    first.commit()
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(pg, monkeypatch):
+    monkeypatch.setattr(shards, "MAX_ATTEMPTS", 2)
+    conn = pg()
+    with conn.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2025, 2025))
+        assert shards.claim(cur, "etl", "w1")[0] == "2025"
+        assert shards.claim(cur, "etl", "w2") is None  # bail en cours
+
+        expire_leases(conn)
+        assert shards.claim(cur, "etl", "w2")[0] == "2025"
+        expire_leases(conn)
+        assert shards.claim(cur, "etl", "w3") is None  # plafond atteint
+        assert shards.summary(cur, "etl") == {"failed": 1}
+
+
+def test_checkpoint_after_lease_lost_raises(pg):
+    conn = pg()
+    with conn.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2025, 2025))
+        shards.claim(cur, "etl", "w1")
+        expire_leases(conn)
+        shards.claim(cur, "etl", "w2")
+        with pytest.raises(shards.LeaseLost):
+            shards.checkpoint(cur, "etl", "2025", "w1", {"offset": 10})
+
+
+def test_reopen_starts_a_new_run_only_once_the_previous_one_is_over(pg):
+    conn = pg()
+    with conn.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2024, 2025))
+        shard, _, _ = shards.claim(cur, "etl", "w1")
+        shards.finish(cur, "etl", shard, "w1", {"rows": 1})
+        assert shards.reopen(cur, "etl") == 0  # 2025 encore en attente
+        assert shards.summary(cur, "etl") == {"done": 1, "pending": 1}
+
+        shard, _, _ = shards.claim(cur, "etl", "w1")
+        shards.finish(cur, "etl", shard, "w1", {"rows": 1})
+        assert shards.reopen(cur, "etl") == 2
+        assert shards.summary(cur, "etl") == {"pending": 2}
+
+
+def test_finish_after_lease_lost_raises(pg):
+    conn = pg()
+    with conn.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2025, 2025))
+        shards.claim(cur, "etl", "w1")
+        expire_leases(conn)
+        shards.claim(cur, "etl", "w2")
+        with pytest.raises(shards.LeaseLost):
+            shards.finish(cur, "etl", "2025", "w1", {"rows": 1})
+        assert shards.summary(cur, "etl") == {"running": 1}
+
+
+def test_heartbeat_extends_the_lease_while_the_shard_is_held(pg, monkeypatch):
+    conn = pg()
+    monkeypatch.setattr(shards.db, "acquire", pg)
+    monkeypatch.setattr(shards.db, "release", lambda c: c.close())
+    with conn.cursor() as cur:
+        shards.plan(cur, "etl", shards.year_shards(2025, 2025))
+        shards.claim(cur, "etl", "w1")
+        expire_leases(conn)
+        with shards.heartbeat("etl", "2025", "w1", interval=0.05):
+            time.sleep(0.3)  # lot plus long que le bail : aucun checkpoint entre-temps
+        assert shards.claim(cur, "etl", "w2") is None
@@ -0,0 +1,72 @@
+import pytest
+
+import etl
+
+RECORDS = [{"cve_id": f"CVE-2025-{i:04d}", "refs": [], "tags": []} for i in range(7)]
+
+
+class Source:
+    def __init__(self, records):
+        self.records = records
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def iter_fetch(self):
+        yield from self.records
+
+
+class Enricher:
+    kev_cves = {}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def fetch(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def shard(monkeypatch):
+    """run_year_shard sans réseau ni base : lots écrits dans `written`."""
+    written = []
+    monkeypatch.setattr(etl, "ZDICollector", Source(RECORDS[:4]))
+    monkeypatch.setattr(etl, "ZDCZCollector", Source(RECORDS[4:]))
+    for name in ("NVDEnricher", "KEVEnricher", "EPSSEnricher"):
+        monkeypatch.setattr(etl, name, Enricher)
+    monkeypatch.setattr(etl, "iter_enriched", lambda batches, *args: iter(batches))
+    monkeypatch.setattr(etl.db, "acquire", Connection)
+    monkeypatch.setattr(etl.db, "release", lambda conn: None)
+
+    def upsert(conn, batch, label):
+        written.append([v["cve_id"] for v in batch])
+        return {"inserted": len(batch), "changed": 0, "unchanged": 0}
+
+    monkeypatch.setattr(etl, "bulk_upsert", upsert)
+    return written
+
+
+def test_checkpoint_after_each_written_batch(shard):
+    progress = []
+    totals = etl.run_year_shard({"year_from": 2025, "year_to": 2025}, None, progress.append, batch_size=3)
+    assert [(p["batches"], p["inserted"]) for p in progress] == [(1, 3), (2, 6), (3, 7)]
+    assert totals["rows"] == 7
+
+
+def test_resumed_shard_is_replayed_from_the_start(shard):
+    """Les sources listent les plus récents d'abord : aucune position n'est fiable après coup."""
+    progress = {"inserted": 3, "changed": 0, "unchanged": 0, "batches": 1}
+    totals = etl.run_year_shard({"year_from": 2025, "year_to": 2025}, progress, None, batch_size=3)
+    assert [cve for batch in shard for cve in batch] == [v["cve_id"] for v in RECORDS]
+    assert totals["inserted"] == 7 and totals["batches"] == 3
@@ -0,0 +1,57 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import zdcz_collector
+from bench.synthetic import Universe
+from zdcz_collector import ZDCZCollector
+
+
+@pytest.fixture
+def site(monkeypatch):
+    """Sert les pages Zero-day.cz d'un univers synthétique à la place du réseau."""
+    def serve(universe):
+        def get(url, **kwargs):
+            year_from, year_to, page = (
+                int(re.search(pattern + r"=(\d+)", url).group(1))
+                for pattern in (r"YEAR_FROM%5D", r"YEAR_TO%5D", r"PAGEN_1")
+            )
+            return SimpleNamespace(text=universe.zdcz_page(page, year_from, year_to), raise_for_status=lambda: None)
+
+        monkeypatch.setattr(zdcz_collector.http_cache, "get", get)
+        return universe
+    return serve
+
+
+def test_issues_without_cve_keep_distinct_ids(site):
+    universe = site(Universe(records=5000, zdcz_count=5000, zdcz_per_page=250))
+    vulns = ZDCZCollector(2025, 2025).fetch()
+    assert len(vulns) == universe.zdcz_count
+    assert len({v["cve_id"] for v in vulns}) == universe.zdcz_count
+    assert sum(v["cve_id"].startswith("ZDAYCZ-") for v in vulns) > 0
+
+
+def test_high_water_mark_is_the_newest_issue(site):
+    site(Universe(records=500, zdcz_count=100))
+    collector = ZDCZCollector(2025, 2025)
+    vulns = collector.fetch()
+    newest = max(vulns, key=lambda v: v["first_seen"])
+    assert collector.high_water_mark == {
+        "last_discovered": newest["first_seen"].strftime("%Y-%m-%d"),
+        "last_id": newest["cve_id"],
+    }
+
+
+def test_incremental_run_stops_at_the_high_water_mark(site):
+    site(Universe(records=500, zdcz_count=100))
+    vulns = ZDCZCollector(2025, 2025).fetch()
+    mark = {"last_discovered": vulns[30]["first_seen"].strftime("%Y-%m-%d"), "last_id": vulns[30]["cve_id"]}
+
+    collector = ZDCZCollector(2025, 2025, incremental=True, mark=mark)
+    assert collector.fetch() == vulns[:30]
+    assert collector.high_water_mark["last_id"] == vulns[0]["cve_id"]
+
+    up_to_date = ZDCZCollector(2025, 2025, incremental=True, mark=collector.high_water_mark)
+    assert up_to_date.fetch() == []
+    assert up_to_date.high_water_mark == collector.high_water_mark
@@ -1,23 +1,21 @@
 import asyncio
-import aiohttp
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2 import pool
-
-DB_CONFIG = {
-    "dbname": "zerodaydb",
-    "user": "postgres",
-    "password": "postgres",
-    "host": "localhost",
-    "port": 5432
-}
-
-WIKI_API = "https://en.wikipedia.org/w/api.php"
+import logging
+import os
+import db
+import http_cache
+import http_client
+import metrics
+
+WIKI_BASE_URL = os.getenv("WIKI_BASE_URL", "https://en.wikipedia.org")
+WIKI_API = f"{WIKI_BASE_URL}/w/api.php"
 HEADERS = {"User-Agent": "ZeroDayWikiBot/1.0"}
 
 BATCH_SIZE = 50
 MAX_CONCURRENCY = 8  # adapté à ton VPS 4 cœurs / 8 Go
-POOL_SIZE = 8  # nombre de connexions dans le pool
+POOL_SIZE = 8  # connexions du pool asynchrone (db.async_pool)
+BATCH_PAUSE = float(os.getenv("WIKI_BATCH_PAUSE", "5"))  # secondes entre deux lots
+
+log = logging.getLogger("wiki")
 
 TYPE_KEYWORDS = {
     "Security": ["antivirus", "firewall", "ids", "ips", "malware", "endpoint protection", "security", "siem", "threat", "detection"],
@@ -68,9 +66,9 @@ def infer_type_and_platform(title, vendor, categories):
     return software_type, platform
 
 async def safe_get(session, url, params):
-    async with session.get(url, params={k:str(v) for k,v in params.items()}, headers=HEADERS) as r:
-        r.raise_for_status()
-        return await r.json()
+    r = await http_cache.get_async(session, url, params={k:str(v) for k,v in params.items()}, headers=HEADERS, source="wiki")
+    r.raise_for_status()
+    return r.json()
 
 async def search_wikipedia(session, query):
     params = {"action":"query","list":"search","srsearch":query,"srlimit":1,"format":"json"}
@@ -88,90 +86,84 @@ async def get_wiki_details(session, title):
     url = f"https://en.wikipedia.org/wiki/{title.replace(' ','_')}"
     return extract, categories, url
 
-async def enrich_row(session, sem, row, conn_pool):
+UPDATE_UNMATCHED = """
+    UPDATE softwares
+    SET last_enriched = NOW(),
+        wiki_checked = TRUE
+    WHERE software_id = %s
+"""
+
+UPDATE_MATCHED = """
+    UPDATE softwares
+    SET titles = %s,
+        wiki_page = %s,
+        wiki_summary = %s,
+        categories = %s,
+        type = %s,
+        platform = %s,
+        last_enriched = NOW(),
+        wiki_checked = TRUE
+    WHERE software_id = %s
+"""
+
+async def enrich_row(session, sem, row):
+    """Interroge Wikipédia pour une ligne ; retourne les paramètres de l'UPDATE
+    (None si aucune page) sans toucher à la base."""
     async with sem:
-        conn = conn_pool.getconn()
-        try:
-            cur = conn.cursor()
-            query = f"{row['vendor']} {row['product']}"
-            title = await search_wikipedia(session, query)
-            if not title:
-                print(f"[WIKI] ❌ Aucun résultat pour {query}")
-                cur.execute("""
-                    UPDATE softwares
-                    SET last_enriched = NOW(),
-                        wiki_checked = TRUE
-                    WHERE software_id = %s
-                """, (row["software_id"],))
-                conn.commit()
-                return
-
-            print(f"[WIKI] ✅ Page trouvée : {title}")
-            summary, categories, url = await get_wiki_details(session, title)
-            software_type, platform = infer_type_and_platform(title, row['vendor'], categories)
-
-            cur.execute("""
-                UPDATE softwares
-                SET titles = %s,
-                    wiki_page = %s,
-                    wiki_summary = %s,
-                    categories = %s,
-                    type = %s,
-                    platform = %s,
-                    last_enriched = NOW(),
-                    wiki_checked = TRUE
-                WHERE software_id = %s
-            """, ([title], url, summary, categories, software_type, platform, row["software_id"]))
-            conn.commit()
-        finally:
-            cur.close()
-            conn_pool.putconn(conn)
-
-async def process_batch(rows, conn_pool, batch_num, total_batches):
+        query = f"{row['vendor']} {row['product']}"
+        title = await search_wikipedia(session, query)
+        if not title:
+            log.debug("Aucun résultat pour %s", query)
+            return None
+
+        log.debug("Page trouvée : %s", title)
+        summary, categories, url = await get_wiki_details(session, title)
+        software_type, platform = infer_type_and_platform(title, row['vendor'], categories)
+        return ([title], url, summary, categories, software_type, platform, row["software_id"])
+
+async def process_batch(session, rows, adb, batch_num, total_batches):
     print(f"\n🚀 Traitement du lot {batch_num}/{total_batches} ({len(rows)} entrées)")
     sem = asyncio.Semaphore(MAX_CONCURRENCY)
-    async with aiohttp.ClientSession() as session:
-        tasks = [enrich_row(session, sem, row, conn_pool) for row in rows]
-        await asyncio.gather(*tasks)
+    tasks = [enrich_row(session, sem, row) for row in rows]
+    results = await asyncio.gather(*tasks)
 
-async def main():
-    # Création du pool
-    conn_pool = psycopg2.pool.ThreadedConnectionPool(1, POOL_SIZE, **DB_CONFIG)
-
-    # Nombre total d'entrées à traiter
-    conn = conn_pool.getconn()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT COUNT(*) AS total FROM softwares WHERE type IS NULL;")
-    total_remaining = cur.fetchone()["total"]
-    cur.close()
-    conn_pool.putconn(conn)
-
-    if total_remaining == 0:
-        print("✅ Tout est déjà enrichi.")
-        conn_pool.closeall()
-        return
-
-    total_batches = (total_remaining // BATCH_SIZE) + 1
-    batch_num = 0
-
-    while True:
-        conn = conn_pool.getconn()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT * FROM softwares WHERE wiki_checked IS NULL LIMIT %s;", (BATCH_SIZE,))
-        rows = cur.fetchall()
-        cur.close()
-        conn_pool.putconn(conn)
-
-        if not rows:
-            print("✅ Plus rien à enrichir.")
-            break
+    # Écriture groupée du lot : deux instructions au lieu d'un commit par ligne
+    await adb.executemany(UPDATE_MATCHED, [r for r in results if r])
+    await adb.executemany(UPDATE_UNMATCHED, [(row["software_id"],) for row, r in zip(rows, results) if not r])
 
-        batch_num += 1
-        await process_batch(rows, conn_pool, batch_num, total_batches)
-        print("⏳ Pause 5s avant le prochain lot...")
-        await asyncio.sleep(5)
+async def main():
+    report = metrics.start_run("wiki")
+    try:
+        async with db.async_pool(POOL_SIZE) as adb:
+            # Nombre total d'entrées à traiter
+            count = await adb.fetchall("SELECT COUNT(*) AS total FROM softwares WHERE type IS NULL;", dicts=True)
+            total_remaining = count[0]["total"]
+
+            if total_remaining == 0:
+                print("✅ Tout est déjà enrichi.")
+                return
 
-    conn_pool.closeall()
+            total_batches = (total_remaining // BATCH_SIZE) + 1
+            batch_num = 0
+            # Une seule session pour tout le run : les connexions keep-alive survivent aux lots
+            async with http_client.new_async_session() as session:
+                while True:
+                    rows = await adb.fetchall("SELECT * FROM softwares WHERE wiki_checked IS NULL LIMIT %s;",
+                                              (BATCH_SIZE,), dicts=True)
+
+                    if not rows:
+                        print("✅ Plus rien à enrichir.")
+                        break
+
+                    batch_num += 1
+                    with metrics.stage("wiki", len(rows)):
+                        await process_batch(session, rows, adb, batch_num, total_batches)
+                    if BATCH_PAUSE:
+                        print(f"⏳ Pause {BATCH_PAUSE:g}s avant le prochain lot...")
+                        await asyncio.sleep(BATCH_PAUSE)
+    finally:
+        report.write()  # aussi quand il n'y a rien à enrichir ou en cas d'échec
 
 if __name__ == "__main__":
+    metrics.setup_logging()
     asyncio.run(main())
@@ -1,121 +1,119 @@
-import requests
+import os
+import zlib
+import http_cache
 from bs4 import BeautifulSoup
 from datetime import datetime
-from psycopg2.extras import Json
+
+MAX_PAGES = 500  # garde-fou sur la pagination
+ZDCZ_BASE_URL = os.getenv("ZDCZ_BASE_URL", "https://www.zero-day.cz")
 
 class ZDCZCollector:
     BASE_URL = (
-        "https://www.zero-day.cz/database/?set_filter=Y"
+        f"{ZDCZ_BASE_URL}/database/?set_filter=Y"
         "&arrFilter_pf[SEARCH]="
     )
 
-    def __init__(self, year_from: int, year_to: int):
+    def __init__(self, year_from: int, year_to: int, incremental=False, mark=None):
         self.year_from = year_from
         self.year_to = year_to
+        self.incremental = incremental  # s'arrêter au premier problème déjà connu
+        self.mark = mark  # marque haute des collectes précédentes, lue dans etl_state
         self.vulnerabilities = []
+        self.high_water_mark = None
 
-    def fetch(self):
+    def parse_issue(self, issue):
+        title_tag = issue.select_one(".issue-title a")
+        cve_tag = issue.select_one(".issue-title .issue-code")
+        desc_tag = issue.select_one(".description.for-l")
+        software_tag = issue.select_one(".spec strong")
+        discovered_tag = issue.select_one(".issue-status .discavered time")
+
+        title = title_tag.text.strip() if title_tag else "No title"
+        # Identifiant stable d'un run à l'autre (hash() est aléatoire par processus) ;
+        # crc32 complet : un modulo ferait collisionner des problèmes distincts
+        cve_id = cve_tag.text.strip() if cve_tag else f"ZDAYCZ-{zlib.crc32(title.encode())}"
+        summary = desc_tag.text.strip() if desc_tag else ""
+        software = software_tag.text.strip() if software_tag else ""
+        discovered = datetime.strptime(discovered_tag.text.strip(), "%Y-%m-%d") if discovered_tag else None
+
+        return {
+            "cve_id": cve_id,
+            "title": title,
+            "summary": summary,
+            "configurations": [{"source": "Zero-day.cz","product": software}] if software else [],
+            "first_seen": discovered,
+            "disclosed": discovered,
+            "refs": [{"source": "Zero-day.cz", "url": title_tag["href"]}] if title_tag else [],
+            "tags": ["Zero-day.cz"]
+        }
+
+    @staticmethod
+    def issue_key(vuln):
+        """Clé de dédoublonnage : l'URL du problème (plusieurs problèmes peuvent partager une CVE)."""
+        refs = vuln.get("refs")
+        return refs[0]["url"] if refs else vuln["cve_id"]
+
+    def is_known(self, vuln, mark) -> bool:
+        """Vrai si le problème a déjà été collecté lors d'un run précédent."""
+        if not mark:
+            return False
+        if vuln["cve_id"] == mark.get("last_id"):
+            return True
+        discovered = vuln.get("first_seen")
+        return bool(discovered and mark.get("last_discovered")
+                    and discovered.strftime("%Y-%m-%d") < mark["last_discovered"])
+
+    def iter_fetch(self):
+        """Générateur : produit les problèmes au fil des pages, sans les accumuler.
+
+        La marque haute est mise à jour une fois la pagination terminée."""
         url = (
             f"{self.BASE_URL}"
             f"&arrFilter_pf%5BYEAR_FROM%5D={self.year_from}"
             f"&arrFilter_pf%5BYEAR_TO%5D={self.year_to}"
         )
         print(f"[ZDCZ] Collecte de {self.year_from} à {self.year_to}...")
-        r = requests.get(url)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        issues = soup.select("#issuew_wrap .issue")
-        for issue in issues:
-            title_tag = issue.select_one(".issue-title a")
-            cve_tag = issue.select_one(".issue-title .issue-code")
-            desc_tag = issue.select_one(".description.for-l")
-            software_tag = issue.select_one(".spec strong")
-            discovered_tag = issue.select_one(".issue-status .discavered time")
-
-            cve_id = cve_tag.text.strip() if cve_tag else f"ZDAYCZ-{hash(title_tag.text) % 10000}"
-            title = title_tag.text.strip() if title_tag else "No title"
-            summary = desc_tag.text.strip() if desc_tag else ""
-            software = software_tag.text.strip() if software_tag else ""
-            discovered = datetime.strptime(discovered_tag.text.strip(), "%Y-%m-%d") if discovered_tag else None
-
-            self.vulnerabilities.append({
-                "cve_id": cve_id,
-                "title": title,
-                "summary": summary,
-                "configurations": [{"source": "Zero-day.cz","product": software}] if software else [],
-                "first_seen": discovered,
-                "disclosed": discovered,
-                "refs": [{"source": "Zero-day.cz", "url": title_tag["href"]}] if title_tag else [],
-                "tags": ["Zero-day.cz"]
-            })
-        return self.vulnerabilities
+        mark = (self.mark or {}) if self.incremental else {}
+        seen = set()
+        latest = None
 
-    def upsert(self, cur, kev_cves=None, epss_cves=None, zdi_cves=None):
-        kev_cves = kev_cves or {}
-        epss_cves = epss_cves or {}
-        zdi_cves = zdi_cves or []
+        for page in range(1, MAX_PAGES + 1):
+            r = http_cache.get(f"{url}&PAGEN_1={page}", source="zdcz", timeout=60)
+            r.raise_for_status()
+            soup = BeautifulSoup(r.text, "html.parser")
+            issues = [self.parse_issue(issue) for issue in soup.select("#issuew_wrap .issue")]
+            # Page vide, ou page hors limites (Bitrix renvoie alors la dernière page)
+            if not issues or all(self.issue_key(v) in seen for v in issues):
+                break
 
-        for v in self.vulnerabilities:
-            # Ajout de références croisées avec ZDI si applicable
-            if v.get("cve_id") in zdi_cves:
-                v.setdefault("refs", []).append({
-                    "source": "ZDI",
-                    "url": f"https://www.zerodayinitiative.com/advisories/{v['cve_id']}"
-                })
+            reached_known = False
+            for vuln in issues:
+                if self.is_known(vuln, mark):
+                    reached_known = True
+                    break
+                if self.issue_key(vuln) not in seen:
+                    seen.add(self.issue_key(vuln))
+                    if vuln.get("first_seen") and (latest is None or vuln["first_seen"] > latest["first_seen"]):
+                        latest = vuln
+                    yield vuln
+            if reached_known:
+                print(f"[ZDCZ] Problèmes déjà connus atteints (page {page}), arrêt.")
+                break
 
-            # Nettoyage et suppression des doublons dans vendor_product
-            vendor_products = v.get("vendor_product", [])
-            seen = set()
-            unique_vendor_products = []
-            for vp in vendor_products:
-                key = (vp.get("vendor"), vp.get("product"))
-                if key not in seen:
-                    seen.add(key)
-                    unique_vendor_products.append(vp)
-            v["vendor_product"] = unique_vendor_products
+        self.update_high_water_mark(mark, latest)
+        print(f"[ZDCZ] {len(seen)} nouveaux problèmes collectés")
 
-            # Exécution de l'upsert
-            cur.execute("""
-                INSERT INTO vulnerabilities (
-                    canonical_id, title, summary, vendor_product, configurations,
-                    first_seen, disclosed, published_nvd, cve_id,
-                    exploited_in_wild, kev_added, kev_latency_days,
-                    cvss2_base_score, cvss2_vector,
-                    cvss3_base_score, cvss3_vector,
-                    cvss4_base_score, cvss4_vector, 
-                    epss_score, epss_percentile,
-                    refs, tags
-                )
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (canonical_id) DO UPDATE SET
-                    refs=EXCLUDED.refs,
-                    tags=EXCLUDED.tags,
-                    updated_at=NOW()
-                RETURNING vuln_id
-            """, (
-                v["cve_id"],
-                v.get("title"),
-                v.get("summary"),
-                Json(v.get("vendor_product", [])),   # JSONB sans doublons
-                Json(v.get("configurations", [])),
-                v.get("first_seen"),
-                v.get("disclosed"),
-                v.get("published_nvd"),
-                v.get("cve_id"),
-                v.get("exploited_in_wild", False),
-                v.get("kev_added"),
-                v.get("kev_latency_days"),
-                v.get("cvss2_base_score"),
-                v.get("cvss2_vector"),
-                v.get("cvss3_base_score"),
-                v.get("cvss3_vector"),
-                v.get("cvss4_base_score"),
-                v.get("cvss4_vector"),
-                v.get("epss_score"),
-                v.get("epss_percentile"),
-                Json(v.get("refs", [])),
-                v.get("tags", [])
-            ))
+    def fetch(self):
+        self.vulnerabilities.extend(self.iter_fetch())
+        return self.vulnerabilities
 
-            vuln_id = cur.fetchone()[0]
-            print(f"[Zero-day.cz] {v['cve_id']} inséré/mis à jour (id {vuln_id})")
+    def update_high_water_mark(self, previous, latest):
+        """Calcule la nouvelle marque haute à partir du problème le plus récent collecté."""
+        if latest is None:
+            self.high_water_mark = previous or None
+            return
+        latest_date = latest["first_seen"].strftime("%Y-%m-%d")
+        if previous and previous.get("last_discovered", "") > latest_date:
+            self.high_water_mark = previous
+            return
+        self.high_water_mark = {"last_discovered": latest_date, "last_id": latest["cve_id"]}
@@ -1,106 +1,89 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import http_cache
+from bs4 import BeautifulSoup, SoupStrainer
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from psycopg2.extras import Json
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"  # parseur C, nettement plus rapide sur les gros tableaux annuels
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+MAX_WORKERS = 4  # années téléchargées en parallèle
+PAST_YEAR_TTL = 7 * 24 * 3600  # les pages des années closes ne bougent quasiment plus
+ZDI_BASE_URL = os.getenv("ZDI_BASE_URL", "https://www.zerodayinitiative.com")
 
 class ZDICollector:
-    BASE_URL = "https://www.zerodayinitiative.com/advisories/published/{year}/"
+    BASE_URL = ZDI_BASE_URL + "/advisories/published/{year}/"
 
-    def __init__(self, year_from: int, year_to: int):
+    def __init__(self, year_from: int, year_to: int, since=None):
         self.year_from = year_from
         self.year_to = year_to
+        self.since = since  # ne garder que les avis publiés à partir de cette date (mode incrémental)
+        self.latest_disclosed = None  # marque haute de la collecte
         self.vulnerabilities = []
 
-    def fetch(self):
-        for year in range(self.year_from, self.year_to + 1):
-            url = self.BASE_URL.format(year=year)
-            print(f"[ZDI] Collecte {year} ...")
-            r = requests.get(url)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "html.parser")
-            advisories = soup.select("tr#publishedAdvisories")
-            for row in advisories:
-                cols = row.find_all("td")
-                if len(cols) < 8:
-                    continue
-                zdi_id = cols[0].text.strip()
-                vendor = cols[2].text.strip()
-                cve_id = cols[3].text.strip() or zdi_id
-                disclosed = datetime.strptime(cols[5].text.strip(), "%Y-%m-%d") if cols[5].text.strip() else None
-                link_tag = cols[7].find("a")
-                link = f"https://www.zerodayinitiative.com{link_tag['href']}" if link_tag else ""
-                self.vulnerabilities.append({
-                    "cve_id": cve_id,
-                    "first_seen": disclosed,
-                    "disclosed": disclosed,
-                    "refs": [{"source": "ZDI", "url": link}] if link else [],
-                    "tags": ["ZDI"]
-                })
-        return self.vulnerabilities
+    def fetch_year_page(self, year: int) -> str:
+        """Télécharge la page des avis d'une année via le cache HTTP (TTL long pour les années closes)."""
+        url = self.BASE_URL.format(year=year)
+        print(f"[ZDI] Collecte {year} ...")
+        ttl = PAST_YEAR_TTL if year < datetime.now().year else None
+        r = http_cache.get(url, source="zdi", ttl=ttl, timeout=60)
+        r.raise_for_status()
+        return r.text
+
+    def parse_year(self, html: str):
+        """Extrait les avis d'une page annuelle (seules les lignes du tableau sont analysées)."""
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer("tr", id="publishedAdvisories"))
+        vulns = []
+        for row in soup.find_all("tr", id="publishedAdvisories"):
+            cols = row.find_all("td")
+            if len(cols) < 8:
+                continue
+            zdi_id = cols[0].text.strip()
+            cve_id = cols[3].text.strip() or zdi_id
+            disclosed = datetime.strptime(cols[5].text.strip(), "%Y-%m-%d") if cols[5].text.strip() else None
+            link_tag = cols[7].find("a")
+            link = f"https://www.zerodayinitiative.com{link_tag['href']}" if link_tag else ""
+            vulns.append({
+                "cve_id": cve_id,
+                "first_seen": disclosed,
+                "disclosed": disclosed,
+                "refs": [{"source": "ZDI", "url": link}] if link else [],
+                "tags": ["ZDI"]
+            })
+        return vulns
 
-    def upsert(self, cur, kev_cves=None, epss_cves=None, zdcz_cves=None):
-        kev_cves = kev_cves or {}
-        epss_cves = epss_cves or {}
-        zdcz_cves = zdcz_cves or []
+    def fetch_year(self, year: int):
+        return self.parse_year(self.fetch_year_page(year))
 
-        for v in self.vulnerabilities:
-            if v.get("cve_id") in zdcz_cves:
-                v.setdefault("refs", []).append({
-                    "source": "Zero-day.cz",
-                    "url": f"https://www.zero-day.cz/database/{v['cve_id']}"
-                })
+    def iter_fetch(self):
+        """Générateur : produit les avis année par année (ordre conservé).
 
-            # Nettoyage et suppression des doublons dans vendor_product
-            vendor_products = v.get("vendor_product", [])
-            seen = set()
-            unique_vendor_products = []
-            for vp in vendor_products:
-                key = (vp.get("vendor"), vp.get("product"))
-                if key not in seen:
-                    seen.add(key)
-                    unique_vendor_products.append(vp)
-            v["vendor_product"] = unique_vendor_products
-                
-            cur.execute("""
-                INSERT INTO vulnerabilities (
-                    canonical_id, title, summary, vendor_product, configurations,
-                    first_seen, disclosed, published_nvd, cve_id,
-                    exploited_in_wild, kev_added, kev_latency_days,
-                    cvss2_base_score, cvss2_vector,
-                    cvss3_base_score, cvss3_vector,
-                    cvss4_base_score, cvss4_vector, 
-                    epss_score, epss_percentile,
-                    refs, tags
-                )
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (canonical_id) DO UPDATE SET
-                    refs=EXCLUDED.refs,
-                    tags=EXCLUDED.tags,
-                    updated_at=NOW()
-                RETURNING vuln_id
-            """, (
-                v["cve_id"],
-                v.get("title"),
-                v.get("summary"),
-                Json(v.get("vendor_product", [])),
-                Json(v.get("configurations", [])),
-                v.get("first_seen"),
-                v.get("disclosed"),
-                v.get("published_nvd"),
-                v.get("cve_id"),
-                v.get("exploited_in_wild", False),
-                v.get("kev_added"),
-                v.get("kev_latency_days"),
-                v.get("cvss2_base_score"),
-                v.get("cvss2_vector"),
-                v.get("cvss3_base_score"),
-                v.get("cvss3_vector"),
-                v.get("cvss4_base_score"),
-                v.get("cvss4_vector"),
-                v.get("epss_score"),
-                v.get("epss_percentile"),
-                Json(v.get("refs", [])),
-                v.get("tags", [])
-            ))
-            vuln_id = cur.fetchone()[0]
-            print(f"[ZDI] {v['cve_id']} inséré/mis à jour (id {vuln_id})")
\ No newline at end of file
+        Au plus MAX_WORKERS années sont téléchargées d'avance, la mémoire ne
+        dépend donc pas de l'étendue des années demandées."""
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for year in range(self.year_from, self.year_to + 1):
+                pending.append(pool.submit(self.fetch_year, year))
+                if len(pending) >= MAX_WORKERS:
+                    yield from self.keep_new(pending.popleft().result())
+            while pending:
+                yield from self.keep_new(pending.popleft().result())
+
+    def keep_new(self, vulns):
+        """Filtre les avis antérieurs à `since` et suit la date de publication la plus récente."""
+        for v in vulns:
+            disclosed = v.get("disclosed")
+            if disclosed and self.since and disclosed < self.since:
+                continue
+            if disclosed and (self.latest_disclosed is None or disclosed > self.latest_disclosed):
+                self.latest_disclosed = disclosed
+            yield v
+
+    def fetch(self):
+        """Collecte toutes les années en parallèle ; l'ordre des années est conservé."""
+        self.vulnerabilities.extend(self.iter_fetch())
+        return self.vulnerabilities